@@ -76,4 +76,16 @@ def build_graph():
     workflow.add_edge("memory", "summarize")
     workflow.add_edge("summarize", END)
     
-    return workflow.compile()
\ No newline at end of file
+    return workflow.compile()
+
+_graph = None
+
+def get_graph():
+    """
+    进程内共享的已编译图，应用启动时编译一次。
+    图本身不保存任何请求数据：档案、用户设置、服务器时间等只经由 state (及 config) 传入，并发的多轮对话可安全共用。
+    """
+    global _graph
+    if _graph is None:
+        _graph = build_graph()
+    return _graph
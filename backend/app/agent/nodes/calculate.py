@@ -3,6 +3,24 @@ from app.services.bazi_service import BaziService
 from app.services.archive_service import ArchiveService
 from app.db.session import get_async_session_maker
 from uuid import UUID
+from fastapi import HTTPException
+
+async def _load_archive(state, archive_id: str):
+    """
+    优先使用状态中随请求传入的档案快照 (即当前用户的全部档案)，不在其中的 id 视为不存在；
+    状态中没有快照时 (如测试直接调用图) 查询数据库，并限定为 user_id 的档案。
+    关联档案 id 来自意图识别模型的输出，不能信任。
+    """
+    archives = state.get("archives")
+    if archives is not None:
+        archive = archives.get(archive_id)
+        if archive is None:
+            raise HTTPException(status_code=404, detail="Archive not found")
+        return archive
+    user_id = state.get("user_id")
+    SessionLocal = get_async_session_maker()
+    async with SessionLocal() as db:
+        return await ArchiveService.get(db, UUID(archive_id), UUID(user_id) if user_id else None)
 
 async def calculate_node(state: AgentState):
     # 结果容器
@@ -10,31 +28,27 @@ async def calculate_node(state: AgentState):
     
     # 1. 计算主命盘 (如果尚未计算)
     if not state.get("bazi_result"):
-        archive_id = state["archive_id"]
-        SessionLocal = get_async_session_maker()
-        async with SessionLocal() as db:
-            archive = await ArchiveService.get(db, UUID(archive_id), None)
-            updates["bazi_result"] = await BaziService.get_result(archive)
+        archive = await _load_archive(state, state["archive_id"])
+        updates["bazi_result"] = await BaziService.get_result(archive)
 
     # 2. 处理关联命盘
     related_ids = state.get("related_archive_ids", [])
     if related_ids:
-        related_results = state.get("related_bazi_results", {}) or {}
-        SessionLocal = get_async_session_maker()
-        async with SessionLocal() as db:
-            for rid in related_ids:
-                # 排除主命盘
-                if rid == state["archive_id"]:
-                    continue
-                # 排除已计算过的
-                if rid in related_results:
-                    continue
-                try:
-                    r_archive = await ArchiveService.get(db, UUID(rid), None)
-                    r_bazi = await BaziService.get_result(r_archive)
-                    related_results[rid] = r_bazi
-                except Exception as e:
-                    print(f"Failed to calculate related archive {rid}: {e}")
+        # 复制一份，不修改传入的状态
+        related_results = dict(state.get("related_bazi_results", {}) or {})
+        for rid in related_ids:
+            # 排除主命盘
+            if rid == state["archive_id"]:
+                continue
+            # 排除已计算过的
+            if rid in related_results:
+                continue
+            try:
+                r_archive = await _load_archive(state, rid)
+                r_bazi = await BaziService.get_result(r_archive)
+                related_results[rid] = r_bazi
+            except Exception as e:
+                print(f"Failed to calculate related archive {rid}: {e}")
         
         updates["related_bazi_results"] = related_results
         
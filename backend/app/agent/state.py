@@ -4,10 +4,13 @@ from operator import add
 class AgentState(TypedDict):
     # 档案快照
     archive_id: str
+    user_id: str
     archive_config: Dict[str, Any]
     
     # 用户的全部档案列表 (用于跨盘分析检索)
     user_archives: List[Dict[str, Any]]
+    # 用户全部档案的只读快照 {档案 id: 档案}，节点与工具据此排盘，不再查询数据库
+    archives: Dict[str, Any]
     
     # 服务器当前时间 (时空感知层)
     server_time: str
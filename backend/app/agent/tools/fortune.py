@@ -4,7 +4,7 @@ from langgraph.prebuilt import InjectedState
 import json
 
 @tool
-def query_fortune_details(start_year: int, end_year: int, state: Annotated[dict, InjectedState]):
+async def query_fortune_details(start_year: int, end_year: int, state: Annotated[dict, InjectedState]):
     """
     查询特定年份范围内的流年、流月运程详情。
     当用户询问特定年份（如：'2025年财运如何'、'明年运气怎么样'）时，必须调用此工具。
@@ -31,39 +31,12 @@ def query_fortune_details(start_year: int, end_year: int, state: Annotated[dict,
         # 触发完整推演
         print("--- Re-calculating full Bazi for tool details ---")
         from app.services.bazi_service import BaziService
-        from app.models.archive import Archive
-        from uuid import UUID
-        # 注意：此处需要构造一个 mock archive 或者从 DB 获取，为了性能我们尽量复用配置
-        # 这里最稳妥的是根据 archive_id 重新获取
-        # 由于我们是在 tool 里，可以通过 state 拿 archive_id
+        from app.agent.nodes.calculate import _load_archive
+        # 根据 archive_id 获取档案，完整结果 (含流月) 在档案保存时已后台预计算并缓存
         archive_id = state.get("archive_id")
         if archive_id:
-            from app.db.session import get_async_session_maker
-            import asyncio
-            SessionLocal = get_async_session_maker()
-            
-            # 由于工具通常是同步运行环境（除非是 async tool），这里需要处理异步
-            # 但 langchain @tool 默认是同步的。我们将重新计算逻辑写在 service 里
-            from src.engine.core import BaziEngine
-            from src.engine.models import BaziRequest, Gender, CalendarType, TimeMode, MonthMode, ZiShiMode
-            
-            engine = BaziEngine()
-            cfg = state.get("archive_config", {})
-            # 构造 request
-            request = BaziRequest(
-                name=cfg.get("name", "Unknown"),
-                gender=Gender.MALE if cfg.get("gender") == 1 else Gender.FEMALE,
-                calendar_type=CalendarType.SOLAR if cfg.get("calendar_type") == "SOLAR" else CalendarType.LUNAR,
-                birth_datetime=cfg.get("birth_time"),
-                birth_location="北京", # 简化的坐标
-                longitude=cfg.get("lng", 116.4),
-                latitude=cfg.get("lat", 39.9),
-                time_mode=TimeMode.TRUE_SOLAR,
-                month_mode=MonthMode.SOLAR_TERM,
-                zi_shi_mode=ZiShiMode.LATE_ZI_IN_DAY
-            )
-            full_res = engine.arrange(request, skip_liu_yue=False)
-            bazi_result = full_res.dict()
+            archive = await _load_archive(state, archive_id)
+            bazi_result = await BaziService.get_full_result(archive)
             fortune = bazi_result.get("fortune", {})
             da_yun_list = fortune.get("da_yun", [])
 
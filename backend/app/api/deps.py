@@ -1,14 +1,17 @@
+import secrets
 from typing import Generator, Optional
 from uuid import UUID
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, Header, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt
-from pydantic import ValidationError
+from pydantic import BaseModel, ValidationError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 
+from app.core.cache import LRUCache
 from app.core.config import settings
 from app.core.security import ALGORITHM
+from app.core import invalidation
 from app.db.session import get_session
 from app.models.user import User
 
@@ -16,10 +19,17 @@ reusable_oauth2 = OAuth2PasswordBearer(
     tokenUrl=f"{settings.API_V1_STR}/auth/login"
 )
 
-async def get_current_user(
-    db: AsyncSession = Depends(get_session),
-    token: str = Depends(reusable_oauth2)
-) -> User:
+class Principal(BaseModel):
+    """仅由令牌解析出的当前用户身份，不查询数据库"""
+    id: UUID
+    iat: Optional[int] = None
+
+# 当前用户对象的短期进程内缓存，键为 "用户 id:令牌签发时间"；PATCH /users/me 时经失效总线清除
+# 缓存的对象已脱离会话并被多个请求共享，只读使用；需要修改时重新查询
+_user_cache = LRUCache(maxsize=settings.USER_CACHE_SIZE, ttl=settings.USER_CACHE_TTL)
+invalidation.subscribe(invalidation.USER, lambda user_id: _user_cache.delete_prefix(f"{user_id}:"))
+
+async def get_current_principal(token: str = Depends(reusable_oauth2)) -> Principal:
     try:
         payload = jwt.decode(
             token, settings.SECRET_KEY, algorithms=[ALGORITHM]
@@ -35,7 +45,7 @@ async def get_current_user(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Could not validate credentials",
         )
-    
+
     try:
         uuid_user_id = UUID(user_id)
     except ValueError:
@@ -43,10 +53,29 @@ async def get_current_user(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Invalid user ID format",
         )
-    
-    result = await db.execute(select(User).where(User.id == uuid_user_id))
+    # 旧令牌没有 iat，以过期时间代替
+    return Principal(id=uuid_user_id, iat=payload.get("iat", payload.get("exp")))
+
+async def get_current_user(
+    db: AsyncSession = Depends(get_session),
+    principal: Principal = Depends(get_current_principal)
+) -> User:
+    cache_key = f"{principal.id}:{principal.iat}"
+    user = _user_cache.get(cache_key)
+    if user is not None:
+        return user
+
+    result = await db.execute(select(User).where(User.id == principal.id))
     user = result.scalars().first()
-    
+
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
+    _user_cache.set(cache_key, user)
     return user
+
+def verify_metrics_token(x_metrics_token: Optional[str] = Header(None)) -> None:
+    """运维指标接口鉴权：未配置 METRICS_TOKEN 时接口不对外暴露"""
+    if not settings.METRICS_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_metrics_token or not secrets.compare_digest(x_metrics_token, settings.METRICS_TOKEN):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid metrics token")
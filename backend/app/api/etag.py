@@ -0,0 +1,42 @@
+"""
+条件请求：由确定性输入 (排盘输入摘要 + 引擎版本、档案更新时间、地名数据版本) 生成强 ETag，
+请求头 If-None-Match 匹配时直接返回 304，无需加载或序列化响应体。
+"""
+import hashlib
+from typing import Optional
+from fastapi import Request, Response
+
+# 客户端每次使用前重新验证，命中时只需一次 304
+CACHE_CONTROL = "private, no-cache"
+
+def make_etag(*parts) -> str:
+    raw = "|".join(str(p) for p in parts)
+    return '"' + hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32] + '"'
+
+def _matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    # If-None-Match 使用弱比较：忽略 W/ 前缀与压缩中间件附加的编码后缀 (如 -gzip)
+    bare = etag.strip('"')
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate.strip('"').split("-", 1)[0] == bare:
+            return True
+    return False
+
+def not_modified(request: Request, etag: str) -> Optional[Response]:
+    """If-None-Match 命中时返回 304 响应，否则返回 None"""
+    header = request.headers.get("if-none-match")
+    if header and _matches(header, etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+    return None
+
+def set_etag(response: Response, etag: str):
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
+
+def set_no_store(response: Response):
+    """响应不完整 (如部分排盘失败) 时不带 ETag，也不允许缓存"""
+    response.headers["Cache-Control"] = "no-store"
@@ -1,23 +1,78 @@
-from typing import List
+from typing import List, Optional
 from uuid import UUID
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.api import deps
+from app.api.etag import make_etag, not_modified, set_etag, set_no_store
 from app.db.session import get_session
 from app.models.user import User
-from app.schemas.archive import ArchiveCreate, ArchiveUpdate, ArchiveRead
+from app.schemas.archive import (
+    ArchiveCreate, ArchiveUpdate, ArchiveRead, ArchiveListItem, BatchChartRequest, BatchChartResponse
+)
 from app.services.archive_service import ArchiveService
-from app.services.bazi_service import BaziService
+from app.services.bazi_service import BaziService, FieldConflict
 from app.services.location_service import LocationService
+from app.services.similarity_service import SimilarityService
+from src.engine.core import ENGINE_VERSION
 
 router = APIRouter()
 
-@router.get("/", response_model=List[ArchiveRead])
+@router.get("/", response_model=List[ArchiveListItem], response_model_exclude_unset=True)
 async def list_archives(
+    request: Request,
+    response: Response,
+    with_: Optional[str] = Query(None, alias="with", description="pillars: 同时返回每个档案的四柱"),
     db: AsyncSession = Depends(get_session),
-    current_user: User = Depends(deps.get_current_user),
+    current_user: deps.Principal = Depends(deps.get_current_principal),
 ):
-    return await ArchiveService.get_multi(db, current_user.id)
+    archives = await ArchiveService.directory(db, current_user.id)
+    tag = make_etag(with_, ENGINE_VERSION if with_ == "pillars" else "",
+                    *(f"{a.id}@{a.updated_at.isoformat()}" for a in archives))
+    cached = not_modified(request, tag)
+    if cached:
+        return cached
+    if with_ != "pillars":
+        set_etag(response, tag)
+        return archives
+    results, errors = await BaziService.get_results(archives)
+    # 部分档案排盘失败 (如执行器繁忙) 时列表不完整：不发 ETag，失败原因随条目返回 (同 bazi:batch 的 errors)
+    if errors:
+        set_no_store(response)
+    else:
+        set_etag(response, tag)
+    items = []
+    for a in archives:
+        item = ArchiveListItem(**ArchiveRead.model_validate(a).model_dump())
+        if str(a.id) in results:
+            item.pillars = BaziService.pillars(results[str(a.id)])
+        else:
+            item.pillars = None
+            item.error = errors.get(str(a.id))
+        items.append(item)
+    return items
+
+@router.post("/bazi:batch", response_model=BatchChartResponse)
+async def get_bazi_charts(
+    obj_in: BatchChartRequest,
+    db: AsyncSession = Depends(get_session),
+    current_user: deps.Principal = Depends(deps.get_current_principal),
+):
+    """一次获取多个档案的排盘结果 (可只取部分字段)，缓存未命中的档案并发排盘"""
+    try:
+        BaziService.check_fields(obj_in.fields)
+    except FieldConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    owned = {str(a.id): a for a in await ArchiveService.directory(db, current_user.id)}
+    ids = list(dict.fromkeys(str(i) for i in obj_in.ids))
+    results, errors = await BaziService.get_results([owned[i] for i in ids if i in owned])
+    return {
+        "charts": {i: BaziService.project(r, obj_in.fields) for i, r in results.items()},
+        "missing": [i for i in ids if i not in owned],
+        "errors": errors,
+    }
 
 @router.post("/", response_model=ArchiveRead)
 async def create_archive(
@@ -28,14 +83,26 @@ async def create_archive(
     return await ArchiveService.create(db, current_user.id, obj_in)
 
 @router.get("/locations")
-async def search_locations(query: str):
+async def search_locations(query: str, request: Request, response: Response):
+    tag = make_etag(LocationService.data_tag(), query)
+    cached = not_modified(request, tag)
+    if cached:
+        return cached
+    set_etag(response, tag)
     return LocationService.search(query)
 
+@router.get("/locations/reverse")
+async def reverse_location(lat: float, lng: float, max_km: Optional[float] = None):
+    location = LocationService.reverse(lat, lng, max_km)
+    if location is None:
+        raise HTTPException(status_code=404, detail="No location nearby")
+    return location
+
 @router.get("/{id}", response_model=ArchiveRead)
 async def get_archive(
     id: UUID,
     db: AsyncSession = Depends(get_session),
-    current_user: User = Depends(deps.get_current_user),
+    current_user: deps.Principal = Depends(deps.get_current_principal),
 ):
     return await ArchiveService.get(db, id, current_user.id)
 
@@ -44,7 +111,7 @@ async def update_archive(
     id: UUID,
     obj_in: ArchiveUpdate,
     db: AsyncSession = Depends(get_session),
-    current_user: User = Depends(deps.get_current_user),
+    current_user: deps.Principal = Depends(deps.get_current_principal),
 ):
     return await ArchiveService.update(db, id, current_user.id, obj_in)
 
@@ -52,23 +119,50 @@ async def update_archive(
 async def delete_archive(
     id: UUID,
     db: AsyncSession = Depends(get_session),
-    current_user: User = Depends(deps.get_current_user),
+    current_user: deps.Principal = Depends(deps.get_current_principal),
 ):
     await ArchiveService.delete(db, id, current_user.id)
     return {"message": "Archive deleted"}
 
 @router.get("/{id}/bazi")
-
 async def get_bazi_chart(
-
     id: UUID,
-
+    request: Request,
+    fields: Optional[str] = Query(
+        None, description="逗号分隔的字段，如 core,analysis,stars,fortune.summary,trace；缺省为全部"
+    ),
+    from_year: Optional[int] = Query(None, description="流年起始年份 (含)"),
+    to_year: Optional[int] = Query(None, description="流年结束年份 (含)"),
     db: AsyncSession = Depends(get_session),
-
-    current_user: User = Depends(deps.get_current_user),
-
+    current_user: deps.Principal = Depends(deps.get_current_principal),
 ):
-
+    selected = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+    try:
+        BaziService.check_fields(selected)
+    except FieldConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     archive = await ArchiveService.get(db, id, current_user.id)
+    # 结果由输入摘要与引擎版本唯一确定：命中时不加载结果
+    tag = make_etag(BaziService.cache_key(archive), fields or "", from_year, to_year)
+    cached = not_modified(request, tag)
+    if cached:
+        return cached
+    if not selected and from_year is None and to_year is None:
+        # 完整结果直接返回缓存的 JSON 字节
+        response = Response(content=await BaziService.get_result_body(archive), media_type="application/json")
+    else:
+        response = JSONResponse(BaziService.project(await BaziService.get_result(archive), selected, from_year, to_year))
+    set_etag(response, tag)
+    return response
 
-    return await BaziService.get_result(archive)
+@router.get("/{id}/similar")
+async def get_similar_charts(
+    id: UUID,
+    k: int = 5,
+    db: AsyncSession = Depends(get_session),
+    current_user: deps.Principal = Depends(deps.get_current_principal),
+):
+    archive = await ArchiveService.get(db, id, current_user.id)
+    return await SimilarityService.similar(db, archive, k)
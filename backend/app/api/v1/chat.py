@@ -9,7 +9,7 @@ from app.db.session import get_session
 from app.models.user import User
 from app.models.chat import ChatSession, Message
 from app.models.fact import MemoryFact
-from app.agent.graph import build_graph
+from app.agent.graph import get_graph
 from app.services.archive_service import ArchiveService
 from app.services.memory_service import MemoryService
 from sqlalchemy.future import select
@@ -39,7 +39,7 @@ async def create_session(
 @router.get("/sessions", response_model=List[ChatSession])
 async def list_sessions(
     db: AsyncSession = Depends(get_session),
-    current_user: User = Depends(deps.get_current_user)
+    current_user: deps.Principal = Depends(deps.get_current_principal)
 ):
     result = await db.execute(
         select(ChatSession).where(ChatSession.user_id == current_user.id).order_by(ChatSession.created_at.desc())
@@ -50,7 +50,7 @@ async def list_sessions(
 async def get_session_messages(
     session_id: UUID,
     db: AsyncSession = Depends(get_session),
-    current_user: User = Depends(deps.get_current_user)
+    current_user: deps.Principal = Depends(deps.get_current_principal)
 ):
     # 简单权限检查
     session_res = await db.execute(select(ChatSession).where(ChatSession.id == session_id, ChatSession.user_id == current_user.id))
@@ -62,6 +62,23 @@ async def get_session_messages(
     )
     return result.scalars().all()
 
+async def _archive_context(db: AsyncSession, user_id: UUID, archive_id: UUID):
+    """
+    从用户档案目录 (进程内缓存) 取会话档案与全部档案：
+    返回 (会话档案, {档案 id: 档案}, 供意图匹配的档案摘要列表)。档案随状态传入图中，节点无需再查询。
+    """
+    directory = await ArchiveService.directory(db, user_id)
+    archives = {str(a.id): a for a in directory}
+    archive = archives.get(str(archive_id))
+    if archive is None:
+        raise HTTPException(status_code=404, detail="Archive not found")
+    # 获取该用户的所有档案，用于跨盘分析
+    user_archives_data = [
+        {"id": str(a.id), "name": a.name, "relation": a.relation, "is_self": a.is_self}
+        for a in directory
+    ]
+    return archive, archives, user_archives_data
+
 @router.post("/completions")
 async def chat_completion(
     session_id: UUID,
@@ -86,18 +103,12 @@ async def chat_completion(
     history_msgs = [{"role": m.role, "content": m.content} for m in reversed(history_res.scalars().all())]
 
     now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    archive = await ArchiveService.get(db, session.archive_id, current_user.id)
-    
-    # 获取该用户的所有档案，用于跨盘分析
-    all_archives = await ArchiveService.get_multi(db, current_user.id)
-    user_archives_data = [
-        {"id": str(a.id), "name": a.name, "relation": a.relation, "is_self": a.is_self}
-        for a in all_archives
-    ]
+    archive, archives, user_archives_data = await _archive_context(db, current_user.id, session.archive_id)
 
-    graph = build_graph()
+    graph = get_graph()
     initial_state = {
         "archive_id": str(session.archive_id),
+        "user_id": str(current_user.id),
         "archive_config": {
             "name": archive.name,
             "gender": archive.gender,
@@ -107,6 +118,7 @@ async def chat_completion(
             "lng": archive.lng
         },
         "user_archives": user_archives_data,
+        "archives": archives,
         "server_time": now,
         "query": content,
         "messages": history_msgs + [{"role": "user", "content": content}],
@@ -176,19 +188,13 @@ async def chat_completion_stream(
     history_msgs = [{"role": m.role, "content": m.content} for m in reversed(history_res.scalars().all())]
 
     now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    archive = await ArchiveService.get(db, session.archive_id, current_user.id)
-
-    # 获取该用户的所有档案，用于跨盘分析
-    all_archives = await ArchiveService.get_multi(db, current_user.id)
-    user_archives_data = [
-        {"id": str(a.id), "name": a.name, "relation": a.relation, "is_self": a.is_self}
-        for a in all_archives
-    ]
+    archive, archives, user_archives_data = await _archive_context(db, current_user.id, session.archive_id)
 
     async def event_generator():
-        graph = build_graph()
+        graph = get_graph()
         initial_state = {
             "archive_id": str(session.archive_id),
+            "user_id": str(current_user.id),
             "archive_config": {
                 "name": archive.name,
                 "gender": archive.gender,
@@ -198,6 +204,7 @@ async def chat_completion_stream(
                 "lng": archive.lng
             },
             "user_archives": user_archives_data,
+            "archives": archives,
             "server_time": now,
             "query": content,
             "messages": history_msgs,
@@ -312,7 +319,7 @@ async def chat_completion_stream(
 async def delete_session(
     session_id: UUID,
     db: AsyncSession = Depends(get_session),
-    current_user: User = Depends(deps.get_current_user)
+    current_user: deps.Principal = Depends(deps.get_current_principal)
 ):
     # 1. 删除关联消息
     stmt_msgs = delete(Message).where(Message.session_id == session_id)
@@ -329,7 +336,7 @@ async def delete_session(
 async def get_session_facts(
     session_id: UUID,
     db: AsyncSession = Depends(get_session),
-    current_user: User = Depends(deps.get_current_user)
+    current_user: deps.Principal = Depends(deps.get_current_principal)
 ):
     session_res = await db.execute(select(ChatSession).where(ChatSession.id == session_id, ChatSession.user_id == current_user.id))
     session = session_res.scalars().first()
@@ -350,9 +357,7 @@ async def get_session_facts(
 async def delete_fact(
     fact_id: UUID,
     db: AsyncSession = Depends(get_session),
-    current_user: User = Depends(deps.get_current_user)
+    current_user: deps.Principal = Depends(deps.get_current_principal)
 ):
-    stmt = delete(MemoryFact).where(MemoryFact.id == fact_id)
-    await db.execute(stmt)
-    await db.commit()
+    await MemoryService.delete_fact(db, fact_id)
     return {"message": "Fact deleted"}
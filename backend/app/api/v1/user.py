@@ -3,6 +3,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.api import deps
 from app.models.user import User, UserUpdate
 from app.db.session import get_session
+from app.core import invalidation
 
 router = APIRouter()
 
@@ -13,9 +14,13 @@ async def read_user_me(current_user: User = Depends(deps.get_current_user)):
 @router.patch("/me")
 async def update_user_me(
     obj_in: UserUpdate,
-    current_user: User = Depends(deps.get_current_user),
+    principal: deps.Principal = Depends(deps.get_current_principal),
     db: AsyncSession = Depends(get_session),
 ):
+    # 不修改缓存中共享的用户对象，重新查询后更新
+    current_user = await db.get(User, principal.id)
+    if not current_user:
+        raise HTTPException(status_code=404, detail="User not found")
     update_data = obj_in.dict(exclude_unset=True)
     for field in update_data:
         setattr(current_user, field, update_data[field])
@@ -23,4 +28,5 @@ async def update_user_me(
     db.add(current_user)
     await db.commit()
     await db.refresh(current_user)
+    await invalidation.publish(invalidation.USER, str(current_user.id))
     return current_user
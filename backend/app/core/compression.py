@@ -0,0 +1,152 @@
+"""
+响应压缩中间件 (开发模式直连 uvicorn、内部调用时没有 Nginx 压缩)：
+- 按 Accept-Encoding 选择 br / zstd / gzip，br 与 zstd 仅在安装了 brotli / zstandard 时启用
+- 只压缩一次性发送的完整响应体且不小于 COMPRESSION_MIN_SIZE；text/event-stream 与分块流式响应原样透传，不缓冲
+- 带 ETag 的响应按 "ETag + 编码" 缓存压缩结果：ETag 由确定性输入生成，同一排盘结果重复命中时不再重复压缩
+- 压缩后的 ETag 附加编码后缀 (如 "...-gzip")，条件请求时 app.api.etag 会忽略该后缀
+"""
+import gzip
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from app.core.cache import LRUCache
+from app.core.config import settings
+
+def _gzip(body: bytes) -> bytes:
+    return gzip.compress(body, compresslevel=6, mtime=0)
+
+def _brotli() -> Optional[Callable[[bytes], bytes]]:
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return lambda body: brotli.compress(body, quality=5)
+
+def _zstd() -> Optional[Callable[[bytes], bytes]]:
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard.ZstdCompressor(level=3).compress
+
+def _available() -> List[Tuple[str, Callable[[bytes], bytes]]]:
+    """按优先级排列的可用编码"""
+    encoders = [("br", _brotli()), ("zstd", _zstd()), ("gzip", _gzip)]
+    return [(name, fn) for name, fn in encoders if fn is not None]
+
+ENCODERS = _available()
+
+# 压缩结果缓存，键为 "ETag:编码"
+_compressed_cache = LRUCache(maxsize=settings.COMPRESSION_CACHE_SIZE)
+
+def choose_encoding(accept_encoding: str) -> Optional[Tuple[str, Callable[[bytes], bytes]]]:
+    accepted = set()
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        params = params.replace(" ", "")
+        if params.startswith("q="):
+            try:
+                if float(params[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(name.strip())
+    for name, fn in ENCODERS:
+        if name in accepted or "*" in accepted:
+            return name, fn
+    return None
+
+def _with_suffix(etag: str, encoding: str) -> str:
+    prefix = "W/" if etag.startswith("W/") else ""
+    bare = etag[len(prefix):].strip('"')
+    return f'{prefix}"{bare}-{encoding}"'
+
+def compression_stats() -> Dict[str, Any]:
+    return {"encodings": [name for name, _ in ENCODERS], **_compressed_cache.stats()}
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = None):
+        self.app = app
+        self.minimum_size = settings.COMPRESSION_MIN_SIZE if minimum_size is None else minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_headers = {k.lower(): v for k, v in scope["headers"]}
+        chosen = choose_encoding(request_headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if chosen is None:
+            await self.app(scope, receive, send)
+            return
+        encoding, compress = chosen
+        if_none_match = request_headers.get(b"if-none-match", b"").decode("latin-1")
+
+        start = None
+        passthrough = False
+
+        async def wrapped_send(message):
+            nonlocal start, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                headers = {k.lower(): v for k, v in message.get("headers", [])}
+                content_type = headers.get(b"content-type", b"").decode("latin-1")
+                if message["status"] == 304:
+                    # 客户端缓存的是压缩表示时，304 返回同一个带后缀的 ETag
+                    etag = headers.get(b"etag", b"").decode("latin-1")
+                    if etag:
+                        suffixed = _with_suffix(etag, encoding)
+                        if suffixed.split('"')[1] in if_none_match:
+                            message = {**message, "headers": _replace_header(
+                                message["headers"], b"etag", suffixed.encode("latin-1"))}
+                    passthrough = True
+                    await send(message)
+                elif content_type.startswith("text/event-stream") or b"content-encoding" in headers:
+                    passthrough = True
+                    await send(message)
+                else:
+                    start = message
+                return
+
+            body = message.get("body", b"")
+            if message.get("more_body", False):
+                # 分块流式响应不缓冲
+                passthrough = True
+                await send(start)
+                await send(message)
+                return
+            if len(body) < self.minimum_size or start["status"] < 200 or start["status"] in (204, 206):
+                await send(start)
+                await send(message)
+                return
+
+            headers = {k.lower(): v for k, v in start.get("headers", [])}
+            etag = headers.get(b"etag", b"").decode("latin-1")
+            key = f"{etag}:{encoding}"
+            compressed = _compressed_cache.get(key) if etag else None
+            if compressed is None:
+                compressed = compress(body)
+                if etag:
+                    _compressed_cache.set(key, compressed)
+            if len(compressed) >= len(body):
+                await send(start)
+                await send(message)
+                return
+
+            raw_headers = _replace_header(start["headers"], b"content-length", str(len(compressed)).encode())
+            raw_headers = _replace_header(raw_headers, b"content-encoding", encoding.encode())
+            if etag:
+                raw_headers = _replace_header(raw_headers, b"etag", _with_suffix(etag, encoding).encode("latin-1"))
+            vary = headers.get(b"vary")
+            if vary is None:
+                raw_headers.append((b"vary", b"Accept-Encoding"))
+            elif b"accept-encoding" not in vary.lower():
+                raw_headers = _replace_header(raw_headers, b"vary", vary + b", Accept-Encoding")
+            await send({**start, "headers": raw_headers})
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, wrapped_send)
+
+def _replace_header(headers, name: bytes, value: bytes) -> List[Tuple[bytes, bytes]]:
+    result = [(k, v) for k, v in headers if k.lower() != name]
+    result.append((name, value))
+    return result
@@ -19,6 +19,31 @@ class Settings(BaseSettings):
         return f"postgresql+asyncpg://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}@{self.POSTGRES_SERVER}/{self.POSTGRES_DB}"
 
     REDIS_URL: str = "redis://redis:6379/0"
+
+    # 排盘执行器 (process / thread)：排盘在池中运行，不阻塞事件循环
+    ENGINE_EXECUTOR: str = "process"
+    ENGINE_WORKERS: int = 2
+    ENGINE_MAX_QUEUE: int = 32       # 排队上限，超出时返回 503
+    ENGINE_TIMEOUT: float = 20.0     # 单次排盘超时 (秒)，超时返回 504
+
+    # 排盘结果缓存：进程内 LRU 在前，Redis 在后
+    CHART_CACHE_SIZE: int = 256
+    CHART_FULL_CACHE_SIZE: int = 32
+    CHART_LOCAL_TTL: int = 600
+    CHART_CACHE_TTL: int = 86400
+    CHART_REMATERIALIZE_LOCK_TTL: int = 3600  # 引擎版本升级后的后台重算任务锁
+
+    # 当前用户对象的进程内缓存 (秒)
+    USER_CACHE_SIZE: int = 1024
+    USER_CACHE_TTL: int = 60
+    # 用户档案目录的进程内缓存 (秒)
+    ARCHIVE_DIRECTORY_CACHE_SIZE: int = 1024
+    ARCHIVE_DIRECTORY_CACHE_TTL: int = 300
+    # 响应压缩：小于阈值 (字节) 的响应不压缩；压缩结果按 ETag 缓存的条数
+    COMPRESSION_MIN_SIZE: int = 1024
+    COMPRESSION_CACHE_SIZE: int = 256
+    # /metrics/* 运维指标接口的访问令牌 (请求头 X-Metrics-Token)，未配置时接口关闭
+    METRICS_TOKEN: Optional[str] = None
     
     # SMTP
     SMTP_TLS: bool = True
@@ -0,0 +1,100 @@
+"""
+跨进程缓存失效总线：写操作发布 (主题, 键)，本进程立即执行已注册的处理器，
+其他工作进程通过 Redis pub/sub 收到后执行各自的处理器。
+
+主题与键：
+    chart    档案 id     排盘结果 (进程内 LRU)
+    archives 用户 id     用户的档案列表/目录
+    user     用户 id     当前用户对象
+    facts    档案 id     记忆事实检索结果
+
+用法:
+    invalidation.subscribe(CHART, lambda key: ...)      # 模块加载时注册本地缓存的清理函数
+    await invalidation.publish(CHART, str(archive.id))
+    asyncio.create_task(invalidation.listen())          # 每个工作进程启动时监听
+"""
+import asyncio
+import json
+import uuid
+from typing import Callable, Dict, List, Optional
+from app.core import redis as redis_module
+
+CHANNEL = "cache_invalidate"
+
+CHART = "chart"
+ARCHIVES = "archives"
+USER = "user"
+FACTS = "facts"
+
+class InvalidationBus:
+    """
+    client: Redis 客户端，None 时使用 app.core.redis 的全局客户端 (便于测试替换)。
+    每个实例代表一个工作进程，收到自己发布的消息时跳过 (发布时已在本地执行)。
+    """
+
+    def __init__(self, client=None, channel: str = CHANNEL):
+        self._client = client
+        self.channel = channel
+        self.worker_id = uuid.uuid4().hex
+        self._handlers: Dict[str, List[Callable[[str], None]]] = {}
+        self.received = 0
+
+    @property
+    def client(self):
+        return self._client or redis_module.redis_client
+
+    def subscribe(self, topic: str, handler: Callable[[str], None]):
+        self._handlers.setdefault(topic, []).append(handler)
+
+    def dispatch(self, topic: str, key: str):
+        for handler in self._handlers.get(topic, []):
+            try:
+                handler(key)
+            except Exception as e:
+                print(f"Invalidation handler error ({topic}): {e}")
+
+    async def publish(self, topic: str, key: str):
+        self.dispatch(topic, key)
+        try:
+            await self.client.publish(
+                self.channel, json.dumps({"topic": topic, "key": key, "origin": self.worker_id})
+            )
+        except Exception as e:
+            print(f"Redis publish error: {e}")
+
+    async def _listen_once(self, ready: Optional[asyncio.Event]):
+        pubsub = self.client.pubsub()
+        await pubsub.subscribe(self.channel)
+        if ready is not None:
+            ready.set()
+        try:
+            async for message in pubsub.listen():
+                if message.get("type") != "message":
+                    continue
+                try:
+                    data = json.loads(message["data"])
+                except (TypeError, ValueError):
+                    continue
+                if data.get("origin") != self.worker_id:
+                    self.received += 1
+                    self.dispatch(data.get("topic"), data.get("key"))
+        finally:
+            await pubsub.unsubscribe(self.channel)
+            await pubsub.close()
+
+    async def listen(self, retry_delay: float = 1.0, ready: Optional[asyncio.Event] = None):
+        """订阅失效频道并分发给本地处理器，直到任务被取消；连接断开时自动重连。ready 在订阅成功后置位"""
+        while True:
+            try:
+                await self._listen_once(ready)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Invalidation listener error: {e}")
+            await asyncio.sleep(retry_delay)
+
+# 本进程的总线
+bus = InvalidationBus()
+subscribe = bus.subscribe
+publish = bus.publish
+listen = bus.listen
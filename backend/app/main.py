@@ -1,11 +1,47 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from app.api.deps import verify_metrics_token
 from app.api.v1 import auth, archive, chat, user
 from app.core.config import settings
+from app.core import invalidation
+from app.core.compression import CompressionMiddleware, compression_stats
+from app.agent.graph import get_graph
+from app.services.bazi_service import BaziService  # 导入时将 zpbz 加入 sys.path
+from app.services.chart_store import ChartStore
+from src.engine.executor import EngineBusy, EngineTimeout, configure_executor, default_executor
+from src.engine.similarity import famous_case_index
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    executor = configure_executor(
+        kind=settings.ENGINE_EXECUTOR,
+        workers=settings.ENGINE_WORKERS,
+        max_queue=settings.ENGINE_MAX_QUEUE,
+        timeout=settings.ENGINE_TIMEOUT,
+    )
+    # 启动排盘执行器并预热 (地名索引、神煞查表、校验器与历法缓存)：进程池时在每个工作进程内预热，
+    # 避免重启后的首批请求承担创建进程与加载开销
+    await executor.start()
+    # 构建名人命例相似度索引 (批量排盘，放到线程中执行)，避免首个相似命盘请求阻塞事件循环
+    await asyncio.to_thread(famous_case_index)
+    # 编译对话图 (各请求共用)，避免首轮对话承担构建开销
+    get_graph()
+    # 引擎版本升级后在后台补算持久化排盘结果 (多进程间以 Redis 锁互斥)
+    rematerialize = asyncio.create_task(ChartStore.rematerialize())
+    # 接收其他工作进程发布的缓存失效消息
+    listener = asyncio.create_task(invalidation.listen())
+    yield
+    rematerialize.cancel()
+    listener.cancel()
+    executor.shutdown(wait=False)
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
-    openapi_url=f"{settings.API_V1_STR}/openapi.json"
+    openapi_url=f"{settings.API_V1_STR}/openapi.json",
+    lifespan=lifespan
 )
 
 # Set all CORS enabled origins
@@ -16,12 +52,32 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# 压缩大体积 JSON (排盘结果、消息列表)，SSE 流式响应不经缓冲直接透传
+app.add_middleware(CompressionMiddleware)
 
 app.include_router(auth, prefix=f"{settings.API_V1_STR}/auth", tags=["auth"])
 app.include_router(user, prefix=f"{settings.API_V1_STR}/users", tags=["users"])
 app.include_router(archive, prefix=f"{settings.API_V1_STR}/archives", tags=["archives"])
 app.include_router(chat, prefix=f"{settings.API_V1_STR}/chat", tags=["chat"])
 
+@app.exception_handler(EngineBusy)
+async def engine_busy_handler(request: Request, exc: EngineBusy):
+    return JSONResponse(status_code=503, content={"detail": "排盘服务繁忙，请稍后重试"}, headers={"Retry-After": "1"})
+
+@app.exception_handler(EngineTimeout)
+async def engine_timeout_handler(request: Request, exc: EngineTimeout):
+    return JSONResponse(status_code=504, content={"detail": "排盘超时"})
+
 @app.get("/")
 def root():
     return {"message": "Ziping Zhenjun AI API is running"}
+
+@app.get("/metrics/engine", dependencies=[Depends(verify_metrics_token)])
+def engine_metrics():
+    """排盘执行器的排队深度与累计计数"""
+    return default_executor().stats()
+
+@app.get("/metrics/cache", dependencies=[Depends(verify_metrics_token)])
+def cache_metrics():
+    """排盘结果缓存的命中/未命中计数"""
+    return {**BaziService.cache_stats(), "compressed": compression_stats()}
@@ -0,0 +1,20 @@
+from uuid import UUID
+from datetime import datetime
+from sqlmodel import SQLModel, Field, Column
+from sqlalchemy import ForeignKey
+from sqlalchemy.dialects.postgresql import JSONB
+
+class ArchiveChart(SQLModel, table=True):
+    """档案的持久化排盘结果，按输入摘要与引擎版本区分"""
+    __tablename__ = "archive_charts"
+
+    archive_id: UUID = Field(
+        sa_column=Column(
+            ForeignKey("archives.id", ondelete="CASCADE"),
+            primary_key=True
+        )
+    )
+    input_digest: str = Field(primary_key=True, max_length=64)
+    engine_version: str = Field(primary_key=True, max_length=32)
+    result: dict = Field(sa_column=Column(JSONB, nullable=False))
+    created_at: datetime = Field(default_factory=datetime.utcnow)
@@ -1,7 +1,7 @@
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from uuid import UUID
 from datetime import datetime
-from pydantic import BaseModel, field_validator
+from pydantic import BaseModel, Field, field_validator
 
 class ArchiveBase(BaseModel):
     name: str
@@ -56,3 +56,21 @@ class ArchiveRead(ArchiveBase):
 
     class Config:
         from_attributes = True
+
+class ArchiveListItem(ArchiveRead):
+    # 仅在 ?with=pillars 时返回：{"year": "己巳", "month": ..., "day": ..., "time": ...}
+    pillars: Optional[Dict[str, str]] = None
+    # 排盘失败时的错误信息 (此时 pillars 为 null)
+    error: Optional[str] = None
+
+class BatchChartRequest(BaseModel):
+    ids: List[UUID] = Field(min_length=1, max_length=50)
+    # 字段子集 (同 GET /archives/{id}/bazi 的 fields)，缺省返回全部
+    fields: Optional[List[str]] = None
+
+class BatchChartResponse(BaseModel):
+    charts: Dict[str, Dict[str, Any]]
+    # 不存在或无权访问的档案
+    missing: List[str] = []
+    # 排盘失败的档案 (如排盘服务繁忙)，可稍后重试
+    errors: Dict[str, str] = {}
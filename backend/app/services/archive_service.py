@@ -5,18 +5,36 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from app.models.archive import Archive
 from app.schemas.archive import ArchiveCreate, ArchiveUpdate
+from app.services.bazi_service import BaziService
+from app.core import invalidation
+from app.core.cache import LRUCache
+from app.core.config import settings
 from fastapi import HTTPException
 
+# 用户档案目录的进程内缓存，键为用户 id
+_directory_cache = LRUCache(maxsize=settings.ARCHIVE_DIRECTORY_CACHE_SIZE, ttl=settings.ARCHIVE_DIRECTORY_CACHE_TTL)
+invalidation.subscribe(invalidation.ARCHIVES, _directory_cache.delete)
+
 class ArchiveService:
     @staticmethod
     async def create(db: AsyncSession, user_id: UUID, obj_in: ArchiveCreate) -> Archive:
+        data = obj_in.dict()
+        # 地图选点或导入数据只有坐标时，补全最近的地名
+        if not data["location_name"].strip():
+            from app.services.location_service import LocationService
+            nearest = LocationService.reverse(data["lat"], data["lng"])
+            if nearest:
+                data["location_name"] = nearest["name"]
         db_obj = Archive(
-            **obj_in.dict(),
+            **data,
             user_id=user_id
         )
         db.add(db_obj)
         await db.commit()
         await db.refresh(db_obj)
+        await invalidation.publish(invalidation.ARCHIVES, str(user_id))
+        # 后台排盘并持久化，首次查看命盘时直接命中
+        BaziService.schedule_precompute(db_obj)
         return db_obj
 
     @staticmethod
@@ -24,6 +42,21 @@ class ArchiveService:
         result = await db.execute(select(Archive).where(Archive.user_id == user_id))
         return result.scalars().all()
 
+    @staticmethod
+    async def directory(db: AsyncSession, user_id: UUID) -> List[Archive]:
+        """
+        用户全部档案的只读快照 (聊天每轮用于意图匹配与排盘)，进程内缓存；
+        档案创建、修改、删除时经失效总线清除各进程的缓存。
+        """
+        key = str(user_id)
+        cached = _directory_cache.get(key)
+        if cached is not None:
+            return cached
+        # 复制为不属于任何会话的对象，避免与请求会话共享状态
+        archives = [Archive(**a.model_dump()) for a in await ArchiveService.get_multi(db, user_id)]
+        _directory_cache.set(key, archives)
+        return archives
+
     @staticmethod
     async def get(db: AsyncSession, id: UUID, user_id: Optional[UUID] = None) -> Archive:
         query = select(Archive).where(Archive.id == id)
@@ -47,6 +80,9 @@ class ArchiveService:
         db.add(db_obj)
         await db.commit()
         await db.refresh(db_obj)
+        await invalidation.publish(invalidation.ARCHIVES, str(user_id))
+        await BaziService.invalidate(db_obj.id)
+        BaziService.schedule_precompute(db_obj)
         return db_obj
 
     @staticmethod
@@ -54,4 +90,6 @@ class ArchiveService:
         db_obj = await ArchiveService.get(db, id, user_id)
         await db.delete(db_obj)
         await db.commit()
+        await invalidation.publish(invalidation.ARCHIVES, str(user_id))
+        await BaziService.invalidate(id, keep_latest=False)
         return db_obj
@@ -3,23 +3,58 @@ import os
 from datetime import datetime
 import numpy as np
 import json
+import hashlib
+import asyncio
+from typing import Dict, List, Optional, Set, Tuple
 
 # 将 zpbz 源代码路径添加到 sys.path
 ENGINE_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../../zpbz"))
 if ENGINE_PATH not in sys.path:
     sys.path.append(ENGINE_PATH)
 
-from src.engine.core import BaziEngine
+from src.engine.core import BaziEngine, BaziResult, ENGINE_VERSION
 from src.engine.models import BaziRequest, Gender, CalendarType, TimeMode, MonthMode, ZiShiMode
 from app.models.archive import Archive
 from app.core.redis import redis_client
+from app.core.config import settings
+from app.core.cache import LRUCache, SingleFlight
+from app.core import invalidation
+from app.services.chart_store import ChartStore
+
+# 进程内一级缓存 (Redis 为二级)；缓存的结果字典由多个调用方共享，只读使用
+_local_cache = LRUCache(maxsize=settings.CHART_CACHE_SIZE, ttl=settings.CHART_LOCAL_TTL)
+_inflight = SingleFlight()
+# 字段选择：别名与只含大运概览的 fortune.summary
+FIELD_ALIASES = {"trace": "analysis_trace"}
+FORTUNE_SUMMARY = "fortune.summary"
+
+class FieldConflict(ValueError):
+    """同时选择了互斥的字段 (fortune 与 fortune.summary 都写入 fortune 键)"""
+
+_counters = {"redis_hits": 0, "redis_misses": 0, "store_hits": 0, "store_misses": 0, "computed": 0, "computed_full": 0}
+# 含流月的完整结果体积大，单独使用较小的进程内缓存
+_full_cache = LRUCache(maxsize=settings.CHART_FULL_CACHE_SIZE, ttl=settings.CHART_LOCAL_TTL)
+# 后台预计算任务 (持有引用防止被回收)
+_background: Set[asyncio.Task] = set()
+
+# 完整结果的 JSON 字节，未做字段选择的请求直接返回，不再逐次序列化
+_body_cache = LRUCache(maxsize=settings.CHART_CACHE_SIZE, ttl=settings.CHART_LOCAL_TTL)
+
+def _drop_local(archive_id: str):
+    _local_cache.delete_prefix(f"bazi_res:{archive_id}:")
+    _body_cache.delete_prefix(f"bazi_res:{archive_id}:")
+    _full_cache.delete_prefix(f"bazi_full:{archive_id}:")
+
+invalidation.subscribe(invalidation.CHART, _drop_local)
 
 class BaziService:
     @staticmethod
-    async def get_result(archive: Archive):
-        # 1. 尝试从缓存获取
-        # 缓存键必须包含所有影响排盘结果的变量
-        cache_params = {
+    def input_digest(archive: Archive) -> str:
+        """影响排盘结果的全部输入的稳定摘要 (跨进程、跨重启一致)"""
+        # 缓存键必须包含所有影响排盘结果的变量；姓名与地名会写入结果 (如 analysis_trace)，同样计入
+        params = {
+            "name": archive.name,
+            "location_name": archive.location_name,
             "birth_time": archive.birth_time.strftime("%Y-%m-%d %H:%M:%S"),
             "calendar_type": archive.calendar_type,
             "gender": archive.gender,
@@ -27,18 +62,178 @@ class BaziService:
             "lat": float(archive.lat),
             "config": archive.algorithms_config
         }
-        cache_key = f"bazi_res:{archive.id}:{hash(json.dumps(cache_params, sort_keys=True))}"
+        raw = json.dumps(params, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+    @staticmethod
+    def cache_key(archive: Archive, digest: str = None) -> str:
+        return f"bazi_res:{archive.id}:{ENGINE_VERSION}:{digest or BaziService.input_digest(archive)}"
+
+    @staticmethod
+    async def get_result(archive: Archive):
+        # 1. 进程内缓存
+        digest = BaziService.input_digest(archive)
+        cache_key = BaziService.cache_key(archive, digest)
+        cached = _local_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        # 2. Redis、Postgres 或重新排盘；同一键的并发请求只执行一次
+        return await _inflight.do(cache_key, lambda: BaziService._load(archive, digest, cache_key))
+
+    @staticmethod
+    async def get_result_body(archive: Archive) -> bytes:
+        """完整排盘结果的 JSON 编码 (与 FastAPI JSONResponse 的编码一致)，按缓存键复用"""
+        cache_key = BaziService.cache_key(archive)
+        body = _body_cache.get(cache_key)
+        if body is None:
+            result = await BaziService.get_result(archive)
+            body = json.dumps(result, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+            _body_cache.set(cache_key, body)
+        return body
+
+    @staticmethod
+    async def _load(archive: Archive, digest: str, cache_key: str):
+        # 档案最近一次排盘结果，编辑档案后用于增量重排
+        latest_key = f"bazi_res:{archive.id}:{ENGINE_VERSION}:latest"
         try:
             cached = await redis_client.get(cache_key)
             if cached:
-                return json.loads(cached)
+                _counters["redis_hits"] += 1
+                result = json.loads(cached)
+                _local_cache.set(cache_key, result)
+                return result
+            _counters["redis_misses"] += 1
+        except Exception as e:
+            print(f"Redis error: {e}")
+
+        # 3. 持久化结果 (当前引擎版本)
+        try:
+            stored = await ChartStore.get(archive.id, digest)
+        except Exception as e:
+            print(f"Chart store error: {e}")
+            stored = None
+        if stored is not None:
+            _counters["store_hits"] += 1
+            _local_cache.set(cache_key, stored)
+            await BaziService._save_redis(cache_key, latest_key, stored)
+            return stored
+        _counters["store_misses"] += 1
+
+        previous = None
+        try:
+            latest = await redis_client.get(latest_key)
+            if latest:
+                previous = BaziResult.model_validate(json.loads(latest))
         except Exception as e:
             print(f"Redis error: {e}")
 
         engine = BaziEngine()
         
         # 转换模型
-        request = BaziRequest(
+        request = BaziService.build_request(archive)
+        
+        # 优化：跳过流月计算以加速初始排盘；有上次结果时只重算输入变化的阶段
+        # 排盘在执行器 (进程/线程池) 中运行；队列满或超时抛出 EngineBusy / EngineTimeout，由全局处理器转为 503 / 504
+        if previous is not None:
+            result = await engine.rearrange_async(previous, request, skip_liu_yue=True)
+        else:
+            result = await engine.arrange_async(request, skip_liu_yue=True)
+        _counters["computed"] += 1
+        
+        # 转换数据类型以支持 JSON 序列化
+        processed_res = BaziService._convert_numpy(result.dict())
+        _local_cache.set(cache_key, processed_res)
+        
+        # 4. 写入 Postgres 与 Redis
+        try:
+            await ChartStore.save(archive.id, digest, processed_res)
+        except Exception as e:
+            print(f"Chart store save error: {e}")
+        await BaziService._save_redis(cache_key, latest_key, processed_res)
+            
+        return processed_res
+
+    @staticmethod
+    async def get_full_result(archive: Archive):
+        """含流月的完整排盘结果 (流年流月工具使用)，仅缓存于进程内与 Redis"""
+        digest = BaziService.input_digest(archive)
+        cache_key = f"bazi_full:{archive.id}:{ENGINE_VERSION}:{digest}"
+        cached = _full_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        return await _inflight.do(cache_key, lambda: BaziService._load_full(archive, cache_key))
+
+    @staticmethod
+    async def _load_full(archive: Archive, cache_key: str):
+        try:
+            cached = await redis_client.get(cache_key)
+            if cached:
+                result = json.loads(cached)
+                _full_cache.set(cache_key, result)
+                return result
+        except Exception as e:
+            print(f"Redis error: {e}")
+
+        result = await BaziEngine().arrange_async(BaziService.build_request(archive), skip_liu_yue=False)
+        _counters["computed_full"] += 1
+        processed_res = BaziService._convert_numpy(result.dict())
+        _full_cache.set(cache_key, processed_res)
+        try:
+            await redis_client.set(cache_key, json.dumps(processed_res), ex=settings.CHART_CACHE_TTL)
+        except Exception as e:
+            print(f"Redis save error: {e}")
+        return processed_res
+
+    @staticmethod
+    def schedule_precompute(archive: Archive):
+        """后台预先计算基础与完整排盘结果，使档案创建或修改后的首次查看无需等待"""
+        async def run():
+            try:
+                await BaziService.get_result(archive)
+                await BaziService.get_full_result(archive)
+            except Exception as e:
+                print(f"Chart precompute error for archive {archive.id}: {e}")
+        task = asyncio.create_task(run())
+        _background.add(task)
+        task.add_done_callback(_background.discard)
+        return task
+
+    @staticmethod
+    async def wait_background():
+        """等待已调度的后台预计算完成 (测试与停机时使用)"""
+        if _background:
+            await asyncio.gather(*list(_background), return_exceptions=True)
+
+    @staticmethod
+    async def invalidate(archive_id, keep_latest: bool = True):
+        """
+        清除档案在各级缓存中的排盘结果，并通知其他工作进程清除其进程内缓存。
+        keep_latest: 保留最近一次结果供修改后的增量重排使用 (删除档案时为 False)。
+        持久化结果由 ChartStore.save 替换旧输入，删除档案时随外键级联删除。
+        """
+        await invalidation.publish(invalidation.CHART, str(archive_id))
+        try:
+            keys = [k for pattern in (f"bazi_res:{archive_id}:*", f"bazi_full:{archive_id}:*")
+                    async for k in redis_client.scan_iter(match=pattern)]
+            if keep_latest:
+                keys = [k for k in keys if not k.endswith(":latest")]
+            if keys:
+                await redis_client.delete(*keys)
+        except Exception as e:
+            print(f"Redis error: {e}")
+
+    @staticmethod
+    async def _save_redis(cache_key: str, latest_key: str, result: dict):
+        try:
+            payload = json.dumps(result)
+            await redis_client.set(cache_key, payload, ex=settings.CHART_CACHE_TTL)
+            await redis_client.set(latest_key, payload, ex=settings.CHART_CACHE_TTL)
+        except Exception as e:
+            print(f"Redis save error: {e}")
+
+    @staticmethod
+    def build_request(archive: Archive) -> BaziRequest:
+        return BaziRequest(
             name=archive.name,
             gender=Gender.MALE if archive.gender == 1 else Gender.FEMALE,
             calendar_type=CalendarType.SOLAR if archive.calendar_type == "SOLAR" else CalendarType.LUNAR,
@@ -50,20 +245,12 @@ class BaziService:
             month_mode=MonthMode[archive.algorithms_config.get("month_mode", "SOLAR_TERM")],
             zi_shi_mode=ZiShiMode[archive.algorithms_config.get("zi_shi_mode", "LATE_ZI_IN_DAY")]
         )
-        
-        # 优化：跳过流月计算以加速初始排盘
-        result = engine.arrange(request, skip_liu_yue=True)
-        
-        # 转换数据类型以支持 JSON 序列化
-        processed_res = BaziService._convert_numpy(result.dict())
-        
-        # 2. 存入缓存 (有效期 24 小时)
-        try:
-            await redis_client.set(cache_key, json.dumps(processed_res), ex=86400)
-        except Exception as e:
-            print(f"Redis save error: {e}")
-            
-        return processed_res
+
+    @staticmethod
+    def cache_stats():
+        """进程内、Redis 与 Postgres 三级的命中计数及合并加载次数"""
+        return {"local": _local_cache.stats(), "local_full": _full_cache.stats(), "body": _body_cache.stats(), **_counters,
+                "single_flight": _inflight.stats(), "background": len(_background)}
 
     @staticmethod
     def _convert_numpy(obj):
@@ -85,6 +272,94 @@ class BaziService:
             return [BaziService._convert_numpy(i) for i in obj]
         return obj
 
+    @staticmethod
+    async def get_results(archives: List[Archive]) -> Tuple[Dict[str, dict], Dict[str, str]]:
+        """
+        批量获取排盘结果：缓存未命中的档案并发提交到排盘执行器。
+        返回 ({档案 id: 结果}, {档案 id: 错误信息})，单个档案失败不影响其他档案。
+        """
+        outcomes = await asyncio.gather(*[BaziService.get_result(a) for a in archives], return_exceptions=True)
+        results, errors = {}, {}
+        for archive, outcome in zip(archives, outcomes):
+            if isinstance(outcome, Exception):
+                errors[str(archive.id)] = f"{type(outcome).__name__}: {outcome}"
+            else:
+                results[str(archive.id)] = outcome
+        return results, errors
+
+    @staticmethod
+    def check_fields(fields: Optional[List[str]]):
+        """
+        校验字段名 (BaziResult 顶层字段，或别名 trace / fortune.summary)，未知字段抛出 ValueError；
+        fortune 与 fortune.summary 同时选择时抛出 FieldConflict
+        """
+        known = list(BaziResult.model_fields) + list(FIELD_ALIASES) + [FORTUNE_SUMMARY]
+        unknown = [f for f in fields or [] if f not in known]
+        if unknown:
+            raise ValueError(f"未知字段: {', '.join(unknown)}，可选: {', '.join(known)}")
+        if "fortune" in (fields or []) and FORTUNE_SUMMARY in fields:
+            raise FieldConflict(f"fortune 与 {FORTUNE_SUMMARY} 不能同时选择")
+
+    @staticmethod
+    def project(result: dict, fields: Optional[List[str]] = None,
+                from_year: Optional[int] = None, to_year: Optional[int] = None) -> dict:
+        """
+        从缓存结果中按字段与年份范围取子集 (只构造新的外层字典，不复制未选中的部分)。
+        fields 缺省为全部顶层字段；fortune.summary 只含大运概览 (与 fortune 互斥，由 check_fields 校验)。
+        from_year/to_year 截取大运流年；对 fortune.summary 则只保留含该范围内流年的大运。
+        """
+        if not fields and from_year is None and to_year is None:
+            return result
+        out = {}
+        for field in fields or list(result):
+            if field == FORTUNE_SUMMARY:
+                fortune = BaziService.fortune_range(result.get("fortune") or {}, from_year, to_year)
+                out["fortune"] = BaziService.fortune_summary(fortune)
+            elif field == "fortune":
+                out["fortune"] = BaziService.fortune_range(result.get("fortune") or {}, from_year, to_year)
+            else:
+                key = FIELD_ALIASES.get(field, field)
+                out[key] = result.get(key)
+        return out
+
+    @staticmethod
+    def fortune_summary(fortune: dict) -> dict:
+        # 仅保留大运的时间和干支概览
+        return {
+            "start_solar": fortune.get("start_solar"),
+            "start_age": fortune.get("start_age"),
+            "da_yun": [
+                {"index": dy.get("index"), "start_year": dy.get("start_year"),
+                 "start_age": dy.get("start_age"), "gan_zhi": dy.get("gan_zhi")}
+                for dy in fortune.get("da_yun", [])
+            ]
+        }
+
+    @staticmethod
+    def fortune_range(fortune: dict, from_year: Optional[int], to_year: Optional[int]) -> dict:
+        """只保留 [from_year, to_year] 内的流年 (及对应小运)，不含该范围流年的大运整体省略"""
+        if from_year is None and to_year is None:
+            return fortune
+        lo = from_year if from_year is not None else -10 ** 6
+        hi = to_year if to_year is not None else 10 ** 6
+        da_yun = []
+        for dy in fortune.get("da_yun", []):
+            liu_nian = dy.get("liu_nian", [])
+            keep = [i for i, ln in enumerate(liu_nian) if lo <= ln.get("year", 0) <= hi]
+            if not keep:
+                continue
+            xiao_yun = dy.get("xiao_yun", [])
+            # 小运与流年逐年对应
+            if len(xiao_yun) == len(liu_nian):
+                xiao_yun = [xiao_yun[i] for i in keep]
+            da_yun.append({**dy, "liu_nian": [liu_nian[i] for i in keep], "xiao_yun": xiao_yun})
+        return {**fortune, "da_yun": da_yun}
+
+    @staticmethod
+    def pillars(result: dict) -> Dict[str, str]:
+        core = result.get("core") or {}
+        return {pos: f"{core[pos]['gan']}{core[pos]['zhi']}" for pos in ("year", "month", "day", "time") if pos in core}
+
     @staticmethod
     def get_essential_data(full_result: dict):
         """
@@ -100,21 +375,6 @@ class BaziService:
             "analysis": full_result.get("analysis"),
             "stars": full_result.get("stars"),
             "auxiliary": full_result.get("auxiliary"),
-            "fortune": {
-                "start_solar": full_result.get("fortune", {}).get("start_solar"),
-                "start_age": full_result.get("fortune", {}).get("start_age"),
-                "da_yun": []
-            }
+            "fortune": BaziService.fortune_summary(full_result.get("fortune", {}))
         }
-        
-        # 仅保留大运的时间和干支概览
-        if "fortune" in full_result and "da_yun" in full_result["fortune"]:
-            for dy in full_result["fortune"]["da_yun"]:
-                essential["fortune"]["da_yun"].append({
-                    "index": dy.get("index"),
-                    "start_year": dy.get("start_year"),
-                    "start_age": dy.get("start_age"),
-                    "gan_zhi": dy.get("gan_zhi")
-                })
-                
         return essential
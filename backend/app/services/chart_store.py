@@ -0,0 +1,121 @@
+import asyncio
+import os
+import sys
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import delete, or_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.future import select
+from app.core.config import settings
+from app.core.redis import redis_client
+from app.db.session import get_async_session_maker
+from app.models.archive import Archive
+from app.models.chart import ArchiveChart
+
+ENGINE_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../../zpbz"))
+if ENGINE_PATH not in sys.path:
+    sys.path.append(ENGINE_PATH)
+
+from src.engine.core import ENGINE_VERSION
+
+class ChartStore:
+    """
+    排盘结果的持久层 (Postgres archive_charts)，位于进程内缓存与 Redis 之后、重新排盘之前。
+    按 (档案, 输入摘要, 引擎版本) 存取；引擎版本升级后由后台任务逐批重算，而非在首次访问时集中重算。
+    """
+
+    @staticmethod
+    async def get(archive_id, digest: str) -> Optional[dict]:
+        SessionLocal = get_async_session_maker()
+        async with SessionLocal() as db:
+            row = await db.get(ArchiveChart, (archive_id, digest, ENGINE_VERSION))
+            return row.result if row else None
+
+    @staticmethod
+    async def save(archive_id, digest: str, result: dict):
+        """写入当前版本的结果，并删除该档案旧输入或旧版本的结果"""
+        SessionLocal = get_async_session_maker()
+        async with SessionLocal() as db:
+            stmt = insert(ArchiveChart).values(
+                archive_id=archive_id, input_digest=digest, engine_version=ENGINE_VERSION,
+                result=result, created_at=datetime.utcnow()
+            )
+            await db.execute(stmt.on_conflict_do_update(
+                index_elements=["archive_id", "input_digest", "engine_version"],
+                set_={"result": stmt.excluded.result, "created_at": stmt.excluded.created_at},
+            ))
+            await db.execute(delete(ArchiveChart).where(
+                ArchiveChart.archive_id == archive_id,
+                or_(ArchiveChart.input_digest != digest, ArchiveChart.engine_version != ENGINE_VERSION),
+            ))
+            await db.commit()
+
+    @staticmethod
+    async def stale_archives(after, limit: int):
+        """尚无当前引擎版本结果的档案，按 id 游标分页"""
+        SessionLocal = get_async_session_maker()
+        async with SessionLocal() as db:
+            current = select(ArchiveChart.archive_id).where(ArchiveChart.engine_version == ENGINE_VERSION)
+            query = select(Archive).where(Archive.id.not_in(current))
+            if after is not None:
+                query = query.where(Archive.id > after)
+            result = await db.execute(query.order_by(Archive.id).limit(limit))
+            return result.scalars().all()
+
+    @staticmethod
+    async def materialize(archive: Archive) -> dict:
+        """
+        取得档案的排盘结果 (缓存或重新排盘) 并写入当前版本。
+        BaziService 命中进程内缓存或 Redis 时不写库 (如此前写库失败)，因此这里总是写入；写入失败时抛出异常。
+        """
+        from app.services.bazi_service import BaziService
+        result = await BaziService.get_result(archive)
+        await ChartStore.save(archive.id, BaziService.input_digest(archive), result)
+        return result
+
+    @staticmethod
+    async def rematerialize(batch_size: Optional[int] = None) -> int:
+        """
+        后台重算所有缺少当前引擎版本结果的档案，返回处理数量。
+        多个工作进程同时启动时以 Redis 锁保证只有一个进程执行；每批并发数不超过排盘执行器的工作数，避免挤占在线请求。
+        """
+        from src.engine.executor import EngineBusy
+
+        lock_key = f"chart_rematerialize:{ENGINE_VERSION}"
+        try:
+            if not await redis_client.set(lock_key, "1", nx=True, ex=settings.CHART_REMATERIALIZE_LOCK_TTL):
+                return 0
+        except Exception as e:
+            print(f"Redis error: {e}")
+
+        batch_size = batch_size or settings.ENGINE_WORKERS
+        done = 0
+        after = None
+        try:
+            while True:
+                archives = await ChartStore.stale_archives(after, batch_size)
+                if not archives:
+                    break
+                after = archives[-1].id
+                while archives:
+                    outcomes = await asyncio.gather(
+                        *[ChartStore.materialize(a) for a in archives], return_exceptions=True
+                    )
+                    # 执行器繁忙时稍后重试，其他异常记录后跳过
+                    retry = []
+                    for archive, outcome in zip(archives, outcomes):
+                        if isinstance(outcome, EngineBusy):
+                            retry.append(archive)
+                        elif isinstance(outcome, Exception):
+                            print(f"Rematerialize failed for archive {archive.id}: {outcome}")
+                        else:
+                            done += 1
+                    archives = retry
+                    if retry:
+                        await asyncio.sleep(1)
+        finally:
+            try:
+                await redis_client.delete(lock_key)
+            except Exception as e:
+                print(f"Redis error: {e}")
+        return done
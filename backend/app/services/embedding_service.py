@@ -1,6 +1,11 @@
 import httpx
 from typing import List
 from app.core.config import settings
+from app.core.cache import LRUCache, SingleFlight
+
+# 查询向量只取决于模型与文本，无需失效
+_query_cache = LRUCache(maxsize=1024)
+_inflight = SingleFlight()
 
 class EmbeddingService:
     @staticmethod
@@ -34,6 +39,17 @@ class EmbeddingService:
 
     @staticmethod
     async def get_query_embedding(text: str) -> List[float]:
+        # 同一问题会被古籍检索与事实检索同时向量化，缓存并合并并发请求
+        key = (settings.EMBEDDING_MODEL, text)
+        cached = _query_cache.get(key)
+        if cached is not None:
+            return cached
+        vector = await _inflight.do(key, lambda: EmbeddingService._fetch_query_embedding(text))
+        _query_cache.set(key, vector)
+        return vector
+
+    @staticmethod
+    async def _fetch_query_embedding(text: str) -> List[float]:
         headers = {
             "Authorization": f"Bearer {settings.EMBEDDING_API_KEY}",
             "Content-Type": "application/json"
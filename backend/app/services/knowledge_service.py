@@ -4,6 +4,12 @@ from sqlalchemy import text
 from app.db.session import get_async_session_maker
 from app.services.embedding_service import EmbeddingService
 from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.cache import LRUCache
+from app.core import invalidation
+
+# 记忆事实检索结果，事实写入或删除时按档案失效；短 TTL 兼顾时间衰减权重的变化
+_facts_cache = LRUCache(maxsize=512, ttl=300)
+invalidation.subscribe(invalidation.FACTS, lambda archive_id: _facts_cache.delete_prefix(f"{archive_id}:"))
 
 class KnowledgeService:
     @staticmethod
@@ -23,6 +29,16 @@ class KnowledgeService:
 
     @staticmethod
     async def retrieve_user_facts(archive_id: UUID, query: str, limit: int = 5) -> List[str]:
+        key = f"{archive_id}:{limit}:{query}"
+        cached = _facts_cache.get(key)
+        if cached is not None:
+            return cached
+        facts = await KnowledgeService._query_user_facts(archive_id, query, limit)
+        _facts_cache.set(key, facts)
+        return facts
+
+    @staticmethod
+    async def _query_user_facts(archive_id: UUID, query: str, limit: int) -> List[str]:
         vector = await EmbeddingService.get_query_embedding(query)
         vector_str = f"[{','.join(map(str, vector))}]"
         
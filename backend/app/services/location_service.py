@@ -1,55 +1,175 @@
-import json
 import os
-from typing import List, Dict, Any
+import sys
+from bisect import bisect_left
+from typing import List, Dict, Any, Optional, Set, Tuple
 
-LATLNG_PATH = os.path.join(os.path.dirname(__file__), "../../../zpbz/data/latlng.json")
+# 地名数据与排盘引擎共用 zpbz 的 GeoIndex
+ENGINE_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../../zpbz"))
+if ENGINE_PATH not in sys.path:
+    sys.path.append(ENGINE_PATH)
+
+from src.engine.geo import geo_index, haversine_km
+
+# 行政区划后缀，去掉后的简称也视为精确匹配 (如 "朝阳" -> "朝阳区")
+ADMIN_SUFFIXES = ("特别行政区", "自治区", "自治州", "自治县", "地区", "省", "市", "区", "县", "盟", "旗")
+
+# 匹配等级：精确 > 前缀 > 包含
+EXACT, PREFIX, CONTAINS = 0, 1, 2
+
+def _strip_suffix(name: str) -> str:
+    for suffix in ADMIN_SUFFIXES:
+        if name.endswith(suffix) and len(name) - len(suffix) >= 2:
+            return name[:-len(suffix)]
+    return name
+
+def _pinyin_keys(name: str) -> Tuple[str, ...]:
+    """全拼与首字母 (需要 pypinyin，未安装时不支持拼音检索)"""
+    try:
+        from pypinyin import lazy_pinyin
+    except ImportError:
+        return ()
+    syllables = [s for s in lazy_pinyin(name) if s.isascii() and s.isalpha()]
+    if not syllables:
+        return ()
+    return "".join(syllables).lower(), "".join(s[0] for s in syllables).lower()
+
+class LocationIndex:
+    """
+    地名自动补全索引 (建于 GeoIndex 之上，首次检索时构建)：
+    - 精确表：地名、去后缀简称、全拼、首字母 -> 条目
+    - 前缀表：上述键排序后的数组，二分查找前缀区间
+    - 二元组倒排：地名中相邻两字 (及单字) -> 条目，用于包含匹配
+    结果按 (匹配等级, 行政层级, 原始顺序) 排序，省 > 市 > 区县。
+    """
+
+    def __init__(self, geo=None):
+        self.geo = geo or geo_index()
+        self.entries: List[int] = list(self.geo.iter_located())
+        names = self.geo.names
+        self.depths: Dict[int, int] = {}
+        self.exact: Dict[str, Set[int]] = {}
+        keyed: List[Tuple[str, int]] = []
+        self.grams: Dict[str, Set[int]] = {}
+        # 全部节点 (含无坐标的上级) 的小写地名与拼音键，供多词检索匹配上级
+        self.lowered = [n.strip().lower() for n in names]
+        self.pinyin = [_pinyin_keys(n) for n in self.lowered]
+
+        depths = self.geo.depths()
+        for i in self.entries:
+            self.depths[i] = depths[i]
+
+            name = self.lowered[i]
+            keys = {name, _strip_suffix(name), *self.pinyin[i]}
+            for key in keys:
+                self.exact.setdefault(key, set()).add(i)
+                keyed.append((key, i))
+            for n in (1, 2):
+                for pos in range(len(name) - n + 1):
+                    self.grams.setdefault(name[pos:pos + n], set()).add(i)
+
+        keyed.sort()
+        self.prefix_keys = [k for k, _ in keyed]
+        self.prefix_ids = [i for _, i in keyed]
+
+    def _prefix(self, token: str) -> Set[int]:
+        found = set()
+        pos = bisect_left(self.prefix_keys, token)
+        while pos < len(self.prefix_keys) and self.prefix_keys[pos].startswith(token):
+            found.add(self.prefix_ids[pos])
+            pos += 1
+        return found
+
+    def _contains(self, token: str) -> Set[int]:
+        if len(token) <= 2:
+            return set(self.grams.get(token, ()))
+        postings = [self.grams.get(token[pos:pos + 2], set()) for pos in range(len(token) - 1)]
+        candidates = set.intersection(*sorted(postings, key=len))
+        return {i for i in candidates if token in self.lowered[i]}
+
+    def _classify(self, token: str) -> Dict[int, int]:
+        """单个检索词 -> {条目: 匹配等级}"""
+        levels: Dict[int, int] = {}
+        for level, ids in ((CONTAINS, self._contains(token)), (PREFIX, self._prefix(token)),
+                           (EXACT, self.exact.get(token, ()))):
+            for i in ids:
+                levels[i] = level
+        return levels
+
+    def _ancestor_match(self, i: int, tokens: List[str]) -> bool:
+        """其余检索词需命中该条目的上级地名 (包含或拼音前缀)"""
+        ancestors = []
+        parent = self.geo.parents[i]
+        while parent >= 0:
+            ancestors.append(parent)
+            parent = self.geo.parents[parent]
+        for token in tokens:
+            if not any(
+                token in self.lowered[a] or any(k.startswith(token) for k in self.pinyin[a])
+                for a in ancestors
+            ):
+                return False
+        return True
+
+    def search(self, query: str, limit: int = 15) -> Optional[List[int]]:
+        """返回排序后的条目下标；无法由索引回答时返回 None"""
+        tokens = query.strip().lower().split()
+        if not tokens:
+            return None
+        levels = self._classify(tokens[-1])
+        if len(tokens) > 1:
+            levels = {i: lv for i, lv in levels.items() if self._ancestor_match(i, tokens[:-1])}
+        if not levels:
+            return None
+        ranked = sorted(levels, key=lambda i: (levels[i], self.depths[i], i))
+        return ranked[:limit]
 
 class LocationService:
-    _flat_data: List[Dict[str, Any]] = []
+    _index: Optional[LocationIndex] = None
+    _data_tag: Optional[str] = None
+
+    @classmethod
+    def data_tag(cls) -> str:
+        """地名数据版本 (数据文件大小与修改时间)，用于搜索结果的 ETag"""
+        if cls._data_tag is None:
+            st = os.stat(geo_index().json_path)
+            cls._data_tag = f"{st.st_size}-{st.st_mtime_ns}"
+        return cls._data_tag
 
     @classmethod
-    def _load_data(cls):
-        if not cls._flat_data and os.path.exists(LATLNG_PATH):
-            with open(LATLNG_PATH, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                cls._flat_data = []
-                
-                def traverse(node, path=""):
-                    name = node.get("name", "")
-                    current_path = f"{path} {name}".strip() if path else name
-                    
-                    # If it has coordinates, add to flat data
-                    if "lat" in node and "lng" in node:
-                        # Note: In latlng.json, lat seems to be around 116 (which is longitude) 
-                        # and lng is around 39 (which is latitude).
-                        # We will treat them as labeled but be aware of the values.
-                        # Actually, let's look at the values:
-                        # Beijing: lat 116.4, lng 39.9
-                        # Correct Lat/Lng for Beijing is Lat 39.9, Lng 116.4.
-                        # So they ARE swapped in the JSON keys.
-                        cls._flat_data.append({
-                            "display_name": current_path,
-                            "name": name,
-                            "lat": float(node["lng"]), # Real Latitude
-                            "lng": float(node["lat"])  # Real Longitude
-                        })
-                    
-                    for child in node.get("children", []):
-                        traverse(child, current_path)
-
-                traverse(data)
+    def get_index(cls) -> LocationIndex:
+        if cls._index is None:
+            cls._index = LocationIndex()
+        return cls._index
 
     @classmethod
     def search(cls, query: str) -> List[Dict[str, Any]]:
-        cls._load_data()
         if not query:
             return []
-        
-        query = query.lower()
+
+        index = cls.get_index()
+        ranked = index.search(query)
+        if ranked is None:
+            # 索引未命中时退回完整路径的子串匹配 (如 "中国 北京" 等跨层级写法)
+            display_names = index.geo.display_names()
+            q = query.lower()
+            ranked = [i for i in index.entries if q in display_names[i].lower()][:15]
+        return [index.geo.record(i) for i in ranked]
+
+    @staticmethod
+    def reverse(lat: float, lng: float, max_km: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """坐标 -> 最近地名 (地图选点、导入数据)，附带距离 (公里)"""
+        return LocationService.reverse_many([(lat, lng)], max_km)[0]
+
+    @staticmethod
+    def reverse_many(points: List[Tuple[float, float]], max_km: Optional[float] = None) -> List[Optional[Dict[str, Any]]]:
+        geo = geo_index()
         results = []
-        for item in cls._flat_data:
-            if query in item["display_name"].lower():
-                results.append(item)
-                if len(results) >= 15:
-                    break
-        return results
\ No newline at end of file
+        for (lat, lng), i in zip(points, geo.nearest_many(points, max_km)):
+            if i is None:
+                results.append(None)
+                continue
+            record = geo.record(i)
+            record["distance_km"] = round(haversine_km(lat, lng, record["lat"], record["lng"]), 3)
+            results.append(record)
+        return results
+
@@ -4,6 +4,7 @@ from app.models.fact import MemoryFact
 from app.services.embedding_service import EmbeddingService
 from langchain_openai import ChatOpenAI
 from app.core.config import settings
+from app.core import invalidation
 from sqlalchemy import delete, text
 
 class MemoryService:
@@ -91,10 +92,14 @@ class MemoryService:
                 print(f"Detected duplicate fact: '{content}' is similar to existing '{existing[0]}'")
         
         await db.commit()
+        if new_saved_facts:
+            await invalidation.publish(invalidation.FACTS, str(archive_id))
         return new_saved_facts
 
     @staticmethod
     async def delete_fact(db: AsyncSession, fact_id: str):
-        stmt = delete(MemoryFact).where(MemoryFact.id == fact_id)
-        await db.execute(stmt)
+        stmt = delete(MemoryFact).where(MemoryFact.id == fact_id).returning(MemoryFact.archive_id)
+        archive_id = (await db.execute(stmt)).scalar_one_or_none()
         await db.commit()
+        if archive_id is not None:
+            await invalidation.publish(invalidation.FACTS, str(archive_id))
@@ -0,0 +1,67 @@
+import asyncio
+import json
+from typing import List, Dict, Any
+from uuid import UUID
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.archive import Archive
+from app.core.redis import redis_client
+from app.services.archive_service import ArchiveService
+from app.services.bazi_service import BaziService
+from src.engine.core import ENGINE_VERSION
+from src.engine.similarity import STAR_VOCAB, ChartFeatures, SimilarityIndex, encode, famous_case_index
+
+class SimilarityService:
+    @staticmethod
+    def _vector_key(user_id: UUID) -> str:
+        return f"bazi_vec:{user_id}"
+
+    @staticmethod
+    async def _archive_vector(archive: Archive, cached: Dict[str, str]) -> List[float]:
+        """
+        档案特征向量：缓存于 Redis 哈希，以引擎版本、神煞词表大小与档案更新时间为戳，
+        任一变化 (引擎升级、特征维度变化、档案修改) 或缺失时由排盘结果重新编码
+        """
+        stamp = f"{ENGINE_VERSION}:{len(STAR_VOCAB)}:{archive.updated_at.isoformat()}"
+        entry = cached.get(str(archive.id))
+        if entry:
+            data = json.loads(entry)
+            if data.get("stamp") == stamp:
+                return data["vector"]
+
+        result = await BaziService.get_result(archive)
+        vector = encode(ChartFeatures.from_result(result))
+        try:
+            await redis_client.hset(
+                SimilarityService._vector_key(archive.user_id), str(archive.id),
+                json.dumps({"stamp": stamp, "vector": vector})
+            )
+        except Exception as e:
+            print(f"Redis save error: {e}")
+        return vector
+
+    @staticmethod
+    async def similar(db: AsyncSession, archive: Archive, k: int = 5) -> Dict[str, Any]:
+        """在本用户的其他档案与名人命例库中查找与该档案最相似的命盘"""
+        try:
+            cached = await redis_client.hgetall(SimilarityService._vector_key(archive.user_id))
+        except Exception as e:
+            print(f"Redis error: {e}")
+            cached = {}
+
+        index = SimilarityIndex()
+        target = None
+        for item in await ArchiveService.get_multi(db, archive.user_id):
+            vector = await SimilarityService._archive_vector(item, cached)
+            if item.id == archive.id:
+                target = vector
+            else:
+                index.add(str(item.id), vector, {"archive_id": str(item.id), "name": item.name})
+        if target is None:
+            target = await SimilarityService._archive_vector(archive, cached)
+
+        # 命例库首次构建需批量排盘，放到线程中执行，避免阻塞事件循环 (启动时已预热)
+        famous = await asyncio.to_thread(famous_case_index)
+        return {
+            "archives": [hit.model_dump() for hit in index.search(target, k)],
+            "famous_cases": [hit.model_dump() for hit in famous.search(target, k)],
+        }
@@ -10,6 +10,7 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 from app.core.config import settings
 from app.models.user import User
 from app.models.archive import Archive
+from app.models.chart import ArchiveChart
 from app.models.knowledge import AncientBook
 from app.models.fact import MemoryFact
 from app.models.chat import ChatSession, Message
@@ -117,4 +117,84 @@ async def test_agent_memory_extraction(db_session):
         res = await db_session.execute(stmt)
         facts = res.scalars().all()
         assert len(facts) == 1
-        assert "金融行业" in facts[0].content
\ No newline at end of file
+        assert "金融行业" in facts[0].content
+
+
+@pytest.mark.asyncio
+async def test_shared_graph_concurrent_turns_do_not_leak_state(db_session):
+    """
+    测试共享的已编译图：并发的多轮对话各自只看到自己的档案、查询与消息。
+    """
+    import asyncio
+    from app.agent.graph import get_graph
+
+    user = User(id=uuid4(), email=f"shared_{uuid4().hex[:8]}@example.com", hashed_password="pw", nickname="shared")
+    db_session.add(user)
+    await db_session.flush()
+    archives = [
+        Archive(id=uuid4(), user_id=user.id, name="甲", birth_time=datetime(1990, 1, 1, 12, 0, 0),
+                lat=39.9, lng=116.4, location_name="北京"),
+        Archive(id=uuid4(), user_id=user.id, name="乙", birth_time=datetime(1995, 5, 5, 10, 0, 0),
+                lat=31.23, lng=121.47, location_name="上海"),
+    ]
+    db_session.add_all(archives)
+    await db_session.commit()
+
+    async def fake_llm(messages, *args, **kwargs):
+        # 让出事件循环，使两轮对话交错执行
+        await asyncio.sleep(0.01)
+        if isinstance(messages, str):
+            if "意图识别" in messages:
+                return AsyncMock(content='{"intent": "综合", "context_sufficient": true, "needed_info": []}')
+            return AsyncMock(content="[]")
+        return AIMessage(content=f"回复：{messages[-1].content}")
+
+    graph = get_graph()
+    assert get_graph() is graph
+
+    def initial_state(archive, query):
+        return {
+            "archive_id": str(archive.id),
+            "archives": {str(a.id): a for a in archives},
+            "server_time": "2025-01-01 12:00:00",
+            "query": query,
+            "messages": [HumanMessage(content=query)],
+            "context_sufficient": True,
+            "response_mode": "normal",
+        }
+
+    with patch("langchain_openai.ChatOpenAI.ainvoke", side_effect=fake_llm), \
+         patch("app.services.embedding_service.EmbeddingService.get_embeddings", new_callable=AsyncMock) as mock_emb:
+        mock_emb.return_value = [[0.1] * 1024]
+        results = await asyncio.gather(*[
+            graph.ainvoke(initial_state(archive, f"{archive.name}的事业如何"))
+            for archive in archives * 2
+        ])
+
+    for archive, result in zip(archives * 2, results):
+        assert result["archive_id"] == str(archive.id)
+        assert result["final_response"] == f"回复：{archive.name}的事业如何"
+        assert [m.content for m in result["messages"] if isinstance(m, HumanMessage)] == [f"{archive.name}的事业如何"]
+    year_pillars = [r["bazi_result"]["core"]["year"]["gan"] + r["bazi_result"]["core"]["year"]["zhi"] for r in results]
+    assert year_pillars == ["己巳", "乙亥", "己巳", "乙亥"]
+
+
+@pytest.mark.asyncio
+async def test_calculate_ignores_related_archives_outside_user():
+    """
+    测试关联档案越权：意图识别给出的 id 不在当前用户的档案快照中时，不查询数据库、不排盘。
+    """
+    from app.agent.nodes.calculate import calculate_node
+
+    archive = Archive(id=uuid4(), user_id=uuid4(), name="本人", birth_time=datetime(1990, 1, 1, 12, 0, 0),
+                      lat=39.9, lng=116.4, location_name="北京")
+    state = {
+        "archive_id": str(archive.id),
+        "archives": {str(archive.id): archive},
+        "bazi_result": {"core": {}},
+        "related_archive_ids": [str(uuid4())],
+    }
+    with patch("app.services.archive_service.ArchiveService.get", new_callable=AsyncMock) as mock_get:
+        updates = await calculate_node(state)
+    mock_get.assert_not_called()
+    assert updates["related_bazi_results"] == {}
@@ -73,3 +73,402 @@ async def test_archive_lifecycle_and_bazi(db_session, mock_redis):
             headers=headers
         )
         assert bazi_res_v2.json()["request"]["time_mode"] == "MEAN_SOLAR"
+
+@pytest.mark.asyncio
+async def test_location_search_ranking():
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        # 简称精确匹配优先，且市级排在区级之前
+        res = await ac.get(f"{settings.API_V1_STR}/archives/locations", params={"query": "朝阳"})
+        names = [r["display_name"] for r in res.json()]
+        assert names[0] == "中国 辽宁省 朝阳市"
+        assert "中国 北京 北京市 朝阳区" in names
+
+        # 拼音首字母与上级限定
+        res = await ac.get(f"{settings.API_V1_STR}/archives/locations", params={"query": "gd sz"})
+        assert [r["name"] for r in res.json()] == ["深圳市"]
+        assert res.json()[0]["lng"] > 100  # 经度字段已纠正
+
+@pytest.mark.asyncio
+async def test_reverse_location():
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        res = await ac.get(f"{settings.API_V1_STR}/archives/locations/reverse", params={"lat": 39.92, "lng": 116.44})
+        assert res.status_code == 200
+        assert res.json()["name"] == "东城区"
+
+        res = await ac.get(f"{settings.API_V1_STR}/archives/locations/reverse", params={"lat": 0, "lng": 0, "max_km": 10})
+        assert res.status_code == 404
+
+@pytest.mark.asyncio
+async def test_similar_charts(db_session, mock_redis):
+    email = "similar_test@example.com"
+    await mock_redis.set(f"auth_code:{email}", "123456", ex=300)
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        login_res = await ac.post(
+            f"{settings.API_V1_STR}/auth/login",
+            json={"email": email, "code": "123456"}
+        )
+        headers = {"Authorization": f"Bearer {login_res.json()['access_token']}"}
+
+        ids = []
+        for name, birth in [("甲", "1887-10-31T12:00:00"), ("乙", "1990-01-01T12:00:00")]:
+            res = await ac.post(
+                f"{settings.API_V1_STR}/archives/",
+                json={"name": name, "gender": 1, "birth_time": birth, "calendar_type": "SOLAR",
+                      "lat": 39.9, "lng": 116.4, "location_name": "北京"},
+                headers=headers
+            )
+            ids.append(res.json()["id"])
+
+        res = await ac.get(f"{settings.API_V1_STR}/archives/{ids[0]}/similar", params={"k": 3}, headers=headers)
+        assert res.status_code == 200
+        data = res.json()
+        assert [h["meta"]["archive_id"] for h in data["archives"]] == [ids[1]]
+        # 与蒋介石同一出生时刻，名人命例库中应排第一
+        assert data["famous_cases"][0]["meta"]["name"] == "蒋介石"
+
+@pytest.mark.asyncio
+async def test_engine_busy_returns_503(db_session, mock_redis, monkeypatch):
+    from src.engine.core import BaziEngine
+    from src.engine.executor import EngineBusy
+
+    email = "busy_test@example.com"
+    await mock_redis.set(f"auth_code:{email}", "123456", ex=300)
+
+    async def busy(self, request, skip_liu_yue=False, timeout=None):
+        raise EngineBusy("排盘队列已满")
+    monkeypatch.setattr(BaziEngine, "arrange_async", busy)
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        login_res = await ac.post(
+            f"{settings.API_V1_STR}/auth/login",
+            json={"email": email, "code": "123456"}
+        )
+        headers = {"Authorization": f"Bearer {login_res.json()['access_token']}"}
+        res = await ac.post(
+            f"{settings.API_V1_STR}/archives/",
+            json={"name": "丙", "gender": 1, "birth_time": "1990-01-01T12:00:00", "calendar_type": "SOLAR",
+                  "lat": 39.9, "lng": 116.4, "location_name": "北京"},
+            headers=headers
+        )
+        res = await ac.get(f"{settings.API_V1_STR}/archives/{res.json()['id']}/bazi", headers=headers)
+        assert res.status_code == 503
+        assert res.headers["Retry-After"] == "1"
+
+        monkeypatch.setattr(settings, "METRICS_TOKEN", "metrics-secret")
+        assert (await ac.get("/metrics/engine")).status_code == 403
+        stats = (await ac.get("/metrics/engine", headers={"X-Metrics-Token": "metrics-secret"})).json()
+        assert {"running", "queued", "rejected", "timeouts"} <= set(stats)
+
+@pytest.mark.asyncio
+async def test_chart_cache_single_flight(db_session, mock_redis, monkeypatch):
+    import asyncio
+    from app.services.bazi_service import BaziService, _local_cache
+    monkeypatch.setattr("app.services.bazi_service.redis_client", mock_redis)
+    _local_cache.clear()
+
+    email = "cache_test@example.com"
+    await mock_redis.set(f"auth_code:{email}", "123456", ex=300)
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        login_res = await ac.post(
+            f"{settings.API_V1_STR}/auth/login",
+            json={"email": email, "code": "123456"}
+        )
+        headers = {"Authorization": f"Bearer {login_res.json()['access_token']}"}
+        before = BaziService.cache_stats()["computed"]
+        res = await ac.post(
+            f"{settings.API_V1_STR}/archives/",
+            json={"name": "丁", "gender": 0, "birth_time": "1985-05-05T08:00:00", "calendar_type": "SOLAR",
+                  "lat": 31.23, "lng": 121.47, "location_name": "上海"},
+            headers=headers
+        )
+        url = f"{settings.API_V1_STR}/archives/{res.json()['id']}/bazi"
+        await BaziService.wait_background()
+
+        _local_cache.clear()
+        await mock_redis.flushdb()
+        results = await asyncio.gather(*[ac.get(url, headers=headers) for _ in range(5)])
+        assert all(r.status_code == 200 for r in results)
+        assert len({r.text for r in results}) == 1
+        # 创建档案时已在后台排盘并持久化；清空前两级缓存后的并发请求合并为一次 Postgres 读取，无需重新排盘
+        assert BaziService.cache_stats()["computed"] == before + 1
+        stats = BaziService.cache_stats()
+        assert stats["store_hits"] >= 1
+        # 缓存键稳定：Redis 中可用同一摘要命中
+        keys = await mock_redis.keys(f"bazi_res:{res.json()['id']}:*")
+        assert len(keys) == 2
+
+@pytest.mark.asyncio
+async def test_chart_invalidation_on_write(db_session, mock_redis, monkeypatch):
+    from app.services.bazi_service import BaziService
+    monkeypatch.setattr("app.services.bazi_service.redis_client", mock_redis)
+
+    email = "invalidate_test@example.com"
+    await mock_redis.set(f"auth_code:{email}", "123456", ex=300)
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        login_res = await ac.post(
+            f"{settings.API_V1_STR}/auth/login",
+            json={"email": email, "code": "123456"}
+        )
+        headers = {"Authorization": f"Bearer {login_res.json()['access_token']}"}
+        res = await ac.post(
+            f"{settings.API_V1_STR}/archives/",
+            json={"name": "戊", "gender": 1, "birth_time": "1990-01-01T12:00:00", "calendar_type": "SOLAR",
+                  "lat": 39.9, "lng": 116.4, "location_name": "北京"},
+            headers=headers
+        )
+        archive_id = res.json()["id"]
+        await BaziService.wait_background()
+        # 创建后已预计算基础与完整结果
+        assert await mock_redis.keys(f"bazi_full:{archive_id}:*")
+        first = (await ac.get(f"{settings.API_V1_STR}/archives/{archive_id}/bazi", headers=headers)).json()
+
+        await ac.patch(f"{settings.API_V1_STR}/archives/{archive_id}",
+                       json={"birth_time": "1990-01-02T12:00:00"}, headers=headers)
+        second = (await ac.get(f"{settings.API_V1_STR}/archives/{archive_id}/bazi", headers=headers)).json()
+        assert second["core"]["day"] != first["core"]["day"]
+        await BaziService.wait_background()
+
+        await ac.delete(f"{settings.API_V1_STR}/archives/{archive_id}", headers=headers)
+        assert await mock_redis.keys(f"bazi_*:{archive_id}:*") == []
+
+@pytest.mark.asyncio
+async def test_archive_directory_cache(db_session, mock_redis):
+    from uuid import UUID
+    from app.services.archive_service import ArchiveService
+
+    email = "directory_test@example.com"
+    await mock_redis.set(f"auth_code:{email}", "123456", ex=300)
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        login_res = await ac.post(
+            f"{settings.API_V1_STR}/auth/login",
+            json={"email": email, "code": "123456"}
+        )
+        headers = {"Authorization": f"Bearer {login_res.json()['access_token']}"}
+        user_id = UUID((await ac.get(f"{settings.API_V1_STR}/users/me", headers=headers)).json()["id"])
+
+        async def create(name):
+            res = await ac.post(
+                f"{settings.API_V1_STR}/archives/",
+                json={"name": name, "gender": 1, "birth_time": "1990-01-01T12:00:00", "calendar_type": "SOLAR",
+                      "lat": 39.9, "lng": 116.4, "location_name": "北京"},
+                headers=headers
+            )
+            return res.json()["id"]
+
+        await create("己")
+        first = await ArchiveService.directory(db_session, user_id)
+        assert await ArchiveService.directory(db_session, user_id) is first
+
+        # 写操作使目录缓存失效
+        second_id = await create("庚")
+        second = await ArchiveService.directory(db_session, user_id)
+        assert {str(a.id) for a in second} >= {second_id}
+        await ac.delete(f"{settings.API_V1_STR}/archives/{second_id}", headers=headers)
+        assert second_id not in {str(a.id) for a in await ArchiveService.directory(db_session, user_id)}
+
+@pytest.mark.asyncio
+async def test_batch_charts_and_list_with_pillars(db_session, mock_redis):
+    import uuid
+    email = "batch_test@example.com"
+    await mock_redis.set(f"auth_code:{email}", "123456", ex=300)
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        login_res = await ac.post(
+            f"{settings.API_V1_STR}/auth/login",
+            json={"email": email, "code": "123456"}
+        )
+        headers = {"Authorization": f"Bearer {login_res.json()['access_token']}"}
+        ids = []
+        for name, birth in [("辛", "1990-01-01T12:00:00"), ("壬", "1990-01-02T12:00:00")]:
+            res = await ac.post(
+                f"{settings.API_V1_STR}/archives/",
+                json={"name": name, "gender": 1, "birth_time": birth, "calendar_type": "SOLAR",
+                      "lat": 39.9, "lng": 116.4, "location_name": "北京"},
+                headers=headers
+            )
+            ids.append(res.json()["id"])
+
+        # 默认列表不含四柱
+        res = await ac.get(f"{settings.API_V1_STR}/archives/", headers=headers)
+        assert all("pillars" not in a for a in res.json())
+        res = await ac.get(f"{settings.API_V1_STR}/archives/", params={"with": "pillars"}, headers=headers)
+        pillars = {a["id"]: a["pillars"] for a in res.json()}
+        assert pillars[ids[0]]["year"] == "己巳"
+        assert pillars[ids[0]]["day"] != pillars[ids[1]]["day"]
+
+        unknown = str(uuid.uuid4())
+        res = await ac.post(
+            f"{settings.API_V1_STR}/archives/bazi:batch",
+            json={"ids": ids + [unknown], "fields": ["core", "geju"]},
+            headers=headers
+        )
+        assert res.status_code == 200
+        data = res.json()
+        assert set(data["charts"]) == set(ids)
+        assert set(data["charts"][ids[0]]) == {"core", "geju"}
+        assert data["missing"] == [unknown]
+
+        res = await ac.post(
+            f"{settings.API_V1_STR}/archives/bazi:batch",
+            json={"ids": ids, "fields": ["nope"]},
+            headers=headers
+        )
+        assert res.status_code == 400
+
+@pytest.mark.asyncio
+async def test_chart_field_selection_and_year_range(db_session, mock_redis):
+    email = "fields_test@example.com"
+    await mock_redis.set(f"auth_code:{email}", "123456", ex=300)
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        login_res = await ac.post(
+            f"{settings.API_V1_STR}/auth/login",
+            json={"email": email, "code": "123456"}
+        )
+        headers = {"Authorization": f"Bearer {login_res.json()['access_token']}"}
+        res = await ac.post(
+            f"{settings.API_V1_STR}/archives/",
+            json={"name": "癸", "gender": 1, "birth_time": "1990-01-01T12:00:00", "calendar_type": "SOLAR",
+                  "lat": 39.9, "lng": 116.4, "location_name": "北京"},
+            headers=headers
+        )
+        url = f"{settings.API_V1_STR}/archives/{res.json()['id']}/bazi"
+        full = (await ac.get(url, headers=headers)).json()
+
+        res = await ac.get(url, params={"fields": "core,fortune.summary,trace"}, headers=headers)
+        data = res.json()
+        assert set(data) == {"core", "fortune", "analysis_trace"}
+        assert data["core"] == full["core"]
+        assert all("liu_nian" not in dy for dy in data["fortune"]["da_yun"])
+
+        # 概览只保留含范围内流年的大运
+        res = await ac.get(url, params={"fields": "fortune.summary", "from_year": 2025, "to_year": 2025}, headers=headers)
+        da_yun = res.json()["fortune"]["da_yun"]
+        assert len(da_yun) == 1
+        assert da_yun[0]["start_year"] <= 2025
+
+        res = await ac.get(url, params={"fields": "fortune,fortune.summary"}, headers=headers)
+        assert res.status_code == 422
+
+        res = await ac.get(url, params={"fields": "fortune", "from_year": 2025, "to_year": 2027}, headers=headers)
+        years = [ln["year"] for dy in res.json()["fortune"]["da_yun"] for ln in dy["liu_nian"]]
+        assert years == [2025, 2026, 2027]
+
+        res = await ac.get(url, params={"fields": "bogus"}, headers=headers)
+        assert res.status_code == 400
+
+@pytest.mark.asyncio
+async def test_conditional_get_returns_304(db_session, mock_redis, monkeypatch):
+    from app.services.bazi_service import BaziService
+    email = "etag_test@example.com"
+    await mock_redis.set(f"auth_code:{email}", "123456", ex=300)
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        login_res = await ac.post(
+            f"{settings.API_V1_STR}/auth/login",
+            json={"email": email, "code": "123456"}
+        )
+        headers = {"Authorization": f"Bearer {login_res.json()['access_token']}"}
+        res = await ac.post(
+            f"{settings.API_V1_STR}/archives/",
+            json={"name": "甲", "gender": 1, "birth_time": "1990-01-01T12:00:00", "calendar_type": "SOLAR",
+                  "lat": 39.9, "lng": 116.4, "location_name": "北京"},
+            headers=headers
+        )
+        archive_id = res.json()["id"]
+        urls = [
+            (f"{settings.API_V1_STR}/archives/{archive_id}/bazi", {}),
+            (f"{settings.API_V1_STR}/archives/{archive_id}/bazi", {"fields": "core"}),
+            (f"{settings.API_V1_STR}/archives/", {"with": "pillars"}),
+            (f"{settings.API_V1_STR}/archives/locations", {"query": "北京"}),
+        ]
+        etags = {}
+        for url, params in urls:
+            res = await ac.get(url, params=params, headers=headers)
+            assert res.status_code == 200
+            etags[(url, str(params))] = res.headers["etag"]
+
+        # 命中时直接 304，不加载排盘结果
+        async def fail(*args, **kwargs):
+            raise AssertionError("chart should not be loaded")
+        originals = BaziService.get_result_body, BaziService.get_result
+        monkeypatch.setattr(BaziService, "get_result_body", fail)
+        monkeypatch.setattr(BaziService, "get_result", fail)
+        for url, params in urls:
+            etag = etags[(url, str(params))]
+            res = await ac.get(url, params=params, headers={**headers, "If-None-Match": etag})
+            assert res.status_code == 304
+            assert res.headers["etag"] == etag
+            assert res.content == b""
+        monkeypatch.setattr(BaziService, "get_result_body", originals[0])
+        monkeypatch.setattr(BaziService, "get_result", originals[1])
+
+        # 档案修改后 ETag 变化
+        await ac.patch(f"{settings.API_V1_STR}/archives/{archive_id}", json={"gender": 0}, headers=headers)
+        url, params = urls[0]
+        res = await ac.get(url, headers={**headers, "If-None-Match": etags[(url, str(params))]})
+        assert res.status_code == 200
+        assert res.headers["etag"] != etags[(url, str(params))]
+
+@pytest.mark.asyncio
+async def test_list_with_pillars_failure_has_no_etag(db_session, mock_redis, monkeypatch):
+    from src.engine.core import BaziEngine
+    from src.engine.executor import EngineBusy
+
+    email = "list_busy_test@example.com"
+    await mock_redis.set(f"auth_code:{email}", "123456", ex=300)
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        login_res = await ac.post(
+            f"{settings.API_V1_STR}/auth/login",
+            json={"email": email, "code": "123456"}
+        )
+        headers = {"Authorization": f"Bearer {login_res.json()['access_token']}"}
+
+        async def busy(self, request, skip_liu_yue=False, timeout=None):
+            raise EngineBusy("排盘队列已满")
+        monkeypatch.setattr(BaziEngine, "arrange_async", busy)
+
+        res = await ac.post(
+            f"{settings.API_V1_STR}/archives/",
+            json={"name": "戊", "gender": 1, "birth_time": "1990-01-01T12:00:00", "calendar_type": "SOLAR",
+                  "lat": 39.9, "lng": 116.4, "location_name": "北京"},
+            headers=headers
+        )
+        archive_id = res.json()["id"]
+        res = await ac.get(f"{settings.API_V1_STR}/archives/", params={"with": "pillars"}, headers=headers)
+        assert res.status_code == 200
+        assert "etag" not in res.headers
+        assert res.headers["cache-control"] == "no-store"
+        item = res.json()[0]
+        assert item["id"] == archive_id
+        assert item["pillars"] is None
+        assert "EngineBusy" in item["error"]
+
+@pytest.mark.asyncio
+async def test_input_digest_covers_name_and_location():
+    from datetime import datetime
+    from app.models.archive import Archive
+    from app.services.bazi_service import BaziService
+
+    archive = Archive(name="甲", birth_time=datetime(1990, 1, 1, 12), lat=39.9, lng=116.4, location_name="北京")
+    digest = BaziService.input_digest(archive)
+    # 姓名与地名写入排盘结果 (analysis_trace)，修改后必须重新排盘
+    assert BaziService.input_digest(archive.model_copy(update={"name": "乙"})) != digest
+    assert BaziService.input_digest(archive.model_copy(update={"location_name": "北京市"})) != digest
+    assert BaziService.input_digest(archive.model_copy()) == digest
@@ -74,4 +74,29 @@ async def test_update_user_settings(db_session, mock_redis):
         
         # 3. 再次获取验证持久化
         me_res = await ac.get(f"{settings.API_V1_STR}/users/me", headers=headers)
-        assert me_res.json()["settings"]["response_mode"] == "professional"
\ No newline at end of file
+        assert me_res.json()["settings"]["response_mode"] == "professional"
+
+
+@pytest.mark.asyncio
+async def test_current_user_cache_invalidated_on_patch(db_session, mock_redis):
+    from app.api.deps import _user_cache
+    email = "test_cache_user@example.com"
+    await mock_redis.set(f"auth_code:{email}", "222222", ex=300)
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        login_res = await ac.post(
+            f"{settings.API_V1_STR}/auth/login",
+            json={"email": email, "code": "222222"}
+        )
+        headers = {"Authorization": f"Bearer {login_res.json()['access_token']}"}
+
+        # 第二次请求命中进程内缓存
+        await ac.get(f"{settings.API_V1_STR}/users/me", headers=headers)
+        hits = _user_cache.hits
+        await ac.get(f"{settings.API_V1_STR}/users/me", headers=headers)
+        assert _user_cache.hits == hits + 1
+
+        await ac.patch(f"{settings.API_V1_STR}/users/me", json={"nickname": "改名"}, headers=headers)
+        me_res = await ac.get(f"{settings.API_V1_STR}/users/me", headers=headers)
+        assert me_res.json()["nickname"] == "改名"
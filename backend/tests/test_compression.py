@@ -0,0 +1,107 @@
+import asyncio
+import json
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.responses import Response, StreamingResponse
+from httpx import AsyncClient, ASGITransport
+from app.api.etag import make_etag, not_modified, set_etag
+from app.core import compression
+from app.core.compression import CompressionMiddleware
+
+BODY = json.dumps({"fortune": [{"year": y, "gan_zhi": "甲子"} for y in range(1900, 2100)]}, ensure_ascii=False).encode()
+
+def make_app():
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=512)
+    calls = []
+
+    @app.get("/chart")
+    async def chart(request: Request):
+        tag = make_etag("chart", 1)
+        cached = not_modified(request, tag)
+        if cached:
+            return cached
+        calls.append(1)
+        response = Response(content=BODY, media_type="application/json")
+        set_etag(response, tag)
+        return response
+
+    @app.get("/small")
+    async def small():
+        return {"ok": True}
+
+    @app.get("/stream")
+    async def stream():
+        async def events():
+            for i in range(3):
+                yield f"data: {'x' * 600}{i}\n\n"
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app, calls
+
+@pytest.fixture
+async def client():
+    compression._compressed_cache.clear()
+    app, calls = make_app()
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        ac.calls = calls
+        yield ac
+
+@pytest.mark.asyncio
+async def test_gzip_large_json_with_etag_suffix(client):
+    res = await client.get("/chart", headers={"Accept-Encoding": "gzip"})
+    assert res.headers["content-encoding"] == "gzip"
+    assert res.headers["vary"] == "Accept-Encoding"
+    assert res.headers["etag"].endswith('-gzip"')
+    assert res.content == BODY
+    assert int(res.headers["content-length"]) < len(BODY)
+
+    # 同一 ETag 的压缩结果复用缓存
+    await client.get("/chart", headers={"Accept-Encoding": "gzip"})
+    assert compression._compressed_cache.hits == 1
+
+    # 带编码后缀的 ETag 仍可命中 304
+    res = await client.get("/chart", headers={"Accept-Encoding": "gzip", "If-None-Match": res.headers["etag"]})
+    assert res.status_code == 304
+    assert res.headers["etag"].endswith('-gzip"')
+    assert len(client.calls) == 2
+
+@pytest.mark.asyncio
+async def test_uncompressed_when_not_accepted_or_small(client):
+    res = await client.get("/chart", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in res.headers
+    assert not res.headers["etag"].endswith('-gzip"')
+
+    res = await client.get("/chart", headers={"Accept-Encoding": "gzip;q=0"})
+    assert "content-encoding" not in res.headers
+
+    res = await client.get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in res.headers
+    assert res.json() == {"ok": True}
+
+@pytest.mark.asyncio
+async def test_event_stream_is_not_buffered():
+    app, _ = make_app()
+    scope = {"type": "http", "method": "GET", "path": "/stream", "raw_path": b"/stream", "query_string": b"",
+             "headers": [(b"accept-encoding", b"gzip")], "http_version": "1.1", "scheme": "http",
+             "server": ("test", 80), "client": ("test", 1234), "root_path": "", "asgi": {"version": "3.0"}}
+    messages = []
+    requested = []
+
+    async def receive():
+        if requested:
+            # 客户端保持连接，直到响应结束
+            await asyncio.Event().wait()
+        requested.append(1)
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope, receive, send)
+    start = messages[0]
+    assert b"content-encoding" not in dict(start["headers"])
+    # 每个事件单独发送，未被中间件缓冲合并
+    bodies = [m["body"] for m in messages[1:] if m.get("body")]
+    assert len(bodies) == 3
+    assert all(b.startswith(b"data: ") for b in bodies)
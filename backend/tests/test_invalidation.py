@@ -0,0 +1,93 @@
+import asyncio
+import pytest
+import fakeredis
+import fakeredis.aioredis
+from app.core import invalidation
+from app.core.cache import LRUCache
+from app.core.invalidation import InvalidationBus
+
+class Worker:
+    """模拟一个 uvicorn 工作进程：独立的总线与进程内缓存，共享同一个 Redis"""
+
+    def __init__(self, server):
+        self.bus = InvalidationBus(client=fakeredis.aioredis.FakeRedis(server=server, decode_responses=True))
+        self.charts = LRUCache()
+        self.users = LRUCache()
+        self.bus.subscribe(invalidation.CHART, lambda key: self.charts.delete_prefix(f"{key}:"))
+        self.bus.subscribe(invalidation.USER, self.users.delete)
+
+    async def start(self):
+        ready = asyncio.Event()
+        self.task = asyncio.create_task(self.bus.listen(retry_delay=0.01, ready=ready))
+        await asyncio.wait_for(ready.wait(), 1)
+
+    async def stop(self):
+        self.task.cancel()
+        await asyncio.gather(self.task, return_exceptions=True)
+
+async def wait_until(predicate, timeout: float = 1.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        if asyncio.get_running_loop().time() > deadline:
+            raise AssertionError("condition not reached before timeout")
+        await asyncio.sleep(0.005)
+
+@pytest.fixture
+async def workers():
+    server = fakeredis.FakeServer()
+    group = [Worker(server) for _ in range(3)]
+    for w in group:
+        await w.start()
+    yield group
+    for w in group:
+        await w.stop()
+
+@pytest.mark.asyncio
+async def test_invalidation_reaches_all_workers(workers):
+    for w in workers:
+        w.charts.set("a1:digest", {"core": "old"})
+        w.charts.set("a2:digest", {"core": "other"})
+        w.users.set("u1", {"nickname": "old"})
+
+    await workers[0].bus.publish(invalidation.CHART, "a1")
+    # 发布方立即失效，其他进程经由 pub/sub 失效
+    assert workers[0].charts.get("a1:digest") is None
+    await wait_until(lambda: all(w.charts.get("a1:digest") is None for w in workers))
+    # 其他档案与其他主题不受影响
+    assert all(w.charts.get("a2:digest") == {"core": "other"} for w in workers)
+    assert all(w.users.get("u1") == {"nickname": "old"} for w in workers)
+    # 发布方不重复处理自己的消息
+    assert workers[0].bus.received == 0
+
+    await workers[2].bus.publish(invalidation.USER, "u1")
+    await wait_until(lambda: all(w.users.get("u1") is None for w in workers))
+
+@pytest.mark.asyncio
+async def test_listener_survives_bad_messages(workers):
+    workers[1].charts.set("a1:digest", 1)
+    await workers[0].bus.client.publish(invalidation.CHANNEL, "not json")
+    await workers[0].bus.publish(invalidation.CHART, "a1")
+    await wait_until(lambda: workers[1].charts.get("a1:digest") is None)
+
+@pytest.mark.asyncio
+async def test_service_caches_subscribe_to_process_bus(monkeypatch):
+    from app.services import bazi_service, knowledge_service
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr("app.core.redis.redis_client", fakeredis.aioredis.FakeRedis(server=server, decode_responses=True))
+
+    ready = asyncio.Event()
+    listener = asyncio.create_task(invalidation.listen(retry_delay=0.01, ready=ready))
+    await asyncio.wait_for(ready.wait(), 1)
+    try:
+        bazi_service._local_cache.set("bazi_res:a1:1.0:digest", {"core": "old"})
+        knowledge_service._facts_cache.set("a1:5:问题", ["[2025-01-01] 事实"])
+
+        # 另一个工作进程删除事实、修改档案
+        other = InvalidationBus(client=fakeredis.aioredis.FakeRedis(server=server, decode_responses=True))
+        await other.publish(invalidation.FACTS, "a1")
+        await other.publish(invalidation.CHART, "a1")
+        await wait_until(lambda: knowledge_service._facts_cache.get("a1:5:问题") is None
+                         and bazi_service._local_cache.get("bazi_res:a1:1.0:digest") is None)
+    finally:
+        listener.cancel()
+        await asyncio.gather(listener, return_exceptions=True)
@@ -0,0 +1,5 @@
+"""python -m src.engine：批量排盘，参数见 src.engine.bulk"""
+import sys
+from src.engine.bulk import main
+
+sys.exit(main())
@@ -21,7 +21,7 @@ class AnalysisEngine:
     
     @staticmethod
     def analyze(ctx: BaziContext, energy_data: Dict[str, Dict], geju: GejuResult, tracer: Tracer = None) -> AnalysisResult:
-        lunar = ctx.solar.getLunar()
+        lunar = ctx.get_lunar()
         eight_char = lunar.getEightChar()
         day_gan = eight_char.getDayGan()
         day_elem = EnergyModel._gan_to_elem(day_gan)
@@ -32,7 +32,7 @@ class MonthCommandExtractor:
         返回: (司令天干, 详情描述)
         """
         from datetime import datetime
-        lunar = ctx.solar.getLunar()
+        lunar = ctx.get_lunar()
         month_zhi = lunar.getEightChar().getMonthZhi()
         
         # 1. 计算距离上一个节气（交节）的时间深度
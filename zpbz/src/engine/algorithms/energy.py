@@ -61,7 +61,7 @@ class EnergyModel:
 
     @staticmethod
     def calculate_scores(ctx: BaziContext, tracer: Tracer = None) -> Dict[str, Dict]:
-        lunar = ctx.solar.getLunar()
+        lunar = ctx.get_lunar()
         eight_char = lunar.getEightChar()
         month_zhi = eight_char.getMonthZhi()
         day_gan = eight_char.getDayGan()
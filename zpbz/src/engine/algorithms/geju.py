@@ -28,7 +28,7 @@ class GejuAnalyzer:
 
     @staticmethod
     def analyze(ctx: BaziContext, interactions: List[Interaction], scores: Dict[str, float], tracer: Tracer = None) -> GejuResult:
-        lunar = ctx.solar.getLunar()
+        lunar = ctx.get_lunar()
         eight_char = lunar.getEightChar()
         day_gan = eight_char.getDayGan()
         from src.engine.algorithms.energy import EnergyModel
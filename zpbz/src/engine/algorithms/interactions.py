@@ -42,7 +42,7 @@ class InteractionDetector:
         """
         根据《渊海子平》标准校验合化是否成功
         """
-        lunar = ctx.solar.getLunar()
+        lunar = ctx.get_lunar()
         eight_char = lunar.getEightChar()
         month_zhi = eight_char.getMonthZhi()
         
@@ -76,7 +76,7 @@ class InteractionDetector:
 
     @staticmethod
     def detect_all(ctx: BaziContext, tracer: Tracer = None) -> List[Interaction]:
-        lunar = ctx.solar.getLunar()
+        lunar = ctx.get_lunar()
         eight_char = lunar.getEightChar()
         
         interactions = []
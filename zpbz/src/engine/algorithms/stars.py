@@ -1,5 +1,7 @@
-from typing import List, Dict, Optional
+from functools import lru_cache
+from typing import List, Dict, NamedTuple, Optional, Sequence, Tuple, Union
 from pydantic import BaseModel
+from src.engine.ganzhi import GAN, ZHI, JIA_ZI
 from src.engine.preprocessor import BaziContext
 from src.engine.utils import Tracer
 
@@ -8,129 +10,234 @@ class Star(BaseModel):
     pos: str  # 出现位置
     desc: str
 
-class StarDetector:
+PILLAR_POSITIONS = ("年柱", "月柱", "日柱", "时柱")
+
+class StarRule(NamedTuple):
     """
-    专业神煞检测器 (严格对齐《渊海子平》明朝版标准)
+    声明式神煞规则：以命局某一要素为“查法起点”，查其所对应的干、支或干支。
+    - keys: 起点，可多个 (如驿马年支、日支皆可查)，见 KEY_SOURCES
+    - table: 起点取值 -> 目标。键可写多个字合并 (如 "申子辰")；
+             值为字符串时每个字是一个目标干/支，为元组时每项是一个目标 (干支须用元组)
+    - positions: 只在这些位置查 (None 为四柱及大运流年等任意位置)
     """
-    
-    # 1. 玉堂天乙贵人 (日干查地支)
-    TIAN_YI = {
-        "甲": ["丑", "未"], "戊": ["丑", "未"], "庚": ["丑", "未"],
-        "乙": ["子", "申"], "己": ["子", "申"],
-        "丙": ["亥", "酉"], "丁": ["亥", "酉"],
-        "壬": ["巳", "卯"], "癸": ["巳", "卯"],
-        "辛": ["午", "寅"]
-    }
-    
-    # 2. 月德贵人 (月支查天干)
-    # 寅午戌月见丙, 申子辰月见壬, 亥卯未月见甲, 巳酉丑月见庚
-    YUE_DE = {
-        "寅": "丙", "午": "丙", "戌": "丙",
-        "申": "壬", "子": "壬", "辰": "壬",
-        "亥": "甲", "卯": "甲", "未": "甲",
-        "巳": "庚", "酉": "庚", "丑": "庚"
-    }
+    name: str
+    desc: str
+    keys: Tuple[str, ...]
+    table: Dict[str, Union[str, Tuple[str, ...]]]
+    positions: Optional[Tuple[str, ...]] = None
 
-    # 3. 天德贵人 (月支查干支)
-    # 正丁二申三壬, 四辛五亥六甲, 七癸八寅九丙, 十乙冬巳腊庚
-    TIAN_DE = {
-        "寅": "丁", "卯": "申", "辰": "壬",
-        "巳": "辛", "午": "亥", "未": "甲",
-        "申": "癸", "酉": "寅", "戌": "丙",
-        "亥": "乙", "子": "巳", "丑": "庚"
-    }
+# 查法起点 -> (取值字母表, 由四柱干支取值)
+KEY_SOURCES = {
+    "year_gan": (GAN, lambda p: p[0][0]),
+    "day_gan": (GAN, lambda p: p[2][0]),
+    "year_zhi": (ZHI, lambda p: p[0][1]),
+    "month_zhi": (ZHI, lambda p: p[1][1]),
+    "day_zhi": (ZHI, lambda p: p[2][1]),
+    "day_pillar": (JIA_ZI, lambda p: p[2]),
+    "chart": (("",), lambda p: ""),  # 不依赖起点，直接判定目标 (如日柱本身)
+}
 
-    # 4. 驿马 (年/日支查地支)
-    YI_MA = {
-        "申": "寅", "子": "寅", "辰": "寅",
-        "寅": "申", "午": "申", "戌": "申",
-        "巳": "亥", "酉": "亥", "丑": "亥",
-        "亥": "巳", "卯": "巳", "未": "巳"
-    }
-    
-    # 5. 咸池 (原'桃花', 年/日支查地支)
-    XIAN_CHI = {
-        "申": "酉", "子": "酉", "辰": "酉",
-        "寅": "卯", "午": "卯", "戌": "卯",
-        "巳": "午", "酉": "午", "丑": "午",
-        "亥": "子", "卯": "子", "未": "子"
-    }
+def _xun_kong() -> Dict[str, str]:
+    """日柱所在旬的两个空亡地支"""
+    table = {}
+    for i, gan_zhi in enumerate(JIA_ZI):
+        head = i - i % 10
+        table[gan_zhi] = ZHI[(head + 10) % 12] + ZHI[(head + 11) % 12]
+    return table
+
+# 三合局 (年/日支查)
+_SAN_HE = ("申子辰", "寅午戌", "巳酉丑", "亥卯未")
 
-    # 6. 截路空亡 (日干查时干)
+def _san_he(targets: str) -> Dict[str, str]:
+    return dict(zip(_SAN_HE, targets))
+
+# 严格对齐《渊海子平》《三命通会》通行取法
+STAR_RULES: Tuple[StarRule, ...] = (
+    # --- 贵人 ---
+    StarRule("天乙贵人", "玉堂金马，逢凶化吉", ("day_gan",), {
+        "甲戊庚": "丑未", "乙己": "子申", "丙丁": "亥酉", "壬癸": "巳卯", "辛": "午寅",
+    }),
+    StarRule("月德贵人", "阴德护佑，灾难不侵", ("month_zhi",), {
+        "寅午戌": "丙", "申子辰": "壬", "亥卯未": "甲", "巳酉丑": "庚",
+    }),
+    # 正丁二申三壬, 四辛五亥六甲, 七癸八寅九丙, 十乙冬巳腊庚 (干支皆查)
+    StarRule("天德贵人", "上天之德，化险为夷", ("month_zhi",), {
+        "寅": "丁", "卯": "申", "辰": "壬", "巳": "辛", "午": "亥", "未": "甲",
+        "申": "癸", "酉": "寅", "戌": "丙", "亥": "乙", "子": "巳", "丑": "庚",
+    }),
+    StarRule("天德合", "德神相合，遇难呈祥", ("month_zhi",), {
+        "寅": "壬", "卯": "巳", "辰": "丁", "巳": "丙", "午": "寅", "未": "己",
+        "申": "戊", "酉": "亥", "戌": "辛", "亥": "庚", "子": "申", "丑": "乙",
+    }),
+    StarRule("月德合", "阴德相合，百事顺遂", ("month_zhi",), {
+        "寅午戌": "辛", "申子辰": "丁", "亥卯未": "己", "巳酉丑": "乙",
+    }),
+    StarRule("太极贵人", "聪明好学，喜近玄理", ("day_gan",), {
+        "甲乙": "子午", "丙丁": "卯酉", "戊己": "辰戌丑未", "庚辛": "寅亥", "壬癸": "巳申",
+    }),
+    StarRule("文昌贵人", "聪明过人，利于文章", ("day_gan",), {
+        "甲": "巳", "乙": "午", "丙戊": "申", "丁己": "酉", "庚": "亥", "辛": "子", "壬": "寅", "癸": "卯",
+    }),
+    StarRule("国印贵人", "掌印信，主权柄", ("day_gan",), {
+        "甲": "戌", "乙": "亥", "丙戊": "丑", "丁己": "寅", "庚": "辰", "辛": "巳", "壬": "未", "癸": "申",
+    }),
+    StarRule("福星贵人", "福禄丰厚，一生安泰", ("day_gan",), {
+        "甲丙": "寅子", "乙癸": "卯丑", "丁": "亥", "戊": "申", "己": "未", "庚": "午", "辛": "巳", "壬": "辰",
+    }),
+    StarRule("天厨贵人", "食禄丰足", ("day_gan",), {
+        "甲丙": "巳", "乙丁": "午", "戊": "申", "己": "酉", "庚": "亥", "辛": "子", "壬": "寅", "癸": "卯",
+    }),
+    StarRule("学堂", "日干长生之地，主聪慧", ("day_gan",), {
+        "甲": "亥", "乙": "午", "丙戊": "寅", "丁己": "酉", "庚": "巳", "辛": "子", "壬": "申", "癸": "卯",
+    }),
+    StarRule("金舆", "主富贵，得配偶之助", ("day_gan",), {
+        "甲": "辰", "乙": "巳", "丙戊": "未", "丁己": "申", "庚": "戌", "辛": "亥", "壬": "丑", "癸": "寅",
+    }),
+    StarRule("天医", "主健康，利医药", ("month_zhi",), {
+        "寅": "丑", "卯": "寅", "辰": "卯", "巳": "辰", "午": "巳", "未": "午",
+        "申": "未", "酉": "申", "戌": "酉", "亥": "戌", "子": "亥", "丑": "子",
+    }),
+    StarRule("天赦", "四时专气，逢凶化吉", ("month_zhi",), {
+        "寅卯辰": ("戊寅",), "巳午未": ("甲午",), "申酉戌": ("戊申",), "亥子丑": ("甲子",),
+    }, ("日柱",)),
+    # --- 禄刃 ---
+    StarRule("禄神", "日干临官之地，主衣禄", ("day_gan",), {
+        "甲": "寅", "乙": "卯", "丙戊": "巳", "丁己": "午", "庚": "申", "辛": "酉", "壬": "亥", "癸": "子",
+    }),
+    StarRule("羊刃", "禄前一位，刚烈好胜", ("day_gan",), {
+        "甲": "卯", "乙": "辰", "丙戊": "午", "丁己": "未", "庚": "酉", "辛": "戌", "壬": "子", "癸": "丑",
+    }),
+    StarRule("飞刃", "羊刃对冲，主意外之灾", ("day_gan",), {
+        "甲": "酉", "乙": "戌", "丙戊": "子", "丁己": "丑", "庚": "卯", "辛": "辰", "壬": "午", "癸": "未",
+    }),
+    StarRule("红艳煞", "多情多欲", ("day_gan",), {
+        "甲": "午", "乙": "申", "丙": "寅", "丁": "未", "戊己": "辰", "庚": "戌", "辛": "酉", "壬": "子", "癸": "申",
+    }),
+    # --- 三合局系 (年/日支查) ---
+    StarRule("驿马", "主迁徙变动", ("year_zhi", "day_zhi"), _san_he("寅申亥巳")),
+    StarRule("咸池", "一名桃花，主性情风流", ("year_zhi", "day_zhi"), _san_he("酉卯午子")),
+    StarRule("华盖", "主孤高，利艺术宗教", ("year_zhi", "day_zhi"), _san_he("辰戌丑未")),
+    StarRule("将星", "主权威，利领导", ("year_zhi", "day_zhi"), _san_he("子午酉卯")),
+    StarRule("劫煞", "主破耗争夺", ("year_zhi", "day_zhi"), _san_he("巳亥寅申")),
+    StarRule("亡神", "主心机深沉，亦主失物", ("year_zhi", "day_zhi"), _san_he("亥巳申寅")),
+    StarRule("灾煞", "主血光横祸", ("year_zhi", "day_zhi"), _san_he("午子卯酉")),
+    # --- 年支查 ---
+    StarRule("孤辰", "主孤独，男忌", ("year_zhi",), {
+        "亥子丑": "寅", "寅卯辰": "巳", "巳午未": "申", "申酉戌": "亥",
+    }),
+    StarRule("寡宿", "主孤独，女忌", ("year_zhi",), {
+        "亥子丑": "戌", "寅卯辰": "丑", "巳午未": "辰", "申酉戌": "未",
+    }),
+    StarRule("红鸾", "主婚恋喜庆", ("year_zhi",), {
+        "子": "卯", "丑": "寅", "寅": "丑", "卯": "子", "辰": "亥", "巳": "戌",
+        "午": "酉", "未": "申", "申": "未", "酉": "午", "戌": "巳", "亥": "辰",
+    }),
+    StarRule("天喜", "主喜庆添丁", ("year_zhi",), {
+        "子": "酉", "丑": "申", "寅": "未", "卯": "午", "辰": "巳", "巳": "辰",
+        "午": "卯", "未": "寅", "申": "丑", "酉": "子", "戌": "亥", "亥": "戌",
+    }),
+    StarRule("血刃", "主血光伤灾", ("month_zhi",), {
+        "寅": "丑", "卯": "未", "辰": "寅", "巳": "申", "午": "卯", "未": "酉",
+        "申": "辰", "酉": "戌", "戌": "巳", "亥": "亥", "子": "午", "丑": "子",
+    }),
+    # --- 空亡 ---
+    StarRule("空亡", "日柱旬空，所临之处力量减损", ("day_pillar",), _xun_kong()),
     # 甲己申酉, 乙庚午未, 丙辛辰巳, 丁壬寅卯, 戊癸子丑
-    JIE_LU_VOID = {
-        "甲": ["壬申", "癸酉"], "己": ["壬申", "癸酉"],
-        "乙": ["壬午", "癸未"], "庚": ["壬午", "癸未"],
-        "丙": ["壬辰", "癸巳"], "辛": ["壬辰", "癸巳"],
-        "丁": ["壬寅", "癸卯"], "壬": ["壬寅", "癸卯"],
-        "戊": ["壬子", "癸丑"], "癸": ["壬子", "癸丑"]
+    StarRule("截路空亡", "行路受阻，晚年寥落", ("day_gan",), {
+        "甲己": ("壬申", "癸酉"), "乙庚": ("壬午", "癸未"), "丙辛": ("壬辰", "癸巳"),
+        "丁壬": ("壬寅", "癸卯"), "戊癸": ("壬子", "癸丑"),
+    }, ("时柱",)),
+    # --- 日柱自带 ---
+    StarRule("魁罡", "性刚果断，掌权", ("chart",), {"": ("庚辰", "庚戌", "壬辰", "戊戌")}, ("日柱",)),
+    StarRule("阴差阳错", "主婚姻波折", ("chart",), {
+        "": ("丙子", "丁丑", "戊寅", "辛卯", "壬辰", "癸巳", "丙午", "丁未", "戊申", "辛酉", "壬戌", "癸亥"),
+    }, ("日柱",)),
+    StarRule("十恶大败", "主破祖耗财", ("chart",), {
+        "": ("甲辰", "乙巳", "丙申", "丁亥", "戊戌", "己丑", "庚辰", "辛巳", "壬申", "癸亥"),
+    }, ("日柱",)),
+    StarRule("孤鸾煞", "主婚姻孤寡", ("chart",), {
+        "": ("乙巳", "丁巳", "辛亥", "戊申", "甲寅", "壬子", "丙午", "戊午"),
+    }, ("日柱",)),
+    StarRule("六秀日", "主秀气聪明", ("chart",), {"": ("丙午", "丁未", "戊子", "戊午", "己丑", "己未")}, ("日柱",)),
+)
+
+def _compile(rules: Sequence[StarRule]) -> Dict[str, List[Dict[str, Tuple[int, ...]]]]:
+    """
+    编译为查表结构：起点 -> 按起点取值下标排列的数组，元素为 {目标干/支/干支: 规则序号元组}。
+    检测时每个起点只取一次数组元素，每个目标位置查 3 个键 (干、支、干支)，与规则数无关。
+    """
+    tables: Dict[str, List[Dict[str, List[int]]]] = {
+        source: [{} for _ in alphabet] for source, (alphabet, _) in KEY_SOURCES.items()
+    }
+    for r, rule in enumerate(rules):
+        for source in rule.keys:
+            alphabet = KEY_SOURCES[source][0]
+            for key, targets in rule.table.items():
+                key_values = [key] if source in ("day_pillar", "chart") else list(key)
+                for value in key_values:
+                    slot = tables[source][alphabet.index(value)]
+                    for target in (targets if isinstance(targets, tuple) else list(targets)):
+                        if target not in GAN and target not in ZHI and target not in JIA_ZI:
+                            raise ValueError(f"神煞 {rule.name} 的目标非法: {target}")
+                        if r not in slot.setdefault(target, []):
+                            slot[target].append(r)
+    # 无规则的起点不参与检测
+    return {
+        source: [{t: tuple(ids) for t, ids in slot.items()} for slot in slots]
+        for source, slots in tables.items() if any(slots)
     }
 
+@lru_cache(maxsize=1)
+def compiled_tables() -> Dict[str, List[Dict[str, Tuple[int, ...]]]]:
+    """首次检测时编译 STAR_RULES (可由 warm_up 提前触发)"""
+    return _compile(STAR_RULES)
+
+class StarDetector:
+    """
+    专业神煞检测器 (严格对齐《渊海子平》明朝版标准)
+    规则见 STAR_RULES，首次使用时编译为查表结构，按目标位置单遍扫描。
+    """
+
+    @staticmethod
+    def scan(pillars: Sequence[str], targets: Sequence[Tuple[str, str]]) -> List[Star]:
+        """
+        pillars: 原局四柱干支 (年月日时)，作为查法起点
+        targets: [(干支, 位置名)]，被查的位置，可为四柱或大运、流年等
+        结果按目标顺序、规则顺序排列；同一神煞在同一位置只记一次。
+        """
+        active = []
+        for source, slots in compiled_tables().items():
+            alphabet, getter = KEY_SOURCES[source]
+            value = getter(pillars)
+            if value in alphabet:
+                active.append(slots[alphabet.index(value)])
+
+        found: Dict[Tuple[int, int], Star] = {}
+        for t, (gan_zhi, pos) in enumerate(targets):
+            for token in (gan_zhi[:1], gan_zhi[1:2], gan_zhi):
+                for slot in active:
+                    for r in slot.get(token, ()):
+                        key = (t, r)
+                        if key in found:
+                            continue
+                        rule = STAR_RULES[r]
+                        if rule.positions is not None and pos not in rule.positions:
+                            continue
+                        found[key] = Star(name=rule.name, pos=pos, desc=rule.desc)
+        return [found[key] for key in sorted(found)]
+
     @staticmethod
     def detect(ctx: BaziContext, tracer: Tracer = None) -> List[Star]:
-        lunar = ctx.solar.getLunar()
-        eight_char = lunar.getEightChar()
-        
-        day_gan = eight_char.getDayGan()
-        day_zhi = eight_char.getDayZhi()
-        year_zhi = eight_char.getYearZhi()
-        month_zhi = eight_char.getMonthZhi()
-        time_gan = eight_char.getTimeGan()
-        time_zhi = eight_char.getTimeZhi()
-        
-        stems = [
-            (eight_char.getYearGan(), "年柱"),
-            (eight_char.getMonthGan(), "月柱"),
-            (eight_char.getDayGan(), "日柱"),
-            (eight_char.getTimeGan(), "时柱")
-        ]
-        branches = [
-            (eight_char.getYearZhi(), "年柱"),
-            (eight_char.getMonthZhi(), "月柱"),
-            (eight_char.getDayZhi(), "日柱"),
-            (eight_char.getTimeZhi(), "时柱")
-        ]
-        
-        found_stars = []
-
-        # 1. 判定天乙 (玉堂)
-        for zhi, pos in branches:
-            if zhi in StarDetector.TIAN_YI.get(day_gan, []):
-                found_stars.append(Star(name="天乙贵人", pos=pos, desc="玉堂金马，逢凶化吉"))
-
-        # 2. 判定月德 (月令查天干)
-        target_yd = StarDetector.YUE_DE.get(month_zhi)
-        for gan, pos in stems:
-            if gan == target_yd:
-                found_stars.append(Star(name="月德贵人", pos=pos, desc="阴德护佑，灾难不侵"))
-
-        # 3. 判定天德 (月令查干支)
-        target_td = StarDetector.TIAN_DE.get(month_zhi)
-        # 查干
-        for gan, pos in stems:
-            if gan == target_td:
-                found_stars.append(Star(name="天德贵人", pos=pos, desc="上天之德，化险为夷"))
-        # 查支
-        for zhi, pos in branches:
-            if zhi == target_td:
-                found_stars.append(Star(name="天德贵人", pos=pos, desc="上天之德，化险为夷"))
-
-        # 4. 判定驿马与咸池
-        check_sources = [year_zhi, day_zhi]
-        for zhi, pos in branches:
-            if any(zhi == StarDetector.YI_MA.get(s) for s in check_sources):
-                if not any(s.name == "驿马" and s.pos == pos for s in found_stars):
-                    found_stars.append(Star(name="驿马", pos=pos, desc="主迁徙变动"))
-            if any(zhi == StarDetector.XIAN_CHI.get(s) for s in check_sources):
-                if not any(s.name == "咸池" and s.pos == pos for s in found_stars):
-                    found_stars.append(Star(name="咸池", pos=pos, desc="一名桃花，主性情风流"))
-
-        # 5. 判定截路空亡 (查时柱)
-        void_times = StarDetector.JIE_LU_VOID.get(day_gan, [])
-        if (time_gan + time_zhi) in void_times:
-            found_stars.append(Star(name="截路空亡", pos="时柱", desc="行路受阻，晚年寥落"))
+        eight_char = ctx.get_lunar().getEightChar()
+        pillars = [eight_char.getYear(), eight_char.getMonth(), eight_char.getDay(), eight_char.getTime()]
+        found_stars = StarDetector.scan(pillars, list(zip(pillars, PILLAR_POSITIONS)))
 
         if tracer:
             tracer.record("神煞检测", f"遵循《渊海子平》标准，共检出 {len(found_stars)} 个神煞")
 
-        return found_stars
\ No newline at end of file
+        return found_stars
+
+    @staticmethod
+    def detect_luck(pillars: Sequence[str], gan_zhi: str, pos: str = "大运") -> List[Star]:
+        """大运、流年等单柱所临神煞 (以原局四柱为起点)"""
+        return StarDetector.scan(pillars, [(gan_zhi, pos)])
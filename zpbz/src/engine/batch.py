@@ -0,0 +1,234 @@
+"""
+批量统计模式：按固定时间网格 (默认每个时辰) 枚举出生时刻，排出指定字段子集并流式写出。
+
+用于统计格局、强弱等判定在人群中的基准分布 (如 1900-2100 年约 88 万盘)，
+为 AnalysisEngine 的阈值校准提供依据。结果按块分发到多进程计算，
+按时间顺序逐块写入 CSV 或 Parquet，内存占用与总盘数无关。
+
+用法:
+    python -m src.engine.batch --start 1900-01-01 --end 2100-12-31 \\
+        --fields pillars,geju,strength,yong_shen --output base_rates.csv
+"""
+import argparse
+import csv
+import os
+import sys
+from datetime import datetime, timedelta
+from multiprocessing import Pool
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+from src.engine.models import BaziRequest, Gender, TimeMode, MonthMode, ZiShiMode
+from src.engine.preprocessor import Preprocessor, BaziContext
+
+DT_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# 可选输出字段 -> 列名
+FIELD_COLUMNS: Dict[str, List[str]] = {
+    "pillars": ["year", "month", "day", "time"],
+    "month_command": ["month_command"],
+    "five_elements": ["wood", "fire", "earth", "metal", "water"],
+    "geju": ["geju", "geju_type"],
+    "strength": ["strength_level", "strength_score"],
+    "yong_shen": ["yong_shen", "xi_shen", "ji_shen", "chou_shen"],
+    "stars": ["stars"],
+}
+DEFAULT_FIELDS = ("pillars", "geju", "strength", "yong_shen")
+FLOAT_COLUMNS = {"strength_score", "wood", "fire", "earth", "metal", "water"}
+ELEMENT_ORDER = ("木", "火", "土", "金", "水")
+
+Row = Tuple
+
+def compute_row(ctx: BaziContext, fields: Sequence[str]) -> List:
+    """只运行所选字段依赖的算法阶段，返回与 FIELD_COLUMNS 对应的列值"""
+    from src.engine.algorithms.energy import EnergyModel
+    from src.engine.algorithms.interactions import InteractionDetector
+    from src.engine.algorithms.geju import GejuAnalyzer
+    from src.engine.algorithms.analysis import AnalysisEngine
+
+    wanted = set(fields)
+    energy_data = geju = analysis = None
+    if wanted & {"five_elements", "geju", "strength", "yong_shen"}:
+        energy_data = EnergyModel.calculate_scores(ctx)
+    if wanted & {"geju", "strength", "yong_shen"}:
+        interactions = InteractionDetector.detect_all(ctx)
+        InteractionDetector.validate_transformations(interactions, ctx)
+        geju = GejuAnalyzer.analyze(ctx, interactions, {k: v["score"] for k, v in energy_data.items()})
+    if wanted & {"strength", "yong_shen"}:
+        analysis = AnalysisEngine.analyze(ctx, energy_data, geju)
+
+    values = []
+    for field in fields:
+        if field == "pillars":
+            from src.engine.extractor import CoreExtractor
+            core = CoreExtractor.extract(ctx)
+            values.extend(c.gan + c.zhi for c in (core.year, core.month, core.day, core.time))
+        elif field == "month_command":
+            from src.engine.algorithms.command import MonthCommandExtractor
+            values.append(MonthCommandExtractor.get_command(ctx)[0])
+        elif field == "five_elements":
+            values.extend(energy_data[elem]["score"] for elem in ELEMENT_ORDER)
+        elif field == "geju":
+            values.extend([geju.name, geju.type])
+        elif field == "strength":
+            values.extend([analysis.strength_level, analysis.strength_score])
+        elif field == "yong_shen":
+            values.extend([analysis.yong_shen, analysis.xi_shen, analysis.ji_shen, analysis.chou_shen])
+        elif field == "stars":
+            from src.engine.algorithms.stars import StarDetector
+            values.append("|".join(f"{s.name}@{s.pos}" for s in StarDetector.detect(ctx)))
+    return values
+
+# --- 多进程工作单元 ---
+_preprocessor: Optional[Preprocessor] = None
+
+def _init_worker():
+    global _preprocessor
+    from src.engine.ganzhi import install_lunar_year_cache
+    install_lunar_year_cache()
+    _preprocessor = Preprocessor()
+
+def _run_chunk(task) -> List[Row]:
+    """task: (起始时刻, 盘数, 步长分钟, 字段, 请求参数)。块内时刻连续，可复用农历年缓存"""
+    start, count, step_minutes, fields, options = task
+    if _preprocessor is None:
+        _init_worker()
+    requests = [
+        BaziRequest(name="batch", birth_datetime=(start + timedelta(minutes=step_minutes * i)).strftime(DT_FORMAT), **options)
+        for i in range(count)
+    ]
+    # 整块向量化预处理
+    contexts = _preprocessor.process_many(requests)
+    return [(ctx.request.birth_datetime, *compute_row(ctx, fields)) for ctx in contexts]
+
+# --- 流式输出 ---
+class CsvSink:
+    def __init__(self, path: str, columns: List[str]):
+        self._file = sys.stdout if path == "-" else open(path, "w", encoding="utf-8", newline="")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(columns)
+
+    def write(self, rows: List[Row]):
+        self._writer.writerows(rows)
+
+    def close(self):
+        if self._file is not sys.stdout:
+            self._file.close()
+
+class ParquetSink:
+    """按行组写入 Parquet，需要安装 pyarrow"""
+
+    def __init__(self, path: str, columns: List[str], row_group_size: int = 65536):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("写出 Parquet 需要安装 pyarrow，或改用 --format csv")
+        self._pa = pa
+        self._columns = columns
+        self._schema = pa.schema([
+            (c, pa.float64() if c in FLOAT_COLUMNS else pa.string()) for c in columns
+        ])
+        self._writer = pq.ParquetWriter(path, self._schema)
+        self._row_group_size = row_group_size
+        self._buffer: List[Row] = []
+
+    def write(self, rows: List[Row]):
+        self._buffer.extend(rows)
+        if len(self._buffer) >= self._row_group_size:
+            self._flush()
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        arrays = [list(col) for col in zip(*self._buffer)]
+        self._writer.write_table(self._pa.Table.from_arrays(arrays, schema=self._schema))
+        self._buffer = []
+
+    def close(self):
+        self._flush()
+        self._writer.close()
+
+SINKS = {"csv": CsvSink, "parquet": ParquetSink}
+
+class PopulationBatch:
+    """
+    人群基准批量排盘：在 [start, end) 上按 step_minutes 枚举出生时刻。
+    options 为 BaziRequest 的其余参数 (gender, birth_location, time_mode 等)。
+    """
+
+    def __init__(self, fields: Sequence[str] = DEFAULT_FIELDS, workers: Optional[int] = None,
+                 chunk_size: int = 360, **options):
+        unknown = [f for f in fields if f not in FIELD_COLUMNS]
+        if unknown:
+            raise ValueError(f"未知字段: {', '.join(unknown)}，可选: {', '.join(FIELD_COLUMNS)}")
+        self.fields = list(fields)
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.options = options
+
+    @property
+    def columns(self) -> List[str]:
+        return ["birth_datetime"] + [c for f in self.fields for c in FIELD_COLUMNS[f]]
+
+    def _tasks(self, start: datetime, end: datetime, step_minutes: int) -> Iterator[tuple]:
+        step = timedelta(minutes=step_minutes)
+        total = -(-(end - start) // step)
+        for offset in range(0, total, self.chunk_size):
+            count = min(self.chunk_size, total - offset)
+            yield (start + step * offset, count, step_minutes, self.fields, self.options)
+
+    def iter_chunks(self, start: datetime, end: datetime, step_minutes: int = 120) -> Iterator[List[Row]]:
+        """按时间顺序逐块产出结果行"""
+        tasks = self._tasks(start, end, step_minutes)
+        if self.workers <= 1:
+            for task in tasks:
+                yield _run_chunk(task)
+            return
+        with Pool(self.workers, initializer=_init_worker) as pool:
+            yield from pool.imap(_run_chunk, tasks)
+
+    def write(self, path: str, start: datetime, end: datetime, step_minutes: int = 120, fmt: str = "csv") -> int:
+        """写出到文件 (path 为 '-' 时 CSV 写到标准输出)，返回总盘数"""
+        sink = SINKS[fmt](path, self.columns)
+        total = 0
+        try:
+            for rows in self.iter_chunks(start, end, step_minutes):
+                sink.write(rows)
+                total += len(rows)
+        finally:
+            sink.close()
+        return total
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="批量统计排盘 (按时间网格枚举)")
+    parser.add_argument("--start", required=True, help="起始日期 YYYY-MM-DD (含)")
+    parser.add_argument("--end", required=True, help="结束日期 YYYY-MM-DD (含)")
+    parser.add_argument("--step", type=int, default=120, help="网格步长 (分钟)，默认 120 即每个时辰一盘")
+    parser.add_argument("--fields", default=",".join(DEFAULT_FIELDS), help=f"输出字段，可选: {','.join(FIELD_COLUMNS)}")
+    parser.add_argument("--output", default="-", help="输出路径，'-' 为标准输出")
+    parser.add_argument("--format", choices=list(SINKS), default="csv")
+    parser.add_argument("--workers", type=int, default=None, help="进程数，默认全部 CPU")
+    parser.add_argument("--gender", type=int, choices=[0, 1], default=1)
+    parser.add_argument("--location", default="北京")
+    parser.add_argument("--timezone", default=None, help="IANA 时区名，默认北京时间")
+    parser.add_argument("--time-mode", choices=[m.value for m in TimeMode], default=TimeMode.MEAN_SOLAR.value)
+    parser.add_argument("--month-mode", choices=[m.value for m in MonthMode], default=MonthMode.SOLAR_TERM.value)
+    parser.add_argument("--zi-shi-mode", choices=[m.value for m in ZiShiMode], default=ZiShiMode.LATE_ZI_IN_DAY.value)
+    args = parser.parse_args(argv)
+
+    batch = PopulationBatch(
+        fields=[f.strip() for f in args.fields.split(",") if f.strip()],
+        workers=args.workers,
+        gender=Gender(args.gender),
+        birth_location=args.location,
+        timezone=args.timezone,
+        time_mode=TimeMode(args.time_mode),
+        month_mode=MonthMode(args.month_mode),
+        zi_shi_mode=ZiShiMode(args.zi_shi_mode),
+    )
+    start = datetime.strptime(args.start, "%Y-%m-%d")
+    end = datetime.strptime(args.end, "%Y-%m-%d") + timedelta(days=1)
+    total = batch.write(args.output, start, end, args.step, args.format)
+    print(f"完成: 共 {total} 盘", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+批量排盘：从 JSONL / CSV (文件或标准输入) 读取 BaziRequest，多进程排盘后按输入顺序流式写出。
+
+每行输入对应一条输出记录:
+    {"row": 行号, "ok": true,  "result": {...}}                  成功 (result 为 BaziResult 的字段子集)
+    {"row": 行号, "ok": false, "error": "...", "input": 原始行}   失败 (校验或排盘异常，不中断整批)
+
+输出为 JSONL，或 msgpack 记录流 (需要安装 msgpack，可用 msgpack.Unpacker 逐条读取)。
+在途任务数有上限，内存占用与输入规模无关。
+
+用法:
+    python -m src.engine requests.jsonl --fields core,geju,analysis --output charts.jsonl
+    cat requests.csv | python -m src.engine --input-format csv --format msgpack --output charts.msgpack
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+from collections import deque
+from multiprocessing import Pool
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+# (行号, 原始输入: dict 或无法解析的文本)
+Row = Tuple[int, object]
+
+INPUT_FORMATS = ("jsonl", "csv")
+OUTPUT_FORMATS = ("jsonl", "msgpack")
+
+def result_fields() -> List[str]:
+    from src.engine.core import BaziResult
+    return list(BaziResult.model_fields)
+
+# --- 读取 ---
+def read_jsonl(stream) -> Iterator[Row]:
+    for number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield number, json.loads(line)
+        except json.JSONDecodeError:
+            yield number, line
+
+def read_csv(stream) -> Iterator[Row]:
+    """首行为表头 (BaziRequest 字段名)；空单元格视为未填，取模型默认值"""
+    for number, record in enumerate(csv.DictReader(stream), 1):
+        yield number, {k: v for k, v in record.items() if k and v not in (None, "")}
+
+READERS = {"jsonl": read_jsonl, "csv": read_csv}
+
+# --- 编码 ---
+def _encoder(fmt: str):
+    if fmt == "jsonl":
+        return lambda record: (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+    try:
+        import msgpack
+    except ImportError:
+        raise RuntimeError("写出 msgpack 需要安装 msgpack，或改用 --format jsonl")
+    return msgpack.Packer(use_bin_type=True).pack
+
+# --- 多进程工作单元 ---
+_engine = None
+
+def _init_worker():
+    global _engine
+    from src.engine.core import BaziEngine
+    _engine = BaziEngine()
+
+def arrange_row(row: Row, fields: Optional[Sequence[str]], skip_liu_yue: bool) -> Dict:
+    """单行排盘，异常转为错误记录"""
+    from src.engine.models import BaziRequest
+    number, raw = row
+    try:
+        if not isinstance(raw, dict):
+            raise ValueError("无法解析为 JSON 对象")
+        result = _engine.arrange(BaziRequest(**raw), skip_liu_yue=skip_liu_yue)
+        data = result.model_dump(mode="json", include=set(fields) if fields else None)
+        return {"row": number, "ok": True, "result": data}
+    except Exception as e:
+        return {"row": number, "ok": False, "error": f"{type(e).__name__}: {e}", "input": raw}
+
+def _run_chunk(task) -> Tuple[bytes, int]:
+    """task: (行列表, 字段, 是否跳过流月, 输出格式)。返回编码后的字节与失败行数"""
+    rows, fields, skip_liu_yue, fmt = task
+    if _engine is None:
+        _init_worker()
+    encode = _encoder(fmt)
+    records = [arrange_row(row, fields, skip_liu_yue) for row in rows]
+    return b"".join(encode(r) for r in records), sum(1 for r in records if not r["ok"])
+
+class BulkArrange:
+    """
+    fields 为 BaziResult 字段子集 (None 为全部)；不输出 fortune 时自动跳过流月计算。
+    """
+
+    def __init__(self, fields: Optional[Sequence[str]] = None, workers: Optional[int] = None,
+                 chunk_size: int = 64, fmt: str = "jsonl", skip_liu_yue: bool = False):
+        if fmt not in OUTPUT_FORMATS:
+            raise ValueError(f"未知输出格式: {fmt}，可选: {', '.join(OUTPUT_FORMATS)}")
+        if fields:
+            known = result_fields()
+            unknown = [f for f in fields if f not in known]
+            if unknown:
+                raise ValueError(f"未知字段: {', '.join(unknown)}，可选: {', '.join(known)}")
+        _encoder(fmt)  # 尽早暴露缺失的可选依赖
+        self.fields = list(fields) if fields else None
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.fmt = fmt
+        self.skip_liu_yue = skip_liu_yue or (self.fields is not None and "fortune" not in self.fields)
+
+    def _tasks(self, rows: Iterator[Row]) -> Iterator[tuple]:
+        chunk: List[Row] = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= self.chunk_size:
+                yield (chunk, self.fields, self.skip_liu_yue, self.fmt)
+                chunk = []
+        if chunk:
+            yield (chunk, self.fields, self.skip_liu_yue, self.fmt)
+
+    def iter_chunks(self, rows: Iterator[Row]) -> Iterator[Tuple[bytes, int, int]]:
+        """按输入顺序逐块产出 (编码字节, 行数, 失败行数)；在途块数限制为进程数的 4 倍"""
+        tasks = self._tasks(rows)
+        if self.workers <= 1:
+            for task in tasks:
+                yield (*_run_chunk(task), len(task[0]))
+            return
+        with Pool(self.workers, initializer=_init_worker) as pool:
+            pending = deque()
+            for task in tasks:
+                pending.append((pool.apply_async(_run_chunk, (task,)), len(task[0])))
+                if len(pending) >= self.workers * 4:
+                    result, count = pending.popleft()
+                    yield (*result.get(), count)
+            while pending:
+                result, count = pending.popleft()
+                yield (*result.get(), count)
+
+    def run(self, rows: Iterator[Row], out) -> Tuple[int, int]:
+        """写入二进制流 out，返回 (总行数, 失败行数)"""
+        total = failed = 0
+        for data, bad, count in self.iter_chunks(rows):
+            out.write(data)
+            out.flush()
+            total += count
+            failed += bad
+        return total, failed
+
+def _guess_format(path: str) -> str:
+    return "csv" if path.lower().endswith(".csv") else "jsonl"
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m src.engine", description="批量排盘 (JSONL/CSV 输入，流式输出)")
+    parser.add_argument("input", nargs="?", default="-", help="输入路径，'-' 或省略为标准输入")
+    parser.add_argument("--input-format", choices=INPUT_FORMATS, default=None, help="默认按扩展名判断，标准输入为 jsonl")
+    parser.add_argument("--output", default="-", help="输出路径，'-' 为标准输出")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default="jsonl")
+    parser.add_argument("--fields", default=None, help="只输出的 BaziResult 字段，逗号分隔 (如 core,geju,analysis)")
+    parser.add_argument("--skip-liu-yue", action="store_true", help="不计算流月")
+    parser.add_argument("--workers", type=int, default=None, help="进程数，默认全部 CPU")
+    parser.add_argument("--chunk-size", type=int, default=64, help="每个任务的行数")
+    args = parser.parse_args(argv)
+
+    try:
+        bulk = BulkArrange(
+            fields=[f.strip() for f in args.fields.split(",") if f.strip()] if args.fields else None,
+            workers=args.workers,
+            chunk_size=args.chunk_size,
+            fmt=args.format,
+            skip_liu_yue=args.skip_liu_yue,
+        )
+    except (ValueError, RuntimeError) as e:
+        print(e, file=sys.stderr)
+        return 2
+
+    input_format = args.input_format or ("jsonl" if args.input == "-" else _guess_format(args.input))
+    source = (io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8", newline="") if args.input == "-"
+              else open(args.input, "r", encoding="utf-8", newline=""))
+    out = sys.stdout.buffer if args.output == "-" else open(args.output, "wb")
+    try:
+        total, failed = bulk.run(READERS[input_format](source), out)
+    finally:
+        if args.input != "-":
+            source.close()
+        if args.output != "-":
+            out.close()
+    print(f"完成: 共 {total} 行，失败 {failed} 行", file=sys.stderr)
+    # 有失败行时以 1 退出，便于脚本判断是否需要复查
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
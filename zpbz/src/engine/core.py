@@ -1,7 +1,8 @@
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Set, Tuple
 from pydantic import BaseModel, Field
 from datetime import datetime
 from src.engine.models import BaziRequest, TraceStep
+from src.engine.ganzhi import install_lunar_year_cache
 from src.engine.preprocessor import Preprocessor, BaziContext
 from src.engine.utils import Tracer
 from src.engine.extractor import (
@@ -12,6 +13,10 @@ from src.engine.algorithms.interactions import Interaction
 from src.engine.algorithms.geju import GejuResult
 from src.engine.algorithms.analysis import AnalysisResult
 from src.engine.algorithms.stars import Star
+from src.engine.reverse import ReverseLookup, MatchWindow
+
+# 引擎版本：排盘算法或 BaziResult 结构变化时递增，持久化的排盘结果按此版本失效
+ENGINE_VERSION = "1.0"
 
 # 补救 1.1.3: 环境快照
 class EnvironmentSnapshot(BaseModel):
@@ -43,85 +48,213 @@ class BaziResult(BaseModel):
     analysis: Optional[AnalysisResult] = None # 强弱喜用判定
     stars: List[Star] = [] # 专业神煞
 
+# 补救 2.4.2: 阶段依赖图 (按执行顺序排列)
+# 阶段 -> (直接读取的请求字段, 上游阶段)。算法阶段只读取上下文的默认流派八字，不受请求开关影响
+STAGE_GRAPH: Dict[str, Tuple[Set[str], Tuple[str, ...]]] = {
+    "preprocess": ({"calendar_type", "birth_datetime", "birth_location", "longitude", "timezone", "time_mode"}, ()),
+    "core": ({"zi_shi_mode", "month_mode"}, ("preprocess",)),
+    "fortune": ({"gender", "zi_shi_mode"}, ("preprocess",)),
+    "auxiliary": (set(), ("preprocess",)),
+    "month_command": (set(), ("preprocess",)),
+    "five_elements": (set(), ("preprocess",)),
+    "interactions": (set(), ("preprocess",)),
+    "geju": (set(), ("five_elements", "interactions")),
+    "analysis": (set(), ("five_elements", "geju")),
+    "stars": (set(), ("preprocess",)),
+}
+
+# 阶段 -> 追踪模块名，增量重排时据此复用上次的推导路径
+STAGE_TRACE_MODULES = {
+    "preprocess": "预处理",
+    "core": "核心命盘",
+    "fortune": "动态运程",
+    "auxiliary": "辅助命盘",
+    "month_command": "月令分司",
+    "five_elements": "五行评分",
+    "interactions": "干支作用",
+    "geju": "格局判定",
+    "analysis": "强弱判定",
+    "stars": "神煞检测",
+}
+
+# 阶段 -> BaziResult 字段
+STAGE_FIELDS = {
+    "preprocess": ("birth_solar_datetime", "birth_lunar_datetime"),
+    "core": ("core",),
+    "fortune": ("fortune",),
+    "auxiliary": ("auxiliary",),
+    "month_command": ("month_command",),
+    "five_elements": ("five_elements",),
+    "interactions": ("interactions",),
+    "geju": ("geju",),
+    "analysis": ("analysis",),
+    "stars": ("stars",),
+}
+
+def dirty_stages(changed_fields: Set[str]) -> Set[str]:
+    """请求字段变动 -> 需要重算的阶段 (含全部下游)"""
+    dirty: Set[str] = set()
+    for stage, (fields, upstream) in STAGE_GRAPH.items():
+        if fields & changed_fields or any(u in dirty for u in upstream):
+            dirty.add(stage)
+    return dirty
+
 class BaziEngine:
     def __init__(self):
+        # 以多年缓存替换 lunar_python 的单年缓存 (进程级，显式安装)
+        install_lunar_year_cache()
         self.preprocessor = Preprocessor()
 
     def arrange(self, request: BaziRequest, skip_liu_yue: bool = False) -> BaziResult:
+        return self._run(request, skip_liu_yue, set(STAGE_GRAPH))
+
+    def rearrange(self, previous: BaziResult, request: BaziRequest, skip_liu_yue: bool = False) -> BaziResult:
+        """
+        增量重排：对比上次结果的请求，只重算输入发生变化的阶段及其下游，其余字段直接复用。
+        如仅改性别只重算大运，仅切换子时流派只重算四柱与大运。
+        """
+        changed = {
+            f for f in BaziRequest.model_fields
+            if getattr(request, f) != getattr(previous.request, f)
+        }
+        dirty = dirty_stages(changed)
+        # 流月开关不在请求中，按上次结果是否含流月判断
+        had_liu_yue = any(ln.liu_yue for dy in previous.fortune.da_yun for ln in dy.liu_nian)
+        if skip_liu_yue == had_liu_yue:
+            dirty.add("fortune")
+        return self._run(request, skip_liu_yue, dirty, previous)
+
+    async def arrange_async(self, request: BaziRequest, skip_liu_yue: bool = False,
+                            timeout: Optional[float] = None) -> BaziResult:
+        """
+        在默认执行器 (进程池或线程池，见 src.engine.executor) 中排盘，不阻塞事件循环。
+        队列已满抛出 EngineBusy，超时抛出 EngineTimeout。
+        """
+        from src.engine.executor import default_executor
+        return await default_executor().arrange(request, skip_liu_yue, timeout=timeout)
+
+    async def rearrange_async(self, previous: BaziResult, request: BaziRequest, skip_liu_yue: bool = False,
+                              timeout: Optional[float] = None) -> BaziResult:
+        from src.engine.executor import default_executor
+        return await default_executor().rearrange(previous, request, skip_liu_yue, timeout=timeout)
+
+    def _run(self, request: BaziRequest, skip_liu_yue: bool, dirty: Set[str],
+             previous: Optional[BaziResult] = None) -> BaziResult:
         tracer = Tracer()
+        fields: Dict = {}
+        scratch: Dict = {}  # 阶段间传递、不进入结果的中间量 (如五行能量明细)
         
-        # 1. 预处理
+        # 1. 预处理 (只要有阶段需重算就要上下文；预处理输入未变时不视为脏，不牵连下游)
         tracer.record("预处理", f"开始处理 {request.name} 的请求")
-        ctx = self.preprocessor.process(request)
+        ctx = self.preprocessor.process(request) if dirty else None
+        
+        for stage in STAGE_GRAPH:
+            if stage in dirty:
+                fields.update(getattr(self, f"_stage_{stage}")(ctx, tracer, scratch, skip_liu_yue))
+                continue
+            # 复用上次结果与推导路径 (预处理首条为请求名，已重新记录)
+            module = STAGE_TRACE_MODULES[stage]
+            steps = [s for s in previous.analysis_trace if s.module == module]
+            tracer.extend(steps[1:] if stage == "preprocess" else steps)
+            fields.update({f: getattr(previous, f) for f in STAGE_FIELDS[stage]})
+        
+        # 4. 构建快照
+        env = EnvironmentSnapshot(original_request=request)
+        return BaziResult(
+            environment=env,
+            request=request,
+            analysis_trace=tracer.get_steps(),
+            **fields
+        )
+
+    # --- 各阶段实现：返回 BaziResult 字段 ---
+    @staticmethod
+    def _stage_preprocess(ctx: BaziContext, tracer: Tracer, scratch: Dict, skip_liu_yue: bool) -> Dict:
         tracer.record("预处理", f"时间校正完成: {ctx.solar.toFullString()}")
         
-        # 2. 提取数据
+        # 过滤掉库自带的星座信息
+        import re
+        solar_full = ctx.solar.toFullString()
+        lunar_full = ctx.get_lunar().toFullString()
+        
+        zodiac_pattern = r"\s(白羊|金牛|双子|巨蟹|狮子|处女|天秤|天蝎|射手|摩羯|水瓶|双鱼)座"
+        return {
+            "birth_solar_datetime": re.sub(zodiac_pattern, "", solar_full),
+            "birth_lunar_datetime": re.sub(zodiac_pattern, "", lunar_full),
+        }
+
+    # 2. 提取数据
+    @staticmethod
+    def _stage_core(ctx: BaziContext, tracer: Tracer, scratch: Dict, skip_liu_yue: bool) -> Dict:
         core_chart = CoreExtractor.extract(ctx)
         tracer.record("核心命盘", "四柱提取完成")
-        
+        return {"core": core_chart}
+
+    @staticmethod
+    def _stage_fortune(ctx: BaziContext, tracer: Tracer, scratch: Dict, skip_liu_yue: bool) -> Dict:
         fortune_data = FortuneExtractor.extract(ctx, skip_liu_yue=skip_liu_yue)
         tracer.record("动态运程", "起运时间与大运计算完成")
-        
+        return {"fortune": fortune_data}
+
+    @staticmethod
+    def _stage_auxiliary(ctx: BaziContext, tracer: Tracer, scratch: Dict, skip_liu_yue: bool) -> Dict:
         auxiliary_chart = AuxiliaryExtractor.extract(ctx)
         tracer.record("辅助命盘", "胎元、命宫等神煞计算完成")
-        
-        # 3. 深度分析 (Phase 3)
-        # 3.1 月令分司
+        return {"auxiliary": auxiliary_chart}
+
+    # 3. 深度分析 (Phase 3)
+    # 3.1 月令分司
+    @staticmethod
+    def _stage_month_command(ctx: BaziContext, tracer: Tracer, scratch: Dict, skip_liu_yue: bool) -> Dict:
         from src.engine.algorithms.command import MonthCommandExtractor
         cmd_gan, cmd_detail = MonthCommandExtractor.get_command(ctx, tracer)
-        month_command = MonthCommandResult(current=cmd_gan, detail=cmd_detail)
-        
-        # 3.2 五行能量评分
+        return {"month_command": MonthCommandResult(current=cmd_gan, detail=cmd_detail)}
+
+    # 3.2 五行能量评分
+    @staticmethod
+    def _stage_five_elements(ctx: BaziContext, tracer: Tracer, scratch: Dict, skip_liu_yue: bool) -> Dict:
         from src.engine.algorithms.energy import EnergyModel
-        energy_data = EnergyModel.calculate_scores(ctx, tracer)
-        five_elements = FiveElementsResult(
+        energy_data = scratch["energy_data"] = EnergyModel.calculate_scores(ctx, tracer)
+        five_elements = scratch["five_elements"] = FiveElementsResult(
             scores={k: v["score"] for k, v in energy_data.items()},
             states={k: v["state"] for k, v in energy_data.items()}
         )
-        
-        # 3.3 干支作用关系
+        return {"five_elements": five_elements}
+
+    # 3.3 干支作用关系
+    @staticmethod
+    def _stage_interactions(ctx: BaziContext, tracer: Tracer, scratch: Dict, skip_liu_yue: bool) -> Dict:
         from src.engine.algorithms.interactions import InteractionDetector
-        interactions = InteractionDetector.detect_all(ctx, tracer)
+        interactions = scratch["interactions"] = InteractionDetector.detect_all(ctx, tracer)
         InteractionDetector.validate_transformations(interactions, ctx, tracer)
-        
-        # 3.4 格局判定
+        return {"interactions": interactions}
+
+    # 3.4 格局判定 (依赖图保证五行与作用关系同轮重算)
+    @staticmethod
+    def _stage_geju(ctx: BaziContext, tracer: Tracer, scratch: Dict, skip_liu_yue: bool) -> Dict:
         from src.engine.algorithms.geju import GejuAnalyzer
-        geju = GejuAnalyzer.analyze(ctx, interactions, five_elements.scores, tracer)
-        
-        # 3.5 强弱喜用判定
+        geju = scratch["geju"] = GejuAnalyzer.analyze(ctx, scratch["interactions"], scratch["five_elements"].scores, tracer)
+        return {"geju": geju}
+
+    # 3.5 强弱喜用判定
+    @staticmethod
+    def _stage_analysis(ctx: BaziContext, tracer: Tracer, scratch: Dict, skip_liu_yue: bool) -> Dict:
         from src.engine.algorithms.analysis import AnalysisEngine
-        analysis = AnalysisEngine.analyze(ctx, energy_data, geju, tracer)
-        
-        # 3.6 神煞检测
+        return {"analysis": AnalysisEngine.analyze(ctx, scratch["energy_data"], scratch["geju"], tracer)}
+
+    # 3.6 神煞检测
+    @staticmethod
+    def _stage_stars(ctx: BaziContext, tracer: Tracer, scratch: Dict, skip_liu_yue: bool) -> Dict:
         from src.engine.algorithms.stars import StarDetector
-        stars = StarDetector.detect(ctx, tracer)
-        
-        # 4. 构建快照
-        env = EnvironmentSnapshot(original_request=request)
-        
-        # 过滤掉库自带的星座信息
-        import re
-        solar_full = ctx.solar.toFullString()
-        lunar_full = ctx.solar.getLunar().toFullString()
-        
-        zodiac_pattern = r"\s(白羊|金牛|双子|巨蟹|狮子|处女|天秤|天蝎|射手|摩羯|水瓶|双鱼)座"
-        
-        clean_solar = re.sub(zodiac_pattern, "", solar_full)
-        clean_lunar = re.sub(zodiac_pattern, "", lunar_full)
-        
-        return BaziResult(
-            environment=env,
-            request=request,
-            birth_solar_datetime=clean_solar,
-            birth_lunar_datetime=clean_lunar,
-            core=core_chart,
-            fortune=fortune_data,
-            auxiliary=auxiliary_chart,
-            analysis_trace=tracer.get_steps(),
-            month_command=month_command,
-            five_elements=five_elements,
-            interactions=interactions,
-            geju=geju,
-            analysis=analysis,
-            stars=stars
-        )
\ No newline at end of file
+        return {"stars": StarDetector.detect(ctx, tracer)}
+
+    def reverse_lookup(self, pillars: List[str], start_year: int, end_year: int, **options) -> List[MatchWindow]:
+        """四柱反查出生时间窗口，options 同 ReverseLookup.search"""
+        return ReverseLookup(self.preprocessor.config).search(pillars, start_year, end_year, **options)
+
+    def batch(self, output: str, start: datetime, end: datetime, step_minutes: int = 120,
+              fields: List[str] = None, fmt: str = "csv", workers: Optional[int] = None, **options) -> int:
+        """人群基准批量排盘并流式写出，参数见 PopulationBatch"""
+        from src.engine.batch import PopulationBatch, DEFAULT_FIELDS
+        batch = PopulationBatch(fields=fields or DEFAULT_FIELDS, workers=workers, **options)
+        return batch.write(output, start, end, step_minutes, fmt)
@@ -0,0 +1,163 @@
+"""
+异步排盘门面：在进程池或线程池中执行 CPU 密集的排盘，事件循环只等待结果，永不阻塞。
+
+- 有界排队：执行中 + 排队中的任务达到 workers + max_queue 时立即拒绝 (EngineBusy)，由调用方降级或返回 503
+- 单次超时：超时抛出 EngineTimeout；已开始的计算无法中断，仍计入占用直到真正结束，保证排队上限真实有效
+- 指标：stats() 返回排队深度、执行中任务数与累计计数
+
+用法:
+    configure_executor(kind="process", workers=2, max_queue=32, timeout=20)   # 进程启动时配置 (可选)
+    await default_executor().start()                                          # 启动时创建并预热工作进程 (可选)
+    result = await engine.arrange_async(request)
+"""
+import asyncio
+import os
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+EXECUTOR_KINDS = ("process", "thread")
+
+class EngineBusy(RuntimeError):
+    """排盘队列已满"""
+
+class EngineTimeout(TimeoutError):
+    """排盘超时"""
+
+# --- 工作进程/线程内的引擎 ---
+_engine = None
+_engine_lock = threading.Lock()
+
+def _worker_engine():
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                from src.engine.core import BaziEngine
+                _engine = BaziEngine()
+    return _engine
+
+def _init_process():
+    from src.engine.warmup import warm_up
+    warm_up()
+
+def _call(method: str, *args):
+    """在工作进程/线程中调用 BaziEngine 的方法 (arrange / rearrange)"""
+    return getattr(_worker_engine(), method)(*args)
+
+class EngineExecutor:
+    def __init__(self, kind: str = "process", workers: Optional[int] = None,
+                 max_queue: int = 32, timeout: Optional[float] = 30.0):
+        if kind not in EXECUTOR_KINDS:
+            raise ValueError(f"未知执行器类型: {kind}，可选: {', '.join(EXECUTOR_KINDS)}")
+        self.kind = kind
+        self.workers = workers or min(4, os.cpu_count() or 1)
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._pool: Optional[Executor] = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._counters = {"submitted": 0, "completed": 0, "failed": 0, "rejected": 0, "timeouts": 0}
+        self._peak_queue = 0
+
+    def _get_pool(self) -> Executor:
+        if self._pool is None:
+            if self.kind == "process":
+                import multiprocessing
+                # spawn: 服务进程内已有事件循环与线程，fork 不安全
+                self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"),
+                                                 initializer=_init_process)
+            else:
+                self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix="bazi")
+        return self._pool
+
+    async def start(self):
+        """
+        立即创建池并预热，避免首批请求承担创建工作进程、导入引擎与预热的开销 (这些耗时会计入单次超时)。
+        进程池：每个工作进程在 initializer 中预热，这里为每个进程提交一个空任务并等待其完成；
+        线程池：与调用方共用进程，在本进程预热一次。
+        """
+        pool = self._get_pool()
+        if self.kind == "process":
+            await asyncio.gather(*[asyncio.wrap_future(pool.submit(os.getpid)) for _ in range(self.workers)])
+        else:
+            await asyncio.to_thread(_init_process)
+
+    @property
+    def capacity(self) -> int:
+        return self.workers + self.max_queue
+
+    def _finished(self, future):
+        with self._lock:
+            self._in_flight -= 1
+            if future.cancelled() or future.exception() is not None:
+                self._counters["failed"] += 1
+            else:
+                self._counters["completed"] += 1
+
+    async def call(self, method: str, *args, timeout: Optional[float] = None) -> Any:
+        with self._lock:
+            if self._in_flight >= self.capacity:
+                self._counters["rejected"] += 1
+                raise EngineBusy(f"排盘队列已满 ({self._in_flight}/{self.capacity})")
+            self._in_flight += 1
+            self._counters["submitted"] += 1
+            self._peak_queue = max(self._peak_queue, self._in_flight - self.workers)
+        try:
+            future = self._get_pool().submit(_call, method, *args)
+        except Exception:
+            with self._lock:
+                self._in_flight -= 1
+                self._counters["failed"] += 1
+            raise
+        future.add_done_callback(self._finished)
+
+        limit = self.timeout if timeout is None else timeout
+        try:
+            # shield: 超时只放弃等待，不取消底层任务 (未开始的任务由下方显式取消)
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), limit)
+        except asyncio.TimeoutError:
+            future.cancel()
+            with self._lock:
+                self._counters["timeouts"] += 1
+            raise EngineTimeout(f"排盘超过 {limit} 秒")
+
+    async def arrange(self, request, skip_liu_yue: bool = False, timeout: Optional[float] = None):
+        return await self.call("arrange", request, skip_liu_yue, timeout=timeout)
+
+    async def rearrange(self, previous, request, skip_liu_yue: bool = False, timeout: Optional[float] = None):
+        return await self.call("rearrange", previous, request, skip_liu_yue, timeout=timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            in_flight = self._in_flight
+            return {
+                "kind": self.kind,
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "running": min(in_flight, self.workers),
+                "queued": max(0, in_flight - self.workers),
+                "peak_queued": self._peak_queue,
+                **self._counters,
+            }
+
+    def shutdown(self, wait: bool = True):
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait)
+            self._pool = None
+
+_default: Optional[EngineExecutor] = None
+
+def configure_executor(**options) -> EngineExecutor:
+    """替换进程内默认执行器 (参数同 EngineExecutor)，旧执行器在已提交任务完成后关闭"""
+    global _default
+    previous, _default = _default, EngineExecutor(**options)
+    if previous is not None:
+        previous.shutdown(wait=False)
+    return _default
+
+def default_executor() -> EngineExecutor:
+    global _default
+    if _default is None:
+        _default = EngineExecutor()
+    return _default
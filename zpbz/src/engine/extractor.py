@@ -81,8 +81,9 @@ class AuxiliaryChart(BaseModel):
 class CoreExtractor:
     @staticmethod
     def extract(ctx: BaziContext) -> CoreChart:
-        lunar = ctx.solar.getLunar()
-        eight_char = lunar.getEightChar()
+        lunar = ctx.get_lunar()
+        # 另建 EightChar 再设流派，避免改动上下文共享的默认八字
+        eight_char = EightChar.fromLunar(lunar)
         
         # 应用子时流派
         if ctx.request.zi_shi_mode == ZiShiMode.NEXT_DAY:
@@ -95,16 +96,8 @@ class CoreExtractor:
 
         # 补救 2.1.3: 处理月柱分支模式 (仅当选择农历月定月时覆盖)
         if ctx.request.month_mode == MonthMode.LUNAR_MONTH:
-            from lunar_python import LunarYear
-            ly = LunarYear.fromYear(lunar.getYear())
-            lm = None
-            for month_obj in ly.getMonths():
-                if abs(month_obj.getMonth()) == abs(lunar.getMonth()):
-                    if (lunar.getMonth() < 0 and month_obj.getMonth() < 0) or (lunar.getMonth() > 0 and month_obj.getMonth() > 0):
-                        lm = month_obj
-                        break
-            if lm:
-                m = lm.getGanZhi()
+            from src.engine.ganzhi import lunar_month_ganzhi
+            m = lunar_month_ganzhi(lunar.getYear(), lunar.getMonth()) or m
 
         return CoreChart(
             year=Column(
@@ -151,8 +144,8 @@ class CoreExtractor:
 class FortuneExtractor:
     @staticmethod
     def extract(ctx: BaziContext, skip_liu_yue: bool = False) -> FortuneData:
-        lunar = ctx.solar.getLunar()
-        eight_char = lunar.getEightChar()
+        lunar = ctx.get_lunar()
+        eight_char = EightChar.fromLunar(lunar)
         
         if ctx.request.zi_shi_mode == ZiShiMode.NEXT_DAY:
             eight_char.setSect(1)
@@ -161,6 +154,12 @@ class FortuneExtractor:
             
         yun = eight_char.getYun(ctx.request.gender)
         
+        # 流年干支以出生年立春所在年的干支为起点顺排 (同 LiuNian.getGanZhi)。
+        # lunar_python 每次调用都会重新推算立春所在的农历年并冲掉单年缓存，这里整盘只算一次
+        from lunar_python.util import LunarUtil
+        from src.engine.ganzhi import GAN, ZHI, JIA_ZI
+        li_chun_year = JIA_ZI.index(lunar.getJieQiTable()["立春"].getLunar().getYearInGanZhiExact())
+        
         da_yun_list = []
         before_start_xiao_yun = []
         
@@ -175,8 +174,11 @@ class FortuneExtractor:
             
             ln_list = []
             for ln in dy.getLiuNian():
+                ln_gan_zhi = JIA_ZI[(li_chun_year + ln.getIndex() + dy.getStartAge() - 1) % 60]
                 ly_list = []
                 if not skip_liu_yue:
+                    # 流月按五虎遁起寅月
+                    first_gan = (GAN.index(ln_gan_zhi[0]) % 5 * 2 + 2) % 10
                     for ly in ln.getLiuYue():
                         month_val = 0
                         try:
@@ -186,13 +188,13 @@ class FortuneExtractor:
                             
                         ly_list.append(LiuYueData(
                             month=month_val, 
-                            gan_zhi=ly.getGanZhi()
+                            gan_zhi=GAN[(first_gan + ly.getIndex()) % 10] + ZHI[(ly.getIndex() + 2) % 12]
                         ))
                 
                 ln_list.append(LiuNianData(
                     year=ln.getYear(),
-                    gan_zhi=ln.getGanZhi(),
-                    xun=ln.getXun(),
+                    gan_zhi=ln_gan_zhi,
+                    xun=LunarUtil.getXun(ln_gan_zhi),
                     liu_yue=ly_list
                 ))
                 
@@ -216,7 +218,7 @@ class FortuneExtractor:
 class AuxiliaryExtractor:
     @staticmethod
     def extract(ctx: BaziContext) -> AuxiliaryChart:
-        eight_char = ctx.solar.getLunar().getEightChar()
+        eight_char = ctx.get_lunar().getEightChar()
         return AuxiliaryChart(
             year_di_shi=eight_char.getYearDiShi(),
             month_di_shi=eight_char.getMonthDiShi(),
@@ -0,0 +1,151 @@
+"""
+干支历法快速路径：六十甲子循环、节气边界表与四柱的纯算术推导。
+
+规则与 lunar_python 保持逐位一致：
+- 年柱以立春交节时刻(秒级)换年；
+- 月柱以十二节交节时刻(秒级)换月，月干按五虎遁推出；
+- 日柱取当日正午儒略日，流派1 (23点换日) 在 23:00 起算次日；
+- 时柱按 HH:MM 取支，时干按五鼠遁，起算日干恒为 23 点换日后的日干。
+"""
+from bisect import bisect_right
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Tuple
+
+GAN = ("甲", "乙", "丙", "丁", "戊", "己", "庚", "辛", "壬", "癸")
+ZHI = ("子", "丑", "寅", "卯", "辰", "巳", "午", "未", "申", "酉", "戌", "亥")
+JIA_ZI = tuple(GAN[i % 10] + ZHI[i % 12] for i in range(60))
+
+# 干支年内的十二节 (寅月 ~ 丑月 的起点)，末尾追加次年立春作为年终边界
+JIE_NAMES = ("立春", "惊蛰", "清明", "立夏", "芒种", "小暑", "立秋", "白露", "寒露", "立冬", "大雪", "小寒")
+_JIE_KEYS = JIE_NAMES[:11] + ("XIAO_HAN", "LI_CHUN")
+
+# 儒略历/格里历切换日，之前的日期交由 lunar_python 计算儒略日
+_GREGORIAN_START = date(1582, 10, 15)
+_ORDINAL_TO_JD = 1721425
+
+
+def ganzhi_index(gan_zhi: str) -> int:
+    """干支 -> 六十甲子序号 (甲子=0)"""
+    try:
+        return JIA_ZI.index(gan_zhi)
+    except ValueError:
+        raise ValueError(f"非法干支: {gan_zhi}")
+
+
+def combine(gan: int, zhi: int) -> int:
+    """天干序号 + 地支序号 -> 六十甲子序号 (要求阴阳同性)"""
+    return (6 * gan - 5 * zhi) % 60
+
+
+@lru_cache(maxsize=512)
+def jie_table(year: int) -> Tuple[datetime, ...]:
+    """
+    干支年 year 的 13 个交节时刻 (北京时间，秒级)：
+    立春 .. 大雪 (year), 小寒 (year+1), 立春 (year+1)。
+    第 k 项到第 k+1 项即第 k 个月 (寅=0 .. 丑=11) 的区间。
+    """
+    from lunar_python import Lunar, LunarYear, Solar
+    # 直接构造 LunarYear，避免 fromYear 单年缓存在跨年批量计算时反复失效
+    julian_days = dict(zip(Lunar.JIE_QI_IN_USE, LunarYear(year).getJieQiJulianDays()))
+    return tuple(
+        datetime.strptime(Solar.fromJulianDay(julian_days[key]).toYmdHms(), "%Y-%m-%d %H:%M:%S")
+        for key in _JIE_KEYS
+    )
+
+
+def day_number(d: date) -> int:
+    """正午儒略日 (整数)，与 lunar_python 的日柱基准一致"""
+    if d >= _GREGORIAN_START:
+        return d.toordinal() + _ORDINAL_TO_JD
+    from lunar_python import Solar
+    return int(Solar.fromYmdHms(d.year, d.month, d.day, 12, 0, 0).getJulianDay())
+
+
+def day_index(d: date) -> int:
+    """公历日期 -> 日柱六十甲子序号"""
+    return (day_number(d) - 11) % 60
+
+
+def time_zhi_index(hour: int) -> int:
+    """小时 -> 时支序号 (23 点与 0 点均为子)"""
+    return ((hour + 1) // 2) % 12
+
+
+def month_gan_index(year_gan: int, month_offset: int) -> int:
+    """五虎遁：年干 + 月序 (寅=0) -> 月干"""
+    return ((year_gan % 5 + 1) * 2 + month_offset) % 10
+
+
+def time_gan_index(day_gan: int, zhi: int) -> int:
+    """五鼠遁：日干 + 时支 -> 时干"""
+    return (day_gan % 5 * 2 + zhi) % 10
+
+
+def ganzhi_year(t: datetime) -> int:
+    """时刻所属的干支年 (以立春交节为界)"""
+    t = t.replace(microsecond=0)
+    return t.year if t >= jie_table(t.year)[0] else t.year - 1
+
+
+def four_pillars(t: datetime, sect: int = 2) -> Tuple[int, int, int, int]:
+    """
+    按校正后的排盘时刻直接推出四柱 (六十甲子序号)。
+    sect 与 EightChar.setSect 含义相同：1 为 23 点换日，2 为晚子时不换日。
+    """
+    t = t.replace(microsecond=0)
+    year = ganzhi_year(t)
+    year_idx = (year - 4) % 60
+
+    month_offset = bisect_right(jie_table(year), t) - 1
+    month_idx = combine(month_gan_index(year_idx % 10, month_offset), (month_offset + 2) % 12)
+
+    base_day = day_index(t.date())
+    late_zi = t.hour == 23
+    next_day = (base_day + 1) % 60 if late_zi else base_day
+    day_idx = next_day if sect == 1 else base_day
+
+    zhi = time_zhi_index(t.hour)
+    time_idx = combine(time_gan_index(next_day % 10, zhi), zhi)
+    return year_idx, month_idx, day_idx, time_idx
+
+
+@lru_cache(maxsize=256)
+def lunar_months(lunar_year: int) -> Tuple[Tuple[int, int, float, int, str], ...]:
+    """
+    农历年月表: (所属农历年, 月序号(闰月为负), 初一儒略日, 当月天数, 月干支)。
+    与 LunarYear.getMonths() 同序，含前后相邻年份的月份。
+    """
+    from lunar_python import LunarYear
+    return tuple(
+        (m.getYear(), m.getMonth(), m.getFirstJulianDay(), m.getDayCount(), m.getGanZhi())
+        for m in LunarYear(lunar_year).getMonths()
+    )
+
+
+def lunar_month_ganzhi(lunar_year: int, lunar_month: int) -> str:
+    """
+    农历月定月模式下的月柱：在该农历年的月表中取首个同序号 (含闰月符号) 的月份干支。
+    """
+    for _, month, _, _, gan_zhi in lunar_months(lunar_year):
+        if month == lunar_month:
+            return gan_zhi
+    return ""
+
+
+def install_lunar_year_cache(maxsize: int = 512):
+    """
+    以多年 LRU 缓存替换 lunar_python 的单年缓存 (LunarYear.fromYear)。
+    排盘时公历年、农历年与立春所在年交替查询，单年缓存反复失效，每次重算节气朔望约 20ms。
+    LunarYear 构造后只读，结果与原实现一致。可重复调用。
+    替换对整个进程生效 (包括直接使用 lunar_python 的其他代码)，因此不在导入时执行，由 BaziEngine 初始化时显式调用。
+    """
+    from lunar_python import LunarYear
+    if not hasattr(LunarYear.fromYear, "cache_info"):
+        LunarYear.fromYear = staticmethod(lru_cache(maxsize=maxsize)(LunarYear))
+
+
+def to_datetime(solar) -> datetime:
+    """lunar_python Solar -> datetime"""
+    return datetime(solar.getYear(), solar.getMonth(), solar.getDay(),
+                    solar.getHour(), solar.getMinute(), solar.getSecond())
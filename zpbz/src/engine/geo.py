@@ -0,0 +1,260 @@
+"""
+地名经纬度索引：引擎 (经度校正) 与后端 (地点搜索) 共用的唯一数据源。
+
+首次访问时才加载；若存在预编译的紧凑二进制文件 (latlng.bin) 则以内存映射方式读取，
+否则解析 latlng.json。预编译: python -m src.engine.geo build
+
+注意：latlng.json 的 'lat' 字段存的是经度 (如北京 116.40)，'lng' 字段存的是纬度 (39.90)，
+本索引对外统一使用 longitude / latitude 的正确含义。
+"""
+import json
+import math
+import mmap
+import os
+import struct
+import sys
+from array import array
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../data"))
+DEFAULT_JSON_PATH = os.path.join(DATA_DIR, "latlng.json")
+
+# 紧凑格式: 头部 (魔数, 条目数, 名称字节数) + 经度 float64[n] + 纬度 float64[n] + 父节点 int32[n] + 名称 (UTF-8, 换行分隔)
+_MAGIC = b"ZPGEO001"
+_HEADER = struct.Struct("<8sII")
+
+EARTH_RADIUS_KM = 6371.0
+
+def _unit_vector(lat: float, lng: float) -> Tuple[float, float, float]:
+    p, l = math.radians(lat), math.radians(lng)
+    return (math.cos(p) * math.cos(l), math.cos(p) * math.sin(l), math.sin(p))
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lng2 - lng1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+class GeoIndex:
+    """
+    树形地名数据按先序展开为并列数组，第 i 项的父节点为 parents[i] (根为 -1)。
+    无坐标的节点 (如根节点“中国”) 经纬度为 NaN。
+    """
+
+    def __init__(self, json_path: str = DEFAULT_JSON_PATH, compact_path: Optional[str] = None):
+        self.json_path = json_path
+        self.compact_path = compact_path or os.path.splitext(json_path)[0] + ".bin"
+        self._loaded = False
+        self._mmap = None
+        self.names: List[str] = []
+        self.parents = array("i")
+        self.longitudes = array("d")
+        self.latitudes = array("d")
+        self._by_name: Dict[str, int] = {}
+        self._display_names: Optional[List[str]] = None
+        self._depths: Optional[List[int]] = None
+        self._tree: Optional[tuple] = None
+
+    # --- 加载 ---
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        if os.path.exists(self.compact_path) and self._compact_is_fresh():
+            self._load_compact()
+        elif os.path.exists(self.json_path):
+            self._load_json()
+        # 同名地点以先序中最后出现者为准 (与旧版扁平化字典一致)
+        self._by_name = {
+            name: i for i, name in enumerate(self.names)
+            if name and not math.isnan(self.longitudes[i])
+        }
+        self._loaded = True
+
+    def _compact_is_fresh(self) -> bool:
+        if not os.path.exists(self.json_path):
+            return True
+        return os.path.getmtime(self.compact_path) >= os.path.getmtime(self.json_path)
+
+    def _load_json(self):
+        with open(self.json_path, "r", encoding="utf-8") as f:
+            try:
+                data = json.load(f)
+            except json.JSONDecodeError:
+                return
+        stack = [(data, -1)] if isinstance(data, dict) else [(item, -1) for item in reversed(data)]
+        while stack:
+            node, parent = stack.pop()
+            if not isinstance(node, dict):
+                continue
+            index = len(self.names)
+            self.names.append(node.get("name") or "")
+            self.parents.append(parent)
+            self.longitudes.append(self._to_float(node.get("lat")))
+            self.latitudes.append(self._to_float(node.get("lng")))
+            for child in reversed(node.get("children", [])):
+                stack.append((child, index))
+
+    @staticmethod
+    def _to_float(value) -> float:
+        try:
+            return float(value) if value else math.nan
+        except (TypeError, ValueError):
+            return math.nan
+
+    def _load_compact(self):
+        with open(self.compact_path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count, names_size = _HEADER.unpack_from(self._mmap, 0)
+        if magic != _MAGIC:
+            raise ValueError(f"无法识别的地名索引文件: {self.compact_path}")
+        view = memoryview(self._mmap)
+        offset = _HEADER.size
+        # 数值数组直接映射，不复制
+        self.longitudes = view[offset:offset + 8 * count].cast("d")
+        offset += 8 * count
+        self.latitudes = view[offset:offset + 8 * count].cast("d")
+        offset += 8 * count
+        self.parents = view[offset:offset + 4 * count].cast("i")
+        offset += 4 * count
+        self.names = bytes(view[offset:offset + names_size]).decode("utf-8").split("\n") if count else []
+
+    def build_compact(self, path: Optional[str] = None) -> str:
+        """由 JSON 生成紧凑二进制文件，返回写出路径"""
+        path = path or self.compact_path
+        source = GeoIndex(self.json_path)
+        source._load_json()
+        names = "\n".join(source.names).encode("utf-8")
+        with open(path, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, len(source.names), len(names)))
+            f.write(array("d", source.longitudes).tobytes())
+            f.write(array("d", source.latitudes).tobytes())
+            f.write(array("i", source.parents).tobytes())
+            f.write(names)
+        return path
+
+    # --- 查询 ---
+    def __len__(self) -> int:
+        self._ensure_loaded()
+        return len(self.names)
+
+    def get_longitude(self, name: str, default: float = 120.0) -> float:
+        """地名 -> 经度，找不到时返回东八区基准 120.0"""
+        self._ensure_loaded()
+        index = self._by_name.get(name)
+        return default if index is None else self.longitudes[index]
+
+    def longitude_map(self) -> Dict[str, float]:
+        self._ensure_loaded()
+        return {name: self.longitudes[i] for name, i in self._by_name.items()}
+
+    def display_names(self) -> List[str]:
+        """带上级路径的完整地名 (如 "中国 北京 北京市 朝阳区")"""
+        self._ensure_loaded()
+        if self._display_names is None:
+            display = []
+            for name, parent in zip(self.names, self.parents):
+                display.append(f"{display[parent]} {name}".strip() if parent >= 0 else name)
+            self._display_names = display
+        return self._display_names
+
+    def depths(self) -> List[int]:
+        """行政层级：省 1、市 2、区县 3 (根为 0)"""
+        self._ensure_loaded()
+        if self._depths is None:
+            depths = []
+            for parent in self.parents:
+                depths.append(depths[parent] + 1 if parent >= 0 else 0)
+            self._depths = depths
+        return self._depths
+
+    def iter_located(self) -> Iterator[int]:
+        """有坐标的条目下标 (先序)"""
+        self._ensure_loaded()
+        for i in range(len(self.names)):
+            if not math.isnan(self.longitudes[i]):
+                yield i
+
+    def record(self, index: int) -> Dict:
+        return {
+            "display_name": self.display_names()[index],
+            "name": self.names[index],
+            "lat": self.latitudes[index],
+            "lng": self.longitudes[index],
+        }
+
+    # --- 反查：坐标 -> 最近地名 ---
+    def _ensure_tree(self):
+        """以单位球面上的三维坐标建 KD 树：弦长与球面距离单调一致，最近邻精确"""
+        if self._tree is not None:
+            return
+        points = [(_unit_vector(self.latitudes[i], self.longitudes[i]), i) for i in self.iter_located()]
+
+        def build(items, depth):
+            if not items:
+                return None
+            axis = depth % 3
+            items.sort(key=lambda item: item[0][axis])
+            mid = len(items) // 2
+            return (items[mid][0], items[mid][1], axis, build(items[:mid], depth + 1), build(items[mid + 1:], depth + 1))
+
+        self._tree = build(points, 0) or ()
+
+    def nearest(self, lat: float, lng: float, max_km: Optional[float] = None) -> Optional[int]:
+        """最近的地名条目下标；等距时取层级更细者，超出 max_km 或无数据时返回 None"""
+        self._ensure_tree()
+        if not self._tree:
+            return None
+        depths = self.depths()
+        target = _unit_vector(lat, lng)
+        # best: [弦长平方, -层级, 下标]
+        best = [math.inf, 0, -1]
+        if max_km is not None:
+            best[0] = (2 * math.sin(max_km / EARTH_RADIUS_KM / 2)) ** 2 + 1e-15
+
+        # 栈元素: (该子树可能的最小弦长平方, 子树)
+        stack = [(0.0, self._tree)]
+        while stack:
+            bound, node = stack.pop()
+            if node is None or bound > best[0]:
+                continue
+            point, index, axis, left, right = node
+            d2 = (point[0] - target[0]) ** 2 + (point[1] - target[1]) ** 2 + (point[2] - target[2]) ** 2
+            key = [d2, -depths[index], index]
+            if key < best:
+                best = key
+            diff = target[axis] - point[axis]
+            near, far = (left, right) if diff < 0 else (right, left)
+            # 远侧先入栈，近侧先搜索
+            stack.append((max(bound, diff * diff), far))
+            stack.append((bound, near))
+        return best[2] if best[2] >= 0 else None
+
+    def nearest_many(self, points: Sequence[Tuple[float, float]], max_km: Optional[float] = None) -> List[Optional[int]]:
+        """批量反查 (如导入档案时统一地名)，重复坐标只算一次"""
+        cache: Dict[Tuple[float, float], Optional[int]] = {}
+        result = []
+        for lat, lng in points:
+            key = (lat, lng)
+            if key not in cache:
+                cache[key] = self.nearest(lat, lng, max_km)
+            result.append(cache[key])
+        return result
+
+@lru_cache(maxsize=None)
+def geo_index(json_path: str = DEFAULT_JSON_PATH) -> GeoIndex:
+    """进程内共享的地名索引 (惰性加载)"""
+    return GeoIndex(json_path)
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] != ["build"]:
+        print("用法: python -m src.engine.geo build [JSON 路径] [输出路径]", file=sys.stderr)
+        return 1
+    json_path = argv[1] if len(argv) > 1 else DEFAULT_JSON_PATH
+    out = GeoIndex(json_path).build_compact(argv[2] if len(argv) > 2 else None)
+    print(f"已生成 {out}", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -36,6 +36,7 @@ class BaziRequest(BaseModel):
     birth_location: str = "北京"
     longitude: Optional[float] = None # 显式经度
     latitude: Optional[float] = None  # 显式纬度
+    timezone: Optional[str] = None    # IANA 时区名 (如 America/New_York)，为空时按北京时间及 1986-1991 夏令时处理
     
     # 算法开关
     time_mode: TimeMode = TimeMode.TRUE_SOLAR
@@ -49,3 +50,10 @@ class BaziRequest(BaseModel):
             return v
         except ValueError:
             raise ValueError("日期格式必须为 YYYY-MM-DD HH:mm:ss")
+
+    @validator("timezone")
+    def validate_timezone(cls, v):
+        if v is not None:
+            from src.engine.timezones import zone_index
+            zone_index(v)
+        return v
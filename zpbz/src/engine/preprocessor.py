@@ -1,7 +1,9 @@
 import math
+from bisect import bisect_right
 from lunar_python import Solar, Lunar
-from datetime import datetime
-from pydantic import BaseModel
+from datetime import date, datetime
+from typing import List, Optional, Sequence, Tuple
+from pydantic import BaseModel, PrivateAttr
 from src.engine.models import CalendarType, BaziRequest, TimeMode
 
 class CalendarConverter:
@@ -15,6 +17,32 @@ class CalendarConverter:
             lunar = Lunar.fromYmdHms(dt.year, dt.month, dt.day, dt.hour, dt.minute, dt.second)
             return lunar.getSolar()
 
+# --- 钟表秒数：以 1970-01-01 00:00:00 起算的朴素时间秒数，不经过本机时区 ---
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+def wall_seconds(year: int, month: int, day: int, hour: int = 0, minute: int = 0, second: int = 0) -> int:
+    return (date(year, month, day).toordinal() - _EPOCH_ORDINAL) * 86400 + hour * 3600 + minute * 60 + second
+
+def solar_seconds(solar: Solar) -> int:
+    return wall_seconds(solar.getYear(), solar.getMonth(), solar.getDay(),
+                        solar.getHour(), solar.getMinute(), solar.getSecond())
+
+def solar_from_seconds(seconds: int) -> Solar:
+    days, rest = divmod(seconds, 86400)
+    d = date.fromordinal(days + _EPOCH_ORDINAL)
+    return Solar.fromYmdHms(d.year, d.month, d.day, rest // 3600, rest // 60 % 60, rest % 60)
+
+def _parse_seconds(dt_str: str) -> int:
+    dt = datetime.strptime(dt_str, "%Y-%m-%d %H:%M:%S")
+    return wall_seconds(dt.year, dt.month, dt.day, dt.hour, dt.minute, dt.second)
+
+def _floor_seconds(total: float) -> int:
+    """浮点秒 -> 整秒：先按微秒四舍六入 (与 datetime.fromtimestamp 一致)，再截去不足一秒的部分"""
+    whole = math.floor(total)
+    if round((total - whole) * 1e6) >= 1000000:
+        whole += 1
+    return whole
+
 class DSTCorrector:
     # 中国夏令时区间 (1986-1991)
     DST_RANGES = [
@@ -25,68 +53,124 @@ class DSTCorrector:
         ("1990-04-15 00:00:00", "1990-09-16 23:59:59"),
         ("1991-04-14 00:00:00", "1991-09-15 23:59:59"),
     ]
+    # 切换时刻 (钟表秒数，升序)：偶数位进入夏令时，奇数位为退出后的第一秒
+    TRANSITIONS = tuple(
+        seconds
+        for start_str, end_str in DST_RANGES
+        for seconds in (_parse_seconds(start_str), _parse_seconds(end_str) + 1)
+    )
+
+    @classmethod
+    def in_dst(cls, seconds: int) -> bool:
+        return bisect_right(cls.TRANSITIONS, seconds) % 2 == 1
+
+    @classmethod
+    def correct_seconds(cls, seconds: int) -> int:
+        return seconds - 3600 if cls.in_dst(seconds) else seconds
 
     @classmethod
     def check_and_correct(cls, solar: Solar) -> Solar:
-        dt_str = f"{solar.getYear()}-{solar.getMonth():02d}-{solar.getDay():02d} " \
-                 f"{solar.getHour():02d}:{solar.getMinute():02d}:{solar.getSecond():02d}"
-        dt = datetime.strptime(dt_str, "%Y-%m-%d %H:%M:%S")
-        
-        for start_str, end_str in cls.DST_RANGES:
-            start = datetime.strptime(start_str, "%Y-%m-%d %H:%M:%S")
-            end = datetime.strptime(end_str, "%Y-%m-%d %H:%M:%S")
-            if start <= dt <= end:
-                corrected_dt = datetime.fromtimestamp(dt.timestamp() - 3600)
-                return Solar.fromYmdHms(
-                    corrected_dt.year, corrected_dt.month, corrected_dt.day,
-                    corrected_dt.hour, corrected_dt.minute, corrected_dt.second
-                )
-        return solar
+        seconds = solar_seconds(solar)
+        if not cls.in_dst(seconds):
+            return solar
+        return solar_from_seconds(seconds - 3600)
+
+def _eot_formula(n: int) -> float:
+    b_rad = math.radians(360 * (n - 81) / 365)
+    # EoT = 9.87*sin(2B) - 7.67*sin(B+78.7)
+    return 9.87 * math.sin(2 * b_rad) - 7.67 * math.sin(b_rad + math.radians(78.7))
 
 class SolarTimeCalculator:
+    # 均时差表 (分钟)，下标为一年中的第几天 (1..366)
+    EOT_TABLE = tuple(_eot_formula(n) for n in range(367))
+
     @staticmethod
     def get_eot(solar: Solar) -> float:
         """计算均时差 (分钟)"""
         # N 为一年中的第几天
-        dt_str = f"{solar.getYear()}-{solar.getMonth():02d}-{solar.getDay():02d}"
-        dt = datetime.strptime(dt_str, "%Y-%m-%d")
-        n = dt.timetuple().tm_yday
-        
-        b_deg = 360 * (n - 81) / 365
-        b_rad = math.radians(b_deg)
-        
-        # EoT = 9.87*sin(2B) - 7.67*sin(B+78.7)
-        eot = 9.87 * math.sin(2 * b_rad) - 7.67 * math.sin(b_rad + math.radians(78.7))
-        return eot
+        y, m, d = solar.getYear(), solar.getMonth(), solar.getDay()
+        n = date(y, m, d).toordinal() - date(y, 1, 1).toordinal() + 1
+        return SolarTimeCalculator.EOT_TABLE[n]
 
     @staticmethod
-    def get_true_solar_time(solar: Solar, longitude: float) -> Solar:
+    def true_solar_seconds(seconds: int, longitude: float, meridian: float = 120.0) -> int:
+        """标准时秒数 -> 真太阳时秒数，meridian 为标准时的中央经线"""
+        days = seconds // 86400
+        d = date.fromordinal(days + _EPOCH_ORDINAL)
+        eot = SolarTimeCalculator.EOT_TABLE[days + _EPOCH_ORDINAL - date(d.year, 1, 1).toordinal() + 1]
+        # 经度修正: (经度 - 中央经线) * 4 分钟
+        lon_offset = (longitude - meridian) * 4
+        return _floor_seconds(seconds + (lon_offset + eot) * 60)
+
+    @staticmethod
+    def get_true_solar_time(solar: Solar, longitude: float, meridian: float = 120.0) -> Solar:
         """将平太阳时转换为真太阳时"""
-        eot = SolarTimeCalculator.get_eot(solar)
-        # 经度修正: (经度 - 120) * 4 分钟
-        lon_offset = (longitude - 120.0) * 4
-        
-        total_offset_minutes = lon_offset + eot
-        
-        # 转换时间
-        dt_str = f"{solar.getYear()}-{solar.getMonth():02d}-{solar.getDay():02d} " \
-                 f"{solar.getHour():02d}:{solar.getMinute():02d}:{solar.getSecond():02d}"
-        dt = datetime.strptime(dt_str, "%Y-%m-%d %H:%M:%S")
-        
-        corrected_dt = datetime.fromtimestamp(dt.timestamp() + total_offset_minutes * 60)
-        return Solar.fromYmdHms(
-            corrected_dt.year, corrected_dt.month, corrected_dt.day,
-            corrected_dt.hour, corrected_dt.minute, corrected_dt.second
-        )
+        return solar_from_seconds(SolarTimeCalculator.true_solar_seconds(solar_seconds(solar), longitude, meridian))
+
+def to_standard(seconds: int, timezone: Optional[str] = None) -> Tuple[int, float]:
+    """
+    钟表秒数 -> (扣除夏令时后的标准时秒数, 标准时中央经线)。
+    未指定时区时沿用北京时间 (东经 120°) 与 DST_RANGES。
+    """
+    if timezone is None:
+        return DSTCorrector.correct_seconds(seconds), 120.0
+    from src.engine.timezones import zone_index, SECONDS_PER_DEGREE
+    offset, dst = zone_index(timezone).lookup(seconds)
+    return seconds - dst, (offset - dst) / SECONDS_PER_DEGREE
+
+def correct_many(seconds: Sequence[int], longitudes: Sequence[float], true_solar: Sequence[bool],
+                 timezones: Optional[Sequence[Optional[str]]] = None) -> List[int]:
+    """
+    批量预处理的向量化版本：夏令时 + 真太阳时校正，输入输出均为钟表秒数，结果与逐个校正一致。
+    安装 numpy 时整列计算，否则逐个计算；指定了时区的元素逐个查切换表。
+    """
+    try:
+        import numpy as np
+    except ImportError:
+        result = []
+        for i, (sec, lon, ts) in enumerate(zip(seconds, longitudes, true_solar)):
+            sec, meridian = to_standard(sec, timezones[i] if timezones else None)
+            result.append(SolarTimeCalculator.true_solar_seconds(sec, lon, meridian) if ts else sec)
+        return result
+
+    if timezones and any(timezones):
+        pairs = [to_standard(sec, tz) for sec, tz in zip(seconds, timezones)]
+        sec = np.asarray([p[0] for p in pairs], dtype=np.int64)
+        meridian = np.asarray([p[1] for p in pairs], dtype=np.float64)
+    else:
+        sec = np.asarray(seconds, dtype=np.int64)
+        in_dst = np.searchsorted(np.asarray(DSTCorrector.TRANSITIONS, dtype=np.int64), sec, side="right") % 2 == 1
+        sec = np.where(in_dst, sec - 3600, sec)
+        meridian = 120.0
+
+    days = sec // 86400
+    day64 = days.astype("datetime64[D]")
+    yday = (day64 - day64.astype("datetime64[Y]").astype("datetime64[D]")).astype(np.int64) + 1
+    eot = np.asarray(SolarTimeCalculator.EOT_TABLE)[yday]
+    lon_offset = (np.asarray(longitudes, dtype=np.float64) - meridian) * 4
+    total = sec + (lon_offset + eot) * 60
+    whole = np.floor(total)
+    whole += np.rint((total - whole) * 1e6) >= 1000000
+    return np.where(np.asarray(true_solar, dtype=bool), whole.astype(np.int64), sec).tolist()
 
 class BaziContext(BaseModel):
     solar: Solar
     longitude: float
     request: BaziRequest
+    _lunar: Lunar = PrivateAttr(default=None)
 
     class Config:
         arbitrary_types_allowed = True
 
+    def get_lunar(self) -> Lunar:
+        """
+        农历对象 (含整年节气表) 构造代价高，同一上下文内只计算一次。
+        共享的 getEightChar() 保持默认流派，需要切换流派时请另建 EightChar。
+        """
+        if self._lunar is None:
+            self._lunar = self.solar.getLunar()
+        return self._lunar
+
 class Preprocessor:
     def __init__(self, config_obj=None):
         from src.engine.config import config as default_config
@@ -96,8 +180,13 @@ class Preprocessor:
         # 1. 历法标准化 -> 获取公历 Solar
         solar = CalendarConverter.to_solar(request.birth_datetime, request.calendar_type)
         
-        # 2. 夏令时校正
-        solar = DSTCorrector.check_and_correct(solar)
+        # 2. 夏令时校正 (指定时区时按该时区历史切换表，并取其标准时中央经线)
+        meridian = 120.0
+        if request.timezone is None:
+            solar = DSTCorrector.check_and_correct(solar)
+        else:
+            seconds, meridian = to_standard(solar_seconds(solar), request.timezone)
+            solar = solar_from_seconds(seconds)
         
         # 3. 经度获取
         if request.longitude is not None:
@@ -107,10 +196,27 @@ class Preprocessor:
         
         # 4. 真太阳时校正 (如果模式开启)
         if request.time_mode == TimeMode.TRUE_SOLAR:
-            solar = SolarTimeCalculator.get_true_solar_time(solar, longitude)
+            solar = SolarTimeCalculator.get_true_solar_time(solar, longitude, meridian)
             
         return BaziContext(
             solar=solar,
             longitude=longitude,
             request=request
-        )
\ No newline at end of file
+        )
+
+    def process_many(self, requests: Sequence[BaziRequest]) -> List[BaziContext]:
+        """批量预处理：历法转换逐个进行，夏令时与真太阳时校正整批向量化，结果与逐个 process 一致"""
+        seconds, longitudes, true_solar = [], [], []
+        for request in requests:
+            seconds.append(solar_seconds(CalendarConverter.to_solar(request.birth_datetime, request.calendar_type)))
+            if request.longitude is not None:
+                longitudes.append(request.longitude)
+            else:
+                longitudes.append(self.config.get_longitude(request.birth_location))
+            true_solar.append(request.time_mode == TimeMode.TRUE_SOLAR)
+
+        corrected = correct_many(seconds, longitudes, true_solar, [r.timezone for r in requests])
+        return [
+            BaziContext(solar=solar_from_seconds(sec), longitude=lon, request=request)
+            for sec, lon, request in zip(corrected, longitudes, requests)
+        ]
@@ -0,0 +1,225 @@
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import List, Optional, Tuple
+from pydantic import BaseModel
+from lunar_python import Solar
+from src.engine.models import TimeMode, MonthMode, ZiShiMode
+from src.engine.preprocessor import DSTCorrector, SolarTimeCalculator
+from src.engine.ganzhi import (
+    JIA_ZI, ganzhi_index, jie_table, day_index, month_gan_index, time_gan_index,
+    lunar_months, lunar_month_ganzhi, to_datetime
+)
+
+ONE_SECOND = timedelta(seconds=1)
+ONE_HOUR = timedelta(hours=1)
+ONE_DAY = timedelta(days=1)
+DT_FORMAT = "%Y-%m-%d %H:%M:%S"
+_EPOCH = datetime(1970, 1, 1)
+
+Span = Tuple[datetime, datetime]
+
+class MatchWindow(BaseModel):
+    start: str        # 输入口径 (钟表时间) 起点，含
+    end: str          # 输入口径终点，不含
+    solar_start: str  # 校正后排盘时刻起点，含
+    solar_end: str    # 校正后排盘时刻终点，不含
+    time_mode: TimeMode
+    month_mode: MonthMode
+    zi_shi_mode: ZiShiMode
+
+@lru_cache(maxsize=1)
+def _dst_spans() -> Tuple[Span, ...]:
+    # 夏令时切换表 (钟表秒数) 两两成对即半开区间
+    edges = [_EPOCH + timedelta(seconds=s) for s in DSTCorrector.TRANSITIONS]
+    return tuple(zip(edges[0::2], edges[1::2]))
+
+def _merge(spans: List[Span]) -> List[Span]:
+    merged: List[Span] = []
+    for start, end in sorted(spans):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(end, merged[-1][1]))
+        else:
+            merged.append((start, end))
+    return merged
+
+class ReverseLookup:
+    """
+    四柱反查：给定四柱干支与年份区间，求出所有排出该四柱的出生时间窗口。
+
+    不做逐时扫描，而是沿六十甲子循环逐级收窄候选：
+    年柱 -> 每 60 年一个候选干支年；月柱 -> 节气表 (或农历月表) 中的唯一区间；
+    日柱 -> 区间内每 60 天一个候选日；时柱 -> 固定的两小时窗口。
+    最后按时间模式将校正后的窗口换算回钟表时间。
+    """
+
+    def __init__(self, config_obj=None):
+        from src.engine.config import config as default_config
+        self.config = config_obj or default_config
+
+    def search(
+        self,
+        pillars: List[str],
+        start_year: int,
+        end_year: int,
+        time_mode: Optional[TimeMode] = None,
+        month_mode: Optional[MonthMode] = None,
+        zi_shi_mode: Optional[ZiShiMode] = None,
+        birth_location: str = "北京",
+        longitude: Optional[float] = None,
+    ) -> List[MatchWindow]:
+        """
+        pillars: [年柱, 月柱, 日柱, 时柱]；start_year/end_year 为干支年 (立春起算) 闭区间。
+        模式参数为 None 时遍历该模式的全部取值，结果按 时间模式 > 月柱模式 > 子时模式 的枚举顺序排列。
+        """
+        if len(pillars) != 4:
+            raise ValueError("四柱必须包含年、月、日、时四个干支")
+        indexes = tuple(ganzhi_index(p) for p in pillars)
+        if longitude is None:
+            longitude = self.config.get_longitude(birth_location)
+
+        time_modes = [time_mode] if time_mode else list(TimeMode)
+        month_modes = [month_mode] if month_mode else list(MonthMode)
+        zi_shi_modes = [zi_shi_mode] if zi_shi_mode else list(ZiShiMode)
+
+        solar_windows = {
+            (m_mode, z_mode): self._solar_windows(indexes, start_year, end_year, m_mode, z_mode)
+            for m_mode in month_modes for z_mode in zi_shi_modes
+        }
+
+        results = []
+        for t_mode in time_modes:
+            for m_mode in month_modes:
+                for z_mode in zi_shi_modes:
+                    for solar_start, solar_end in solar_windows[(m_mode, z_mode)]:
+                        for start, end in self._to_civil(solar_start, solar_end, t_mode, longitude):
+                            results.append(MatchWindow(
+                                start=start.strftime(DT_FORMAT),
+                                end=end.strftime(DT_FORMAT),
+                                solar_start=solar_start.strftime(DT_FORMAT),
+                                solar_end=solar_end.strftime(DT_FORMAT),
+                                time_mode=t_mode,
+                                month_mode=m_mode,
+                                zi_shi_mode=z_mode
+                            ))
+        return results
+
+    # --- 校正时刻域：沿干支循环收窄 ---
+    def _solar_windows(self, indexes, start_year: int, end_year: int,
+                       month_mode: MonthMode, zi_shi_mode: ZiShiMode) -> List[Span]:
+        year_idx, month_idx, day_idx, time_idx = indexes
+        first_year = start_year + (year_idx - (start_year - 4)) % 60
+
+        windows: List[Span] = []
+        for year in range(first_year, end_year + 1, 60):
+            table = jie_table(year)
+            if month_mode == MonthMode.SOLAR_TERM:
+                offset = (month_idx % 12 - 2) % 12
+                # 五虎遁：月干必须由年干推出
+                if month_gan_index(year_idx % 10, offset) != month_idx % 10:
+                    return []
+                month_spans = [(table[offset], table[offset + 1])]
+            else:
+                month_spans = self._lunar_month_spans(year, month_idx, table[0], table[12])
+
+            for span in month_spans:
+                windows.extend(self._day_windows(span, day_idx, time_idx, zi_shi_mode))
+        return _merge(windows)
+
+    @staticmethod
+    def _lunar_month_spans(year: int, month_idx: int, year_start: datetime, year_end: datetime) -> List[Span]:
+        target = JIA_ZI[month_idx]
+        spans = []
+        for lunar_year, month, first_jd, day_count, _ in lunar_months(year):
+            # 与 CoreExtractor 保持一致：按所属农历年的月表取干支
+            if lunar_month_ganzhi(lunar_year, month) != target:
+                continue
+            first_day = Solar.fromJulianDay(first_jd)
+            start = datetime(first_day.getYear(), first_day.getMonth(), first_day.getDay())
+            end = start + timedelta(days=day_count)
+            start, end = max(start, year_start), min(end, year_end)
+            if start < end:
+                spans.append((start, end))
+        return spans
+
+    @staticmethod
+    def _day_windows(span: Span, day_idx: int, time_idx: int, zi_shi_mode: ZiShiMode) -> List[Span]:
+        span_start, span_end = span
+        zhi, gan = time_idx % 12, time_idx % 10
+
+        # 晚子时可能落在候选日前一天，两端各放宽一天
+        first = span_start.date() - ONE_DAY
+        day = first + timedelta(days=(day_idx - day_index(first)) % 60)
+        last = span_end.date() + ONE_DAY
+
+        windows = []
+        while day <= last:
+            midnight = datetime(day.year, day.month, day.day)
+            hours = []
+            if zhi != 0:
+                if time_gan_index(day_idx % 10, zhi) == gan:
+                    hours.append((midnight + timedelta(hours=2 * zhi - 1), midnight + timedelta(hours=2 * zhi + 1)))
+            else:
+                if time_gan_index(day_idx % 10, 0) == gan:
+                    hours.append((midnight, midnight + ONE_HOUR))
+                if zi_shi_mode == ZiShiMode.NEXT_DAY:
+                    # 23 点换日：前一日 23 点起即为本日子时
+                    if time_gan_index(day_idx % 10, 0) == gan:
+                        hours.append((midnight - ONE_HOUR, midnight))
+                elif time_gan_index((day_idx + 1) % 10, 0) == gan:
+                    # 晚子时不换日：日柱仍为本日，时干按次日起
+                    hours.append((midnight + timedelta(hours=23), midnight + ONE_DAY))
+
+            for start, end in hours:
+                start, end = max(start, span_start), min(end, span_end)
+                if start < end:
+                    windows.append((start, end))
+            day += timedelta(days=60)
+        return windows
+
+    # --- 钟表时间域：逆推夏令时与真太阳时 ---
+    def _to_civil(self, start: datetime, end: datetime, time_mode: TimeMode, longitude: float) -> List[Span]:
+        pieces: List[Span] = []
+        for in_dst in (False, True):
+            civil_start = self._invert(start, in_dst, time_mode, longitude)
+            civil_end = self._invert(end, in_dst, time_mode, longitude)
+            if civil_start < civil_end:
+                pieces.extend(self._restrict_dst(civil_start, civil_end, in_dst))
+        return _merge(pieces)
+
+    @staticmethod
+    def _forward(civil: datetime, in_dst: bool, time_mode: TimeMode, longitude: float) -> datetime:
+        local = civil - ONE_HOUR if in_dst else civil
+        if time_mode != TimeMode.TRUE_SOLAR:
+            return local
+        solar = Solar.fromYmdHms(local.year, local.month, local.day, local.hour, local.minute, local.second)
+        return to_datetime(SolarTimeCalculator.get_true_solar_time(solar, longitude))
+
+    @classmethod
+    def _invert(cls, target: datetime, in_dst: bool, time_mode: TimeMode, longitude: float) -> datetime:
+        """求最早的钟表时刻 c，使得 校正(c) >= target (秒级)"""
+        civil = target + ONE_HOUR if in_dst else target
+        if time_mode != TimeMode.TRUE_SOLAR:
+            return civil
+        # 均时差按日缓变，不动点迭代两次即可收敛到秒级
+        for _ in range(2):
+            civil += target - cls._forward(civil, in_dst, time_mode, longitude)
+        while cls._forward(civil, in_dst, time_mode, longitude) < target:
+            civil += ONE_SECOND
+        while cls._forward(civil - ONE_SECOND, in_dst, time_mode, longitude) >= target:
+            civil -= ONE_SECOND
+        return civil
+
+    @staticmethod
+    def _restrict_dst(start: datetime, end: datetime, in_dst: bool) -> List[Span]:
+        """将钟表区间限制在夏令时内 (in_dst) 或夏令时外"""
+        overlaps = [(max(start, s), min(end, e)) for s, e in _dst_spans() if s < end and start < e]
+        if in_dst:
+            return overlaps
+        pieces, cursor = [], start
+        for s, e in overlaps:
+            if cursor < s:
+                pieces.append((cursor, s))
+            cursor = max(cursor, e)
+        if cursor < end:
+            pieces.append((cursor, end))
+        return pieces
@@ -0,0 +1,208 @@
+"""
+命盘相似检索：将命盘编码为定长特征向量，在档案库与名人命例库中查找最相似的 k 个命盘。
+
+特征分块 (各块单独归一化后乘以权重，整体余弦相似度即各块相似度的加权和)：
+- 四柱：年月日时 天干/地支 one-hot (日柱、月令加权)
+- 五行：五行能量占比
+- 格局：格局名 one-hot (词表外归入“其他”)
+- 强弱：强弱等级 one-hot + 支持率
+- 神煞：神煞名 multi-hot
+"""
+import json
+import math
+import os
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+from pydantic import BaseModel
+from src.engine.algorithms.stars import STAR_RULES
+from src.engine.ganzhi import GAN, ZHI
+
+ELEMENT_ORDER = ("木", "火", "土", "金", "水")
+GEJU_VOCAB = (
+    "正官格", "七杀格", "正财格", "偏财格", "正印格", "偏印格", "食神格", "伤官格",
+    "建禄格", "月刃格", "伤官佩印", "杀印相生",
+    "炎上格", "润下格", "从革格", "曲直格", "稼格", "专旺格",
+    "从财格", "从杀格", "从官格", "从食格", "从伤格",
+)
+STRENGTH_LEVELS = ("极弱", "偏弱", "中和", "偏强", "极强")
+# 神煞词表取自 StarDetector 的全部规则，新增规则自动计入特征
+STAR_VOCAB = tuple(dict.fromkeys(rule.name for rule in STAR_RULES))
+
+# 四柱内各柱权重 (年, 月, 日, 时)
+PILLAR_WEIGHTS = (0.8, 1.2, 1.5, 1.0)
+# 分块权重
+BLOCK_WEIGHTS = {"pillars": 1.0, "elements": 1.0, "geju": 0.7, "strength": 0.7, "stars": 0.3}
+
+DEFAULT_CASES_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../data/regression_test_full.json"))
+
+class ChartFeatures(BaseModel):
+    pillars: List[str]            # 四柱干支
+    scores: Dict[str, float]      # 五行能量评分
+    geju: str = ""
+    strength_level: str = ""
+    strength_score: float = 0.0
+    stars: List[str] = []         # 神煞名 (可重复)
+
+    @classmethod
+    def from_result(cls, result) -> "ChartFeatures":
+        """BaziResult 或其 dict 形式 (如后端缓存的 JSON)"""
+        data = result if isinstance(result, dict) else result.model_dump()
+        core = data["core"]
+        return cls(
+            pillars=[core[p]["gan"] + core[p]["zhi"] for p in ("year", "month", "day", "time")],
+            scores=(data.get("five_elements") or {}).get("scores", {}),
+            geju=(data.get("geju") or {}).get("name", ""),
+            strength_level=(data.get("analysis") or {}).get("strength_level", ""),
+            strength_score=(data.get("analysis") or {}).get("strength_score", 0.0),
+            stars=[s["name"] for s in data.get("stars") or []],
+        )
+
+    @classmethod
+    def from_context(cls, ctx) -> "ChartFeatures":
+        """只运行相似检索用到的阶段 (不含大运)，用于批量建库"""
+        from src.engine.batch import compute_row
+        fields = ("pillars", "five_elements", "geju", "strength", "stars")
+        row = compute_row(ctx, fields)
+        # 列序: 四柱(4) 五行(5) 格局(2) 强弱(2) 神煞(1)
+        return cls(
+            pillars=row[0:4],
+            scores=dict(zip(ELEMENT_ORDER, row[4:9])),
+            geju=row[9],
+            strength_level=row[11],
+            strength_score=row[12],
+            stars=[s.split("@")[0] for s in row[13].split("|") if s],
+        )
+
+def _one_hot(size: int, index: int, weight: float = 1.0) -> List[float]:
+    vec = [0.0] * size
+    if 0 <= index < size:
+        vec[index] = weight
+    return vec
+
+def _normalized(block: List[float], weight: float) -> List[float]:
+    norm = math.sqrt(sum(v * v for v in block))
+    return [v / norm * weight for v in block] if norm > 0 else block
+
+def encode(features: ChartFeatures) -> List[float]:
+    """命盘 -> 定长特征向量 (长度 FEATURE_DIM)"""
+    pillars: List[float] = []
+    for gan_zhi, weight in zip(features.pillars, PILLAR_WEIGHTS):
+        pillars += _one_hot(10, GAN.index(gan_zhi[0]) if gan_zhi[:1] in GAN else -1, weight)
+        pillars += _one_hot(12, ZHI.index(gan_zhi[1]) if gan_zhi[1:2] in ZHI else -1, weight)
+
+    total = sum(features.scores.get(e, 0.0) for e in ELEMENT_ORDER)
+    elements = [features.scores.get(e, 0.0) / total if total > 0 else 0.0 for e in ELEMENT_ORDER]
+
+    geju_index = GEJU_VOCAB.index(features.geju) if features.geju in GEJU_VOCAB else len(GEJU_VOCAB)
+    geju = _one_hot(len(GEJU_VOCAB) + 1, geju_index)
+
+    level = STRENGTH_LEVELS.index(features.strength_level) if features.strength_level in STRENGTH_LEVELS else -1
+    strength = _one_hot(len(STRENGTH_LEVELS), level) + [features.strength_score / 100]
+
+    stars = [float(min(features.stars.count(name), 2)) for name in STAR_VOCAB]
+
+    blocks = {"pillars": pillars, "elements": elements, "geju": geju, "strength": strength, "stars": stars}
+    vector: List[float] = []
+    for name, block in blocks.items():
+        vector += _normalized(block, BLOCK_WEIGHTS[name])
+    return vector
+
+FEATURE_DIM = 4 * 22 + len(ELEMENT_ORDER) + len(GEJU_VOCAB) + 1 + len(STRENGTH_LEVELS) + 1 + len(STAR_VOCAB)
+
+class SimilarityHit(BaseModel):
+    key: str
+    score: float          # 余弦相似度 (0 ~ 1)
+    meta: Dict = {}
+
+class SimilarityIndex:
+    """
+    暴力余弦检索：安装 numpy 时以矩阵乘法整批计算，否则逐条计算。
+    数万条以内单次查询为毫秒级，无需近似索引。
+    """
+
+    def __init__(self):
+        self._keys: List[str] = []
+        self._vectors: List[List[float]] = []
+        self._metas: List[Dict] = []
+        self._positions: Dict[str, int] = {}
+        self._matrix = None
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def add(self, key: str, vector: Sequence[float], meta: Optional[Dict] = None):
+        """加入或替换一条向量"""
+        vector = _normalized(list(vector), 1.0)
+        if key in self._positions:
+            i = self._positions[key]
+            self._vectors[i], self._metas[i] = vector, meta or {}
+        else:
+            self._positions[key] = len(self._keys)
+            self._keys.append(key)
+            self._vectors.append(vector)
+            self._metas.append(meta or {})
+        self._matrix = None
+
+    def add_features(self, key: str, features: ChartFeatures, meta: Optional[Dict] = None):
+        self.add(key, encode(features), meta)
+
+    def search(self, vector: Sequence[float], k: int = 5, exclude: Sequence[str] = ()) -> List[SimilarityHit]:
+        if not self._keys:
+            return []
+        query = _normalized(list(vector), 1.0)
+        excluded = set(exclude)
+        hits = []
+        for i, score in self._top(query, k + len(excluded)):
+            if self._keys[i] in excluded:
+                continue
+            hits.append(SimilarityHit(key=self._keys[i], score=round(float(score), 4), meta=self._metas[i]))
+            if len(hits) >= k:
+                break
+        return hits
+
+    def _top(self, query: List[float], n: int) -> List[Tuple[int, float]]:
+        """相似度最高的 n 条 (下标, 得分)，按得分降序"""
+        try:
+            import numpy as np
+        except ImportError:
+            import heapq
+            scores = [sum(a * b for a, b in zip(query, vec)) for vec in self._vectors]
+            return heapq.nlargest(n, enumerate(scores), key=lambda item: item[1])
+        if self._matrix is None:
+            self._matrix = np.asarray(self._vectors, dtype=np.float32)
+        scores = self._matrix @ np.asarray(query, dtype=np.float32)
+        n = min(n, len(scores))
+        top = np.argpartition(-scores, n - 1)[:n]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(int(i), float(scores[i])) for i in top]
+
+@lru_cache(maxsize=4)
+def famous_case_index(cases_path: str = DEFAULT_CASES_PATH) -> SimilarityIndex:
+    """
+    名人命例库 (默认取回归测试集)：按命例的出生时间与性别排盘编码，进程内只构建一次。
+    meta 含命例名、出处与书中记载的格局/强弱。
+    """
+    from src.engine.models import BaziRequest, TimeMode
+    from src.engine.preprocessor import Preprocessor
+
+    with open(cases_path, "r", encoding="utf-8") as f:
+        cases = json.load(f)
+    preprocessor = Preprocessor()
+    index = SimilarityIndex()
+    for case in cases:
+        request = BaziRequest(
+            name=case["case_name"],
+            gender=case.get("gender", 1),
+            birth_datetime=case["birth_datetime"],
+            birth_location=case.get("birth_location", "北京"),
+            time_mode=TimeMode.MEAN_SOLAR,
+        )
+        features = ChartFeatures.from_context(preprocessor.process(request))
+        index.add_features(f"case:{case['case_name']}", features, {
+            "name": case["case_name"],
+            "source": case.get("source", ""),
+            "pillars": features.pillars,
+            "expected_geju": case.get("expected_geju", ""),
+            "expected_strength": case.get("expected_strength", ""),
+        })
+    return index
@@ -0,0 +1,62 @@
+"""
+历史时区索引：由 pytz 的时区数据预先展开每个时区的 UTC 偏移与夏令时切换表，
+按钟表时间二分查找，避免每次排盘调用 pytz 本地化。
+
+时刻统一使用钟表秒数 (以 1970-01-01 00:00:00 起算的朴素时间秒数)。
+"""
+from bisect import bisect_right
+from datetime import datetime
+from functools import lru_cache
+from typing import Tuple
+
+_EPOCH = datetime(1970, 1, 1)
+SECONDS_PER_DEGREE = 240  # 地方时每差 1 度经度相差 4 分钟
+
+class ZoneIndex:
+    """
+    单个时区的切换表：wall_starts[i] 为第 i 段生效的首个钟表秒数 (升序)，
+    offsets[i] / dsts[i] 为该段的 UTC 偏移与夏令时增量 (秒)。
+    回拨产生的重复钟表时间按标准时间处理，拨快跳过的钟表时间按切换前处理，与 pytz 的 is_dst=False 一致。
+    """
+    __slots__ = ("name", "wall_starts", "offsets", "dsts")
+
+    def __init__(self, name: str, wall_starts: Tuple[int, ...], offsets: Tuple[int, ...], dsts: Tuple[int, ...]):
+        self.name = name
+        self.wall_starts = wall_starts
+        self.offsets = offsets
+        self.dsts = dsts
+
+    def lookup(self, wall_seconds: int) -> Tuple[int, int]:
+        """钟表秒数 -> (UTC 偏移, 夏令时增量)，单位秒"""
+        i = max(bisect_right(self.wall_starts, wall_seconds) - 1, 0)
+        return self.offsets[i], self.dsts[i]
+
+    def standard_meridian(self, wall_seconds: int) -> float:
+        """该时刻所用标准时的中央经线 (东经为正)"""
+        offset, dst = self.lookup(wall_seconds)
+        return (offset - dst) / SECONDS_PER_DEGREE
+
+@lru_cache(maxsize=None)
+def zone_index(name: str) -> ZoneIndex:
+    """按 IANA 时区名构建切换表，每个进程每个时区只展开一次"""
+    import pytz
+    try:
+        tz = pytz.timezone(name)
+    except pytz.UnknownTimeZoneError:
+        raise ValueError(f"未知时区: {name}")
+
+    transitions = getattr(tz, "_utc_transition_times", None)
+    if not transitions:
+        # 固定偏移时区 (UTC、Etc/GMT-8 等)
+        offset = int(tz.utcoffset(datetime(2000, 1, 1)).total_seconds())
+        return ZoneIndex(name, (0,), (offset,), (0,))
+
+    wall_starts, offsets, dsts = [], [], []
+    for utc_time, (utcoffset, dst, _) in zip(transitions, tz._transition_info):
+        offset = int(utcoffset.total_seconds())
+        # 首段为 datetime(1, 1, 1) 哨兵，统一视为最早
+        start = int((utc_time - _EPOCH).total_seconds()) + offset if wall_starts else -(1 << 62)
+        wall_starts.append(start)
+        offsets.append(offset)
+        dsts.append(int(dst.total_seconds()))
+    return ZoneIndex(name, tuple(wall_starts), tuple(offsets), tuple(dsts))
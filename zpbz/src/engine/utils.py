@@ -13,6 +13,10 @@ class Tracer:
         step = TraceStep(module=module, desc=desc, value=value)
         self._steps.append(step)
 
+    def extend(self, steps: List[TraceStep]):
+        """追加已有的推导步骤 (增量重排时复用上次结果)"""
+        self._steps.extend(steps)
+
     def get_steps(self) -> List[TraceStep]:
         return self._steps
 
@@ -0,0 +1,78 @@
+"""
+启动预热：在工作进程接收请求之前加载首次排盘才会触发的重型数据，使首盘耗时与热态一致。
+
+- 地名索引 (优先内存映射预编译的 latlng.bin，否则解析 latlng.json)
+- 神煞规则查表
+- pydantic 校验器、lunar_python 多年缓存 (以一次示例排盘触发)
+- 可选：预先推算若干农历年的节气朔望 (每年约 20ms)
+
+用法:
+    from src.engine.warmup import warm_up
+    warm_up()                         # 返回各步骤耗时 (毫秒)
+    python -m src.engine.warmup       # 测量冷导入、未预热首盘、预热与热态排盘耗时
+"""
+import os
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, Iterable
+
+ENGINE_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+
+SAMPLE_REQUEST = {"name": "warm_up", "birth_datetime": "2000-06-15 12:00:00", "birth_location": "北京"}
+
+def _timed(timings: Dict[str, float], step: str, fn: Callable):
+    start = time.perf_counter()
+    result = fn()
+    timings[step] = round((time.perf_counter() - start) * 1000, 1)
+    return result
+
+def warm_up(lunar_years: Iterable[int] = ()) -> Dict[str, float]:
+    """预热当前进程，返回 {步骤: 耗时毫秒}。可重复调用，已加载的部分几乎不耗时"""
+    from lunar_python import LunarYear
+    from src.engine.algorithms.stars import compiled_tables
+    from src.engine.core import BaziEngine
+    from src.engine.geo import geo_index
+    from src.engine.models import BaziRequest
+
+    timings: Dict[str, float] = {}
+    _timed(timings, "geo", lambda: len(geo_index()))
+    _timed(timings, "stars", compiled_tables)
+    _timed(timings, "arrange", lambda: BaziEngine().arrange(BaziRequest(**SAMPLE_REQUEST)))
+    _timed(timings, "lunar_years", lambda: [LunarYear.fromYear(y) for y in lunar_years])
+    return timings
+
+def _subprocess_ms(code: str) -> float:
+    """在全新解释器中执行代码，代码需打印耗时秒数"""
+    env = dict(os.environ, PYTHONPATH=ENGINE_ROOT)
+    out = subprocess.run([sys.executable, "-c", code], cwd=ENGINE_ROOT, env=env,
+                         capture_output=True, text=True, check=True).stdout
+    return round(float(out.strip().splitlines()[-1]) * 1000, 1)
+
+def main():
+    # 测量用请求与预热样例取不同年份，避免命中同一农历年缓存
+    probe = {"name": "probe", "birth_datetime": "1987-07-01 08:30:00", "birth_location": "上海"}
+    second = {"name": "probe", "birth_datetime": "1993-11-20 21:10:00", "birth_location": "成都"}
+
+    cold_import = _subprocess_ms(
+        "import time; t = time.perf_counter(); import src.engine.core; print(time.perf_counter() - t)")
+    cold_first = _subprocess_ms(
+        "import time; from src.engine.core import BaziEngine; from src.engine.models import BaziRequest; "
+        f"e = BaziEngine(); t = time.perf_counter(); e.arrange(BaziRequest(**{probe!r})); print(time.perf_counter() - t)")
+
+    from src.engine.core import BaziEngine
+    from src.engine.models import BaziRequest
+    timings = warm_up()
+    engine = BaziEngine()
+    report: Dict[str, float] = {}
+    _timed(report, "first", lambda: engine.arrange(BaziRequest(**probe)))
+    _timed(report, "warm", lambda: engine.arrange(BaziRequest(**second)))
+
+    print(f"冷导入 src.engine.core   {cold_import:>8.1f} ms")
+    print(f"未预热首盘               {cold_first:>8.1f} ms")
+    print(f"预热                     {sum(timings.values()):>8.1f} ms  {timings}")
+    print(f"预热后首盘               {report['first']:>8.1f} ms")
+    print(f"热态排盘 (新年份)        {report['warm']:>8.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""
+快速路径一致性差分审计：大规模采样出生时刻，将引擎的快速实现与参考实现逐位比对。
+
+比对项:
+  pillars      ganzhi.four_pillars (流派 1/2)      vs  lunar_python EightChar.setSect
+  lunar_month  ganzhi.lunar_month_ganzhi          vs  LunarYear.getMonths() (农历月定月)
+  jie_table    ganzhi.jie_table                   vs  Lunar.getJieQiTable()
+  preprocess   Preprocessor (数值表 + 夏令时切换表)  vs  逐字符串解析的旧版校正算法
+  fortune      FortuneExtractor 流年/流月干支 (算术推导)  vs  LiuNian.getGanZhi / LiuYue.getGanZhi
+
+采样集中在易错边界：交节时刻前后、23:00-01:00 子时、1986-1991 夏令时切换前后，其余均匀分布。
+每个任务只采样同一公历年内的时刻并按时间排序，以复用 lunar_python 的单年缓存。
+fortune 的参考实现每盘约 0.2 秒，只对每 --fortune-every 个采样 (及每年首个采样) 比对整盘大运的流年与流月。
+
+用法:
+    python tests/conformance.py --samples 2000000 --workers 16 --start-year 1900 --end-year 2100
+发现差异时打印前若干条及可直接复现的 BaziRequest，并以退出码 1 结束。
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from multiprocessing import Pool
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from lunar_python import Solar, LunarYear
+from src.engine.core import BaziEngine
+from src.engine.ganzhi import JIA_ZI, JIE_NAMES, four_pillars, jie_table, lunar_month_ganzhi
+from src.engine.models import BaziRequest, Gender, TimeMode
+from src.engine.preprocessor import DSTCorrector, Preprocessor
+
+DT_FORMAT = "%Y-%m-%d %H:%M:%S"
+CHECKS = ("pillars", "lunar_month", "jie_table", "preprocess", "fortune")
+
+# 采样配比: 均匀 / 交节前后 / 子时前后 / 夏令时切换前后
+MIX = (0.4, 0.3, 0.2, 0.1)
+
+# --- 参考实现 ---
+def ref_pillars(solar: Solar, sect: int) -> Tuple[str, str, str, str]:
+    eight_char = solar.getLunar().getEightChar()
+    eight_char.setSect(sect)
+    return eight_char.getYear(), eight_char.getMonth(), eight_char.getDay(), eight_char.getTime()
+
+def ref_lunar_month(lunar) -> str:
+    for month in LunarYear.fromYear(lunar.getYear()).getMonths():
+        if month.getMonth() == lunar.getMonth():
+            return month.getGanZhi()
+    return ""
+
+def ref_preprocess(dt: datetime, time_mode: TimeMode, longitude: float) -> str:
+    """旧版校正：逐次解析夏令时区间字符串，均时差按日序公式现算 (按 UTC 解释时间戳，不受本机时区影响)"""
+    for start_str, end_str in DSTCorrector.DST_RANGES:
+        if datetime.strptime(start_str, DT_FORMAT) <= dt <= datetime.strptime(end_str, DT_FORMAT):
+            dt = dt - timedelta(hours=1)
+            break
+    if time_mode == TimeMode.TRUE_SOLAR:
+        n = dt.timetuple().tm_yday
+        b_rad = math.radians(360 * (n - 81) / 365)
+        eot = 9.87 * math.sin(2 * b_rad) - 7.67 * math.sin(b_rad + math.radians(78.7))
+        ts = dt.replace(tzinfo=timezone.utc).timestamp() + ((longitude - 120.0) * 4 + eot) * 60
+        dt = datetime.fromtimestamp(ts, timezone.utc).replace(tzinfo=None)
+    return dt.strftime(DT_FORMAT)
+
+def ref_fortune(solar: Solar, sect: int, gender: int) -> List[Tuple[int, str, List[str]]]:
+    """起运后各步大运的 (年份, 流年干支, [流月干支])"""
+    eight_char = solar.getLunar().getEightChar()
+    eight_char.setSect(sect)
+    return [
+        (ln.getYear(), ln.getGanZhi(), [ly.getGanZhi() for ly in ln.getLiuYue()])
+        for dy in eight_char.getYun(gender).getDaYun()[1:]
+        for ln in dy.getLiuNian()
+    ]
+
+def fast_fortune(result) -> List[Tuple[int, str, List[str]]]:
+    return [
+        (ln.year, ln.gan_zhi, [ly.gan_zhi for ly in ln.liu_yue])
+        for dy in result.fortune.da_yun
+        for ln in dy.liu_nian
+    ]
+
+# --- 采样 ---
+def _dst_edges() -> List[datetime]:
+    edges = []
+    for start_str, end_str in DSTCorrector.DST_RANGES:
+        edges.append(datetime.strptime(start_str, DT_FORMAT))
+        edges.append(datetime.strptime(end_str, DT_FORMAT) + timedelta(seconds=1))
+    return edges
+
+def sample_year(rng: random.Random, year: int, count: int) -> List[datetime]:
+    year_start = datetime(year, 1, 1)
+    seconds_in_year = int((datetime(year + 1, 1, 1) - year_start).total_seconds())
+    jies = [t for t in jie_table(year - 1) + jie_table(year) if t.year == year]
+    dst_edges = [t for t in _dst_edges() if t.year == year]
+
+    samples = []
+    for _ in range(count):
+        kind = rng.random()
+        if kind < MIX[0]:
+            t = year_start + timedelta(seconds=rng.randrange(seconds_in_year))
+        elif kind < MIX[0] + MIX[1]:
+            # 交节时刻 ±90 秒，其中三成恰在前后 1 秒
+            offset = rng.choice((-1, 0, 1)) if rng.random() < 0.3 else rng.randint(-90, 90)
+            t = rng.choice(jies) + timedelta(seconds=offset)
+        elif kind < MIX[0] + MIX[1] + MIX[2]:
+            day = year_start + timedelta(days=rng.randrange(seconds_in_year // 86400))
+            t = day + timedelta(hours=23) + timedelta(seconds=rng.randint(-60, 7260))
+        elif dst_edges:
+            t = rng.choice(dst_edges) + timedelta(seconds=rng.randint(-7200, 7200))
+        else:
+            t = year_start + timedelta(seconds=rng.randrange(seconds_in_year))
+        if t.year == year:
+            samples.append(t)
+    samples.sort()
+    return samples
+
+# --- 比对 ---
+def repro(t: datetime, **modes) -> Dict:
+    """最小复现请求：固定东八区 (无夏令时) + 平太阳时，使排盘时刻恰为 t"""
+    request = {"name": "repro", "birth_datetime": t.strftime(DT_FORMAT), "time_mode": "MEAN_SOLAR",
+               "timezone": "Etc/GMT-8"}
+    request.update({k: v for k, v in modes.items() if v is not None})
+    return request
+
+def check_year(task) -> Dict:
+    seed, year, count, max_report, fortune_every = task
+    rng = random.Random(seed * 100003 + year)
+    preprocessor = Preprocessor()
+    engine = BaziEngine()
+    divergences: List[Dict] = []
+    checked = {name: 0 for name in CHECKS}
+
+    def report(check, t, expected, actual, request):
+        if len(divergences) < max_report:
+            divergences.append({"check": check, "instant": t.strftime(DT_FORMAT), "expected": expected,
+                                "actual": actual, "request": request})
+
+    # 节气表逐年比对 (精确到秒)
+    table = jie_table(year)
+    jie_qi = Solar.fromYmd(year, 6, 1).getLunar().getJieQiTable()
+    reference = [jie_qi["立春"], jie_qi["惊蛰"], jie_qi["清明"], jie_qi["立夏"], jie_qi["芒种"], jie_qi["小暑"],
+                 jie_qi["立秋"], jie_qi["白露"], jie_qi["寒露"], jie_qi["立冬"], jie_qi["大雪"],
+                 jie_qi["XIAO_HAN"], jie_qi["LI_CHUN"]]
+    checked["jie_table"] += 1
+    for name, fast, ref in zip(JIE_NAMES + ("次年立春",), table, reference):
+        if fast.strftime(DT_FORMAT) != ref.toYmdHms():
+            report("jie_table", fast, ref.toYmdHms(), fast.strftime(DT_FORMAT), {"year": year, "jie": name})
+            break
+
+    for i, t in enumerate(sample_year(rng, year, count)):
+        solar = Solar.fromYmdHms(t.year, t.month, t.day, t.hour, t.minute, t.second)
+        lunar = solar.getLunar()
+
+        for sect, zi_shi_mode in ((1, "NEXT_DAY"), (2, "LATE_ZI_IN_DAY")):
+            checked["pillars"] += 1
+            expected = ref_pillars(solar, sect)
+            actual = tuple(JIA_ZI[i] for i in four_pillars(t, sect))
+            if actual != expected:
+                report("pillars", t, list(expected), list(actual), repro(t, zi_shi_mode=zi_shi_mode))
+
+        checked["lunar_month"] += 1
+        expected = ref_lunar_month(lunar)
+        actual = lunar_month_ganzhi(lunar.getYear(), lunar.getMonth())
+        if actual != expected:
+            report("lunar_month", t, expected, actual, repro(t, month_mode="LUNAR_MONTH"))
+
+        checked["preprocess"] += 1
+        time_mode = rng.choice((TimeMode.MEAN_SOLAR, TimeMode.TRUE_SOLAR))
+        longitude = round(rng.uniform(73.0, 135.0), 6)
+        request = BaziRequest(name="repro", birth_datetime=t.strftime(DT_FORMAT), time_mode=time_mode, longitude=longitude)
+        expected = ref_preprocess(t, time_mode, longitude)
+        actual = preprocessor.process(request).solar.toYmdHms()
+        if actual != expected:
+            report("preprocess", t, expected, actual, request.model_dump(mode="json", exclude_none=True))
+
+        if fortune_every and i % fortune_every == 0:
+            checked["fortune"] += 1
+            sect, zi_shi_mode = rng.choice(((1, "NEXT_DAY"), (2, "LATE_ZI_IN_DAY")))
+            gender = rng.choice((Gender.MALE, Gender.FEMALE))
+            request = repro(t, zi_shi_mode=zi_shi_mode, gender=int(gender))
+            expected = ref_fortune(solar, sect, int(gender))
+            actual = fast_fortune(engine.arrange(BaziRequest(**request)))
+            if actual != expected:
+                # 只报告第一处不同的流年
+                diff = next((e, a) for e, a in zip(expected + [None], actual + [None]) if e != a)
+                report("fortune", t, diff[0], diff[1], request)
+
+    return {"year": year, "checked": checked, "divergences": divergences}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="快速路径与参考实现的差分一致性审计")
+    parser.add_argument("--samples", type=int, default=200000, help="采样时刻总数")
+    parser.add_argument("--start-year", type=int, default=1900)
+    parser.add_argument("--end-year", type=int, default=2100)
+    parser.add_argument("--workers", type=int, default=None, help="进程数，默认全部 CPU")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--max-report", type=int, default=10, help="最多打印的差异条数")
+    parser.add_argument("--fortune-every", type=int, default=100, help="每隔多少个采样比对一次流年流月，0 为不比对")
+    args = parser.parse_args(argv)
+
+    years = list(range(args.start_year, args.end_year + 1))
+    per_year = max(1, args.samples // len(years))
+    tasks = [(args.seed, year, per_year, args.max_report, args.fortune_every) for year in years]
+    random.Random(args.seed).shuffle(tasks)
+
+    totals = {name: 0 for name in CHECKS}
+    divergences: List[Dict] = []
+    started = time.time()
+    workers = args.workers or os.cpu_count() or 1
+    with Pool(workers) as pool:
+        for done, result in enumerate(pool.imap_unordered(check_year, tasks), 1):
+            for name, count in result["checked"].items():
+                totals[name] += count
+            divergences.extend(result["divergences"])
+            print(f"\r  进度 {done}/{len(tasks)} 年  已比对 {sum(totals.values())} 项  差异 {len(divergences)}",
+                  end="", file=sys.stderr, flush=True)
+    print(file=sys.stderr)
+
+    print("═" * 80)
+    print(f"  快速路径一致性审计  种子 {args.seed}  {args.start_year}-{args.end_year}  耗时 {time.time() - started:.1f}s")
+    print("─" * 80)
+    for name in CHECKS:
+        bad = sum(1 for d in divergences if d["check"] == name)
+        print(f"  {name:<12} 比对 {totals[name]:>10}  {'✅' if bad == 0 else f'❌ 至少 {bad} 处差异'}")
+    print("═" * 80)
+
+    if not divergences:
+        return 0
+    divergences.sort(key=lambda d: d["instant"])
+    print(f"\n  最早的 {min(len(divergences), args.max_report)} 处差异 (附复现请求):")
+    for d in divergences[:args.max_report]:
+        print(f"  [{d['check']}] {d['instant']}  期望 {d['expected']}  实际 {d['actual']}")
+        print(f"      {json.dumps(d['request'], ensure_ascii=False)}")
+    return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
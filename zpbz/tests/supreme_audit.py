@@ -20,42 +20,35 @@ def run_supreme_audit():
         stats["total"] += 1
         name = case["case_name"]
         
-        # 尝试所有模式组合以实现全自动对账 (2x2x2 = 8种组合)
-        best_res = None
+        # 通过四柱反查一次性求出所有模式组合的命中窗口 (2x2x2 = 8种组合)，
+        # 只对首个命中的组合排盘，不再逐一暴力试排
+        birth_year = int(case["birth_datetime"][:4])
+        birth_location = case.get("birth_location", "北京")
+        windows = engine.reverse_lookup(case["pillars"], birth_year - 1, birth_year, birth_location=birth_location)
+        # 定义尝试顺序：优先尝试标准模式 (平太阳时 > 节气定月 > 晚子时不换日)
+        windows.sort(key=lambda w: (w.time_mode != TimeMode.MEAN_SOLAR, w.month_mode != MonthMode.SOLAR_TERM,
+                                    w.zi_shi_mode != ZiShiMode.LATE_ZI_IN_DAY))
+        hit = next((w for w in windows if w.start <= case["birth_datetime"] < w.end), None)
+
         matched_flags = []
-        
-        # 定义尝试顺序：优先尝试标准模式
-        found_match = False
-        for t_mode in [TimeMode.MEAN_SOLAR, TimeMode.TRUE_SOLAR]:
-            for m_mode in [MonthMode.SOLAR_TERM, MonthMode.LUNAR_MONTH]:
-                for z_mode in [ZiShiMode.LATE_ZI_IN_DAY, ZiShiMode.NEXT_DAY]:
-                    req = BaziRequest(
-                        name=name,
-                        gender=case.get("gender", 1),
-                        birth_datetime=case["birth_datetime"],
-                        birth_location=case.get("birth_location", "北京"),
-                        time_mode=t_mode,
-                        month_mode=m_mode,
-                        zi_shi_mode=z_mode
-                    )
-                    res = engine.arrange(req)
-                    actual_p = [f"{res.core.year.gan}{res.core.year.zhi}", f"{res.core.month.gan}{res.core.month.zhi}",
-                                f"{res.core.day.gan}{res.core.day.zhi}", f"{res.core.time.gan}{res.core.time.zhi}"]
-                    
-                    if actual_p == case["pillars"]:
-                        best_res = res
-                        if t_mode == TimeMode.TRUE_SOLAR: matched_flags.append("T")
-                        if m_mode == MonthMode.LUNAR_MONTH: matched_flags.append("M")
-                        if z_mode == ZiShiMode.NEXT_DAY: matched_flags.append("N")
-                        found_match = True
-                        break
-                    
-                    if best_res is None:
-                        best_res = res
-                if found_match: break
-            if found_match: break
-        
-        res = best_res
+        if hit:
+            t_mode, m_mode, z_mode = hit.time_mode, hit.month_mode, hit.zi_shi_mode
+            if t_mode == TimeMode.TRUE_SOLAR: matched_flags.append("T")
+            if m_mode == MonthMode.LUNAR_MONTH: matched_flags.append("M")
+            if z_mode == ZiShiMode.NEXT_DAY: matched_flags.append("N")
+        else:
+            t_mode, m_mode, z_mode = TimeMode.MEAN_SOLAR, MonthMode.SOLAR_TERM, ZiShiMode.LATE_ZI_IN_DAY
+
+        req = BaziRequest(
+            name=name,
+            gender=case.get("gender", 1),
+            birth_datetime=case["birth_datetime"],
+            birth_location=birth_location,
+            time_mode=t_mode,
+            month_mode=m_mode,
+            zi_shi_mode=z_mode
+        )
+        res = engine.arrange(req)
         actual_p = [f"{res.core.year.gan}{res.core.year.zhi}", f"{res.core.month.gan}{res.core.month.zhi}",
                     f"{res.core.day.gan}{res.core.day.zhi}", f"{res.core.time.gan}{res.core.time.zhi}"]
         
@@ -0,0 +1,129 @@
+"""
+排盘执行器 (EngineExecutor) 的排队上限、超时与计数测试：线程池 + 可阻塞的桩引擎，不执行真实排盘。
+
+用法:
+    python tests/test_executor.py
+    python -m pytest tests/test_executor.py
+"""
+import asyncio
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.engine import executor
+from src.engine.executor import EngineBusy, EngineExecutor, EngineTimeout
+
+class BlockingEngine:
+    """arrange 阻塞直到 release()，返回请求本身"""
+
+    def __init__(self):
+        self.gate = threading.Event()
+        self.started = threading.Semaphore(0)
+
+    def arrange(self, request, skip_liu_yue=False):
+        self.started.release()
+        self.gate.wait(5)
+        return request
+
+    def release(self):
+        self.gate.set()
+
+def with_stub(test):
+    def run():
+        stub = BlockingEngine()
+        previous, executor._engine = executor._engine, stub
+        try:
+            asyncio.run(test(stub))
+        finally:
+            stub.release()
+            executor._engine = previous
+    run.__name__ = test.__name__
+    return run
+
+async def wait_until(predicate, timeout: float = 2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        assert asyncio.get_running_loop().time() < deadline, "condition not reached before timeout"
+        await asyncio.sleep(0.005)
+
+@with_stub
+async def test_rejects_beyond_workers_plus_queue(stub):
+    ex = EngineExecutor(kind="thread", workers=1, max_queue=1, timeout=5)
+    first = asyncio.create_task(ex.arrange("a"))
+    second = asyncio.create_task(ex.arrange("b"))
+    await wait_until(lambda: ex.stats()["submitted"] == 2)
+
+    stats = ex.stats()
+    assert (stats["running"], stats["queued"], stats["peak_queued"]) == (1, 1, 1)
+    try:
+        await ex.arrange("c")
+        raise AssertionError("expected EngineBusy")
+    except EngineBusy:
+        pass
+    assert ex.stats()["rejected"] == 1
+
+    stub.release()
+    assert await asyncio.gather(first, second) == ["a", "b"]
+    stats = ex.stats()
+    assert (stats["running"], stats["queued"], stats["completed"], stats["failed"]) == (0, 0, 2, 0)
+    ex.shutdown()
+
+@with_stub
+async def test_timeout_keeps_slot_until_task_finishes(stub):
+    ex = EngineExecutor(kind="thread", workers=1, max_queue=0, timeout=0.05)
+    try:
+        await ex.arrange("slow")
+        raise AssertionError("expected EngineTimeout")
+    except EngineTimeout:
+        pass
+    stats = ex.stats()
+    assert stats["timeouts"] == 1
+    # 已开始的计算无法中断：超时后仍占用执行槽，新请求被拒绝
+    assert stats["running"] == 1
+    try:
+        await ex.arrange("next")
+        raise AssertionError("expected EngineBusy")
+    except EngineBusy:
+        pass
+
+    # 底层任务真正结束后释放执行槽
+    stub.release()
+    await wait_until(lambda: ex.stats()["running"] == 0)
+    assert ex.stats()["completed"] == 1
+    assert await ex.arrange("next", timeout=1) == "next"
+    ex.shutdown()
+
+@with_stub
+async def test_timed_out_queued_task_is_cancelled(stub):
+    ex = EngineExecutor(kind="thread", workers=1, max_queue=1, timeout=5)
+    running = asyncio.create_task(ex.arrange("a"))
+    await asyncio.to_thread(stub.started.acquire)
+    # 排队中的任务超时后被取消，不再执行
+    try:
+        await ex.arrange("queued", timeout=0.05)
+        raise AssertionError("expected EngineTimeout")
+    except EngineTimeout:
+        pass
+    await wait_until(lambda: ex.stats()["failed"] == 1)
+    assert ex.stats()["queued"] == 0
+
+    stub.release()
+    assert await running == "a"
+    stats = ex.stats()
+    assert (stats["submitted"], stats["completed"], stats["failed"], stats["timeouts"]) == (2, 1, 1, 1)
+    ex.shutdown()
+
+def test_rejects_unknown_kind():
+    try:
+        EngineExecutor(kind="gpu")
+        raise AssertionError("expected ValueError")
+    except ValueError:
+        pass
+
+if __name__ == "__main__":
+    tests = [v for k, v in list(globals().items()) if k.startswith("test_") and callable(v)]
+    for test in tests:
+        test()
+        print(f"ok  {test.__name__}")